@@ -0,0 +1,317 @@
+"""Allocation of students to assessors.
+
+Assessors are configured in ``assessors.json``: a name, an optional
+capacity (most students they can take) and optional module expertise (the
+modules they may assess; none listed means any module). A student can be
+allocated to an assessor who knows their module and is not their
+supervisor.
+
+``allocate`` treats this as a flow problem. Students with the same module,
+supervisor and previous assessor are interchangeable, so they form one
+source node, which keeps the network small even for thousands of
+students: source -> student group (group size) -> eligible assessor ->
+sink (capacity). It then
+
+1. allocates as many students as the constraints allow (maximum flow)
+2. among those allocations, minimises the largest assessor workload
+   (binary search on a common load cap)
+3. among those, keeps as many previous allocations as possible (minimum
+   cost flow, moving a student costs 1)
+
+    python allocation.py student_records.xlsx
+"""
+import heapq
+import json
+import os
+import sys
+import time
+from collections import defaultdict, deque
+
+from storage import get_store
+
+ASSESSOR_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assessors.json")
+
+# Used when no config file is found - the assessors the form always offered
+DEFAULT_ASSESSORS = [
+    {"name": "Dr Oswaldo Cadenas"},
+    {"name": "Dr Thomas Rushton"},
+    {"name": "Dr Craig Sayers"},
+]
+
+
+def _same_person(first, second):
+    return " ".join(str(first).split()).casefold() == " ".join(str(second).split()).casefold()
+
+
+class Assessor:
+    """An assessor with their capacity and module expertise"""
+
+    __slots__ = ("name", "capacity", "modules")
+
+    def __init__(self, name, capacity=None, modules=()):
+        self.name = name
+        self.capacity = None if capacity is None else int(capacity)
+        self.modules = frozenset(modules)
+
+    def can_assess(self, module, supervisor):
+        """Whether the assessor may mark a student of ``module`` supervised by ``supervisor``"""
+        if self.modules and module not in self.modules:
+            return False
+        return not _same_person(self.name, supervisor)
+
+    def __repr__(self):
+        return f"Assessor({self.name!r}, capacity={self.capacity}, modules={sorted(self.modules)})"
+
+
+_assessor_cache = {}
+
+
+def load_assessors(config_path=ASSESSOR_CONFIG_FILE):
+    """Configured assessors in display order, reloaded when the file changes"""
+    try:
+        mtime = os.path.getmtime(config_path)
+    except OSError:
+        mtime = None
+    cached = _assessor_cache.get(config_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    entries = DEFAULT_ASSESSORS
+    if mtime is not None:
+        with open(config_path, "r", encoding="utf-8") as config_file:
+            entries = json.load(config_file)["assessors"]
+    assessors = [Assessor(entry["name"], entry.get("capacity"), entry.get("modules", ())) for entry in entries]
+    names = [assessor.name for assessor in assessors]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Assessor config '{config_path}' lists an assessor more than once")
+
+    _assessor_cache[config_path] = (mtime, assessors)
+    return assessors
+
+
+class FlowNetwork:
+    """Directed graph with capacities and costs, for maximum and minimum cost flows"""
+
+    def __init__(self, node_count):
+        self.node_count = node_count
+        # Edge i and its reverse i ^ 1 are stored side by side
+        self.heads, self.capacities, self.costs = [], [], []
+        self.edges_from = [[] for _ in range(node_count)]
+
+    def add_edge(self, tail, head, capacity, cost=0):
+        """Add an edge and return its index (its flow is ``flow(index)``)"""
+        index = len(self.heads)
+        self.heads += [head, tail]
+        self.capacities += [capacity, 0]
+        self.costs += [cost, -cost]
+        self.edges_from[tail].append(index)
+        self.edges_from[head].append(index + 1)
+        return index
+
+    def flow(self, edge):
+        return self.capacities[edge ^ 1]
+
+    def max_flow(self, source, sink, admissible=None):
+        """Dinic's algorithm, optionally only over the edges ``admissible(edge)`` accepts"""
+        total = 0
+        while True:
+            level = [-1] * self.node_count
+            level[source] = 0
+            queue = deque([source])
+            while queue:
+                node = queue.popleft()
+                for edge in self.edges_from[node]:
+                    head = self.heads[edge]
+                    if self.capacities[edge] > 0 and level[head] < 0 and (admissible is None or admissible(edge)):
+                        level[head] = level[node] + 1
+                        queue.append(head)
+            if level[sink] < 0:
+                return total
+            next_edge = [0] * self.node_count
+            while True:
+                pushed = self._push(source, sink, float("inf"), level, next_edge, admissible)
+                if not pushed:
+                    break
+                total += pushed
+
+    def _push(self, node, sink, limit, level, next_edge, admissible):
+        if node == sink:
+            return limit
+        edges = self.edges_from[node]
+        while next_edge[node] < len(edges):
+            edge = edges[next_edge[node]]
+            head = self.heads[edge]
+            if (self.capacities[edge] > 0 and level[head] == level[node] + 1
+                    and (admissible is None or admissible(edge))):
+                pushed = self._push(head, sink, min(limit, self.capacities[edge]), level, next_edge, admissible)
+                if pushed:
+                    self.capacities[edge] -= pushed
+                    self.capacities[edge ^ 1] += pushed
+                    return pushed
+            next_edge[node] += 1
+        return 0
+
+    def min_cost_max_flow(self, source, sink):
+        """Primal-dual minimum cost maximum flow; returns (flow, cost).
+
+        Each phase finds shortest path distances (Dijkstra on reduced
+        costs), then saturates every shortest path at once with Dinic on
+        the zero reduced cost edges. With small integer costs there are
+        only a few phases, however many units of flow there are.
+        """
+        potential = [0] * self.node_count  # Valid while every initial cost is non-negative
+        total_flow = 0
+        while True:
+            distance = [float("inf")] * self.node_count
+            distance[source] = 0
+            heap = [(0, source)]
+            while heap:
+                dist, node = heapq.heappop(heap)
+                if dist > distance[node]:
+                    continue
+                for edge in self.edges_from[node]:
+                    if self.capacities[edge] <= 0:
+                        continue
+                    head = self.heads[edge]
+                    candidate = dist + self.costs[edge] + potential[node] - potential[head]
+                    if candidate < distance[head]:
+                        distance[head] = candidate
+                        heapq.heappush(heap, (candidate, head))
+            if distance[sink] == float("inf"):
+                break
+            for node in range(self.node_count):
+                potential[node] += min(distance[node], distance[sink])
+
+            def on_shortest_path(edge):
+                return self.costs[edge] + potential[self.heads[edge ^ 1]] - potential[self.heads[edge]] == 0
+
+            total_flow += self.max_flow(source, sink, on_shortest_path)
+        total_cost = sum(self.costs[edge] * self.capacities[edge ^ 1] for edge in range(0, len(self.heads), 2))
+        return total_flow, total_cost
+
+
+class Allocation:
+    """Result of ``allocate``"""
+
+    def __init__(self, assignments, unallocated, loads, kept, seconds):
+        self.assignments = assignments  # student_id -> assessor name
+        self.unallocated = unallocated  # student_id -> reason
+        self.loads = loads              # assessor name -> students allocated
+        self.kept = kept                # allocations unchanged from the previous run
+        self.seconds = seconds
+
+    def students_of(self, assessor):
+        return [student_id for student_id, name in self.assignments.items() if name == assessor]
+
+    def summary(self):
+        loads = ", ".join(f"{name}: {count}" for name, count in self.loads.items())
+        text = f"{len(self.assignments)} students allocated in {self.seconds:.2f}s ({loads})"
+        if self.kept:
+            text += f", {self.kept} kept their previous assessor"
+        if self.unallocated:
+            text += f", {len(self.unallocated)} could not be allocated"
+        return text
+
+
+def allocate(students, assessors, previous=None):
+    """Allocate students to assessors.
+
+    ``students`` is an iterable of (student_id, module, supervisor) and
+    ``previous`` an earlier allocation {student_id: assessor name}.
+    """
+    started = time.perf_counter()
+    previous = previous or {}
+    names = {assessor.name for assessor in assessors}
+
+    # Interchangeable students share a group: (module, supervisor, previous assessor).
+    # A supervisor only matters if they are also an assessor, so the others share one key
+    supervising = {}
+    for assessor in assessors:
+        supervising.setdefault(" ".join(assessor.name.split()).casefold(), assessor.name)
+    groups = defaultdict(list)
+    for student_id, module, supervisor in students:
+        kept_assessor = previous.get(student_id)
+        groups[(module, supervising.get(" ".join(str(supervisor).split()).casefold(), ""),
+                kept_assessor if kept_assessor in names else None)].append(student_id)
+
+    unallocated = {}
+    eligible = {}
+    for key, members in groups.items():
+        module, supervisor, _ = key
+        eligible[key] = [index for index, assessor in enumerate(assessors) if assessor.can_assess(module, supervisor)]
+        if not eligible[key]:
+            for student_id in members:
+                unallocated[student_id] = f"no assessor for module {module or '(none)'} other than the supervisor"
+    group_keys = [key for key in groups if eligible[key]]
+    allocatable = sum(len(groups[key]) for key in group_keys)
+
+    source, sink = 0, 1 + len(group_keys) + len(assessors)
+
+    def build(load_cap, with_costs):
+        network = FlowNetwork(sink + 1)
+        group_edges = {}
+        for position, key in enumerate(group_keys):
+            group_node = 1 + position
+            network.add_edge(source, group_node, len(groups[key]))
+            for index in eligible[key]:
+                cost = 0 if assessors[index].name == key[2] or not with_costs else 1
+                group_edges[key, index] = network.add_edge(group_node, 1 + len(group_keys) + index, allocatable, cost)
+        for index, assessor in enumerate(assessors):
+            capacity = allocatable if assessor.capacity is None else assessor.capacity
+            network.add_edge(1 + len(group_keys) + index, sink, min(capacity, load_cap))
+        return network, group_edges
+
+    # 1. How many students can be allocated at all
+    most = build(allocatable, False)[0].max_flow(source, sink)
+    # 2. Smallest common workload cap that still allocates that many
+    low, high = -(-most // max(1, len(assessors))), max(most, 1)
+    while low < high:
+        middle = (low + high) // 2
+        if build(middle, False)[0].max_flow(source, sink) == most:
+            high = middle
+        else:
+            low = middle + 1
+    # 3. Under that cap, keep as many previous allocations as possible
+    network, group_edges = build(low, True)
+    network.min_cost_max_flow(source, sink)
+
+    assignments = {}
+    kept = 0
+    loads = {assessor.name: 0 for assessor in assessors}
+    for key in group_keys:
+        members = sorted(groups[key])
+        for index in eligible[key]:
+            count = network.flow(group_edges[key, index])
+            name = assessors[index].name
+            for student_id in members[:count]:
+                assignments[student_id] = name
+            members = members[count:]
+            loads[name] += count
+            if name == key[2]:
+                kept += count
+        for student_id in members:
+            unallocated[student_id] = "assessor capacity exhausted"
+    return Allocation(assignments, unallocated, loads, kept, time.perf_counter() - started)
+
+
+def allocate_roster(roster, assessors=None, store=None):
+    """Allocate every student of a roster, starting from the stored allocation, and store the result"""
+    store = store or get_store()
+    assessors = assessors if assessors is not None else load_assessors()
+    students = [
+        (student_id, record.get("Module", ""), record.get("Supervisor", ""))
+        for student_id, record in roster.students.items()
+    ]
+    allocation = allocate(students, assessors, store.get_allocation())
+    store.put_allocation(allocation.assignments)
+    return allocation
+
+
+if __name__ == "__main__":
+    from roster import get_roster
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "student_records.xlsx"
+    result = allocate_roster(get_roster(path))
+    print(result.summary())
+    for student_id, reason in sorted(result.unallocated.items()):
+        print(f"  {student_id}: {reason}")
@@ -0,0 +1,295 @@
+"""Archive of closed assessment terms.
+
+``student_records.xlsx`` and the store only hold the current term: marks
+are overwritten in place and markings are replaced on re-marking. When a
+term closes, ``archive_term`` snapshots it into a Parquet dataset, one
+file per term, partitioned Hive style by academic year:
+
+    <archive>/year=2025/Semester_1.parquet
+
+Each row is one marking (assessor, per-criterion scores, final grade,
+band, comment) of one student; a student marked only in the workbook gets
+one row with the workbook mark and no scores. Names are not archived, only
+student IDs. Rows are sorted by module, then student, and written with
+column statistics, so a query reads only the year partitions and the row
+groups whose modules match its filters, and only the columns it uses.
+Modules are clustered inside the files rather than given a directory
+each: a module's term is a few hundred rows, and thousands of tiny files
+(years x modules x terms) cost far more to open than the rows to scan.
+
+``grade_trends`` answers the cross-term questions - mean scores per
+criterion by year, by assessor, by module - over any span of years.
+
+    python archive.py snapshot 2025 "Semester 1"
+    python archive.py trends --by assessor --from 2020
+"""
+import argparse
+import os
+import sys
+import tempfile
+from collections import Counter, defaultdict
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from grading import CRITERIA, get_grading_scheme, parse_mark
+from storage import get_store, safe_filename
+
+ARCHIVE_DIR_ENV_VAR = "ASSESSMENT_ARCHIVE_DIR"
+# Beside the app rather than in the (temporary) store directory: the archive is the only copy of past terms
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive")
+
+SCORE_COLUMNS = [f"{criterion}_score" for criterion in CRITERIA]
+
+# Columns stored in each file; the year comes from the partition path
+FILE_SCHEMA = pa.schema(
+    [
+        ("term", pa.string()),
+        ("module", pa.string()),
+        ("student_id", pa.string()),
+        ("course", pa.string()),
+        ("mode", pa.string()),
+        ("supervisor", pa.string()),
+        ("assessor", pa.string()),
+        ("marking", pa.int8()),  # 1 for the first marking of the student, 2 for the second, ...
+    ]
+    + [(column, pa.float32()) for column in SCORE_COLUMNS]
+    + [
+        ("final_grade", pa.float32()),
+        ("band", pa.string()),
+        ("recorded_mark", pa.float32()),  # recorded mark when the term closed
+        ("comment", pa.string()),
+        ("marked_at", pa.timestamp("s")),
+        ("archived_at", pa.timestamp("s")),
+    ]
+)
+PARTITION_SCHEMA = pa.schema([("year", pa.int16())])
+ARCHIVE_SCHEMA = pa.unify_schemas([FILE_SCHEMA, PARTITION_SCHEMA])
+PARTITIONING = ds.partitioning(PARTITION_SCHEMA, flavor="hive")
+
+# Ways of grouping grade trends and the keys each one groups by
+TREND_GROUPS = {
+    "criterion": ["year"],
+    "term": ["year", "term"],
+    "assessor": ["year", "assessor"],
+    "module": ["year", "module"],
+}
+
+# Rows per row group: a typical term is one group; a large one is split into runs of a few modules each,
+# which module filters skip using the row group statistics
+ROW_GROUP_SIZE = 16384
+
+
+def archive_dir():
+    return os.environ.get(ARCHIVE_DIR_ENV_VAR) or DEFAULT_ARCHIVE_DIR
+
+
+def academic_year(day=None):
+    """Starting calendar year of the academic year ``day`` falls in (September to August)"""
+    day = day or date.today()
+    return day.year if day.month >= 9 else day.year - 1
+
+
+def _timestamp(text):
+    try:
+        return datetime.fromisoformat(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def term_rows(roster, store=None):
+    """Archive rows of the current term: every marking of every roster student, by module and student"""
+    store = store or get_store()
+    markings_by_student = defaultdict(list)
+    for marking in store.list_markings():
+        markings_by_student[str(marking["student_id"])].append(marking)
+
+    # Marks saved by the app are in the store; the workbook's only for marks entered there directly
+    recorded = store.get_marks_many(list(roster.students))
+
+    rows = []
+    for student_id, record in roster.students.items():
+        module = record.get("Module") or None
+        scheme = get_grading_scheme(module)
+        if student_id in recorded:
+            recorded_mark = parse_mark(recorded[student_id]["marks"])
+            recorded_comment = recorded[student_id]["comment"]
+        else:
+            recorded_mark = parse_mark(record.get("Marks"))
+            recorded_comment = record.get("Comments") or record.get("Comment")
+        base = {
+            "module": module,
+            "student_id": student_id,
+            "course": record.get("Course") or None,
+            "mode": record.get("Mode") or None,
+            "supervisor": record.get("Supervisor") or None,
+            "recorded_mark": recorded_mark,
+        }
+        markings = markings_by_student.get(student_id, [])
+        if not markings and recorded_mark is not None:
+            rows.append({
+                **base, "assessor": None, "marking": None, **dict.fromkeys(SCORE_COLUMNS),
+                "final_grade": recorded_mark, "band": scheme.band_for(recorded_mark),
+                "comment": recorded_comment or None, "marked_at": None,
+            })
+        for number, marking in enumerate(markings, 1):
+            rows.append({
+                **base, "assessor": marking["assessor"], "marking": number,
+                **{f"{criterion}_score": marking["scores"].get(criterion) for criterion in CRITERIA},
+                "final_grade": marking["final_grade"], "band": scheme.band_for(marking["final_grade"]),
+                "comment": marking["comment"] or None, "marked_at": _timestamp(marking["saved_at"]),
+            })
+    rows.sort(key=lambda row: (row["module"] or "", row["student_id"], row["marking"] or 0))
+    return rows
+
+
+def _term_path(root, year, term):
+    return os.path.join(root, f"year={int(year)}", f"{safe_filename(term)}.parquet")
+
+
+def is_term_archived(year, term, root=None):
+    """Whether a term of an academic year is already in the archive"""
+    return os.path.exists(_term_path(root or archive_dir(), int(year), " ".join(str(term).split())))
+
+
+def archive_term(year, term, roster, store=None, root=None, overwrite=False):
+    """Snapshot the current term into the archive; returns {module: rows written}.
+
+    ``year`` is the starting year of the academic year (None for the current
+    one). Archiving the same term again raises ``FileExistsError`` unless
+    ``overwrite`` is set, in which case the term's file is replaced.
+    """
+    root = root or archive_dir()
+    year = academic_year() if year is None else int(year)
+    term = " ".join(str(term).split())
+    if not term:
+        raise ValueError("A term label is required")
+    path = _term_path(root, year, term)
+    if os.path.exists(path) and not overwrite:
+        raise FileExistsError(f"Term '{term}' of {year} is already archived")
+
+    rows = term_rows(roster, store)
+    columns = {field.name: [row.get(field.name) for row in rows] for field in FILE_SCHEMA}
+    columns["term"] = [term] * len(rows)
+    columns["archived_at"] = [datetime.now().replace(microsecond=0)] * len(rows)
+    table = pa.table(columns, schema=FILE_SCHEMA)
+
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    # Written beside the target under a dot name (ignored by readers), then renamed into place
+    handle, temporary = tempfile.mkstemp(prefix=".", suffix=".parquet", dir=directory)
+    os.close(handle)
+    try:
+        pq.write_table(table, temporary, row_group_size=ROW_GROUP_SIZE, compression="zstd", write_statistics=True)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+    return dict(Counter(columns["module"]))
+
+
+def open_archive(root=None):
+    """The archive as a pyarrow dataset (partitioned by year)"""
+    root = root or archive_dir()
+    os.makedirs(root, exist_ok=True)
+    return ds.dataset(root, schema=ARCHIVE_SCHEMA, format="parquet", partitioning=PARTITIONING)
+
+
+def archive_filter(first_year=None, last_year=None, modules=None, terms=None, assessors=None):
+    """Filter expression for ``query_archive``; year filters prune whole partitions, the others row groups"""
+    conditions = []
+    if first_year is not None:
+        conditions.append(ds.field("year") >= int(first_year))
+    if last_year is not None:
+        conditions.append(ds.field("year") <= int(last_year))
+    if modules:
+        conditions.append(ds.field("module").isin(list(modules)))
+    if terms:
+        conditions.append(ds.field("term").isin(list(terms)))
+    if assessors:
+        conditions.append(ds.field("assessor").isin(list(assessors)))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def query_archive(columns=None, root=None, **filters):
+    """Archived rows as a pyarrow Table, reading only the partitions, row groups and columns that are needed"""
+    return open_archive(root).to_table(columns=columns, filter=archive_filter(**filters))
+
+
+def grade_trends(by="criterion", root=None, **filters):
+    """Mean final grade and criterion scores per group, oldest year first.
+
+    ``by`` is one of ``TREND_GROUPS``: ``criterion`` (per year), ``term``,
+    ``assessor`` or ``module`` (each per year). Rows are dicts with the
+    group keys, ``markings`` (a mark only in the workbook counts as one),
+    ``students``, ``final_grade`` and each ``<criterion>_score``; means are
+    rounded to one decimal place.
+    """
+    keys = TREND_GROUPS[by]
+    value_columns = ["final_grade"] + SCORE_COLUMNS
+    table = query_archive(columns=sorted(set(keys) | {"student_id"}) + value_columns, root=root, **filters)
+    if "assessor" in keys:
+        table = table.filter(pc.is_valid(table["assessor"]))
+    grouped = table.group_by(keys).aggregate(
+        [("student_id", "count"), ("student_id", "count_distinct")] + [(column, "mean") for column in value_columns]
+    )
+    grouped = grouped.sort_by([(key, "ascending") for key in keys])
+    rows = []
+    for row in grouped.to_pylist():
+        result = {key: row[key] for key in keys}
+        result["markings"] = row["student_id_count"]
+        result["students"] = row["student_id_count_distinct"]
+        for column in value_columns:
+            mean = row[f"{column}_mean"]
+            result[column] = None if mean is None else round(mean, 1)
+        rows.append(result)
+    return rows
+
+
+def archived_terms(root=None):
+    """Archived terms as [{"year", "term", "modules", "rows"}], oldest first"""
+    table = query_archive(columns=["year", "term", "module"], root=root)
+    grouped = table.group_by(["year", "term"]).aggregate([("module", "count_distinct"), ("term", "count")])
+    grouped = grouped.sort_by([("year", "ascending"), ("term", "ascending")])
+    return [
+        {"year": row["year"], "term": row["term"], "modules": row["module_count_distinct"], "rows": row["term_count"]}
+        for row in grouped.to_pylist()
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed terms and query grade trends across them")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot = commands.add_parser("snapshot", help="archive the current term")
+    snapshot.add_argument("year", type=int, help="starting year of the academic year, e.g. 2025 for 2025/26")
+    snapshot.add_argument("term", help="term label, e.g. 'Semester 1'")
+    snapshot.add_argument("--roster", default="student_records.xlsx")
+    snapshot.add_argument("--overwrite", action="store_true", help="replace the term if already archived")
+    trends = commands.add_parser("trends", help="print grade trends across archived terms")
+    trends.add_argument("--by", choices=sorted(TREND_GROUPS), default="criterion")
+    trends.add_argument("--from", dest="first_year", type=int)
+    trends.add_argument("--to", dest="last_year", type=int)
+    trends.add_argument("--module", dest="modules", action="append")
+    commands.add_parser("terms", help="list the archived terms")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        from roster import get_roster
+        try:
+            counts = archive_term(args.year, args.term, get_roster(args.roster), overwrite=args.overwrite)
+        except (FileExistsError, ValueError) as e:
+            sys.exit(str(e))
+        print(f"Archived {sum(counts.values())} rows of {len(counts)} module(s) to {archive_dir()}")
+    elif args.command == "trends":
+        for row in grade_trends(args.by, first_year=args.first_year, last_year=args.last_year, modules=args.modules):
+            print(row)
+    else:
+        for term in archived_terms():
+            print(f"{term['year']} {term['term']}: {term['rows']} rows, {term['modules']} module(s)")
@@ -0,0 +1,99 @@
+"""Static asset bundle for the dashboard UI.
+
+The stylesheet and scripts live as plain files under ``static/``. At startup
+they are concatenated into one CSS and one JS bundle, minified, and written
+to ``static/dist`` under a content fingerprint, e.g.
+``dashboard.3f9c2a1b7e4d.min.js``. A changed source gives a new file name,
+so the bundles can be served with a year-long immutable cache header and
+browsers (or a reverse proxy) only download them again after a release.
+"""
+import hashlib
+import os
+import re
+
+from starlette.staticfiles import StaticFiles
+
+from storage import atomic_write_bytes
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+
+# Bundle name -> source files (relative to STATIC_DIR), in load order
+BUNDLES = {
+    "dashboard.css": ["css/dashboard.css"],
+    "dashboard.js": [
+        "js/student-fields.js",
+        "js/grade-selectors.js",
+        "js/grade-preview.js",
+        "js/comments.js",
+        "js/feedback-suggestions.js",
+    ],
+}
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_CSS_COMMENT = re.compile(r"/\*.*?\*/", re.S)
+_CSS_WHITESPACE = re.compile(r"\s+")
+_CSS_PUNCTUATION = re.compile(r"\s*([{};,>])\s*")
+
+
+def minify_css(source):
+    """Strip comments and redundant whitespace from a stylesheet"""
+    css = _CSS_COMMENT.sub("", source)
+    css = _CSS_WHITESPACE.sub(" ", css)
+    css = _CSS_PUNCTUATION.sub(r"\1", css)
+    css = css.replace(": ", ":").replace(";}", "}")
+    return css.strip() + "\n"
+
+
+def minify_js(source):
+    """Conservative script minification: drop indentation, blank and comment-only lines.
+
+    Statements stay on their own lines, so automatic semicolon insertion and
+    string contents are never affected.
+    """
+    lines = []
+    for line in source.splitlines():
+        line = line.strip()
+        if line and not line.startswith("//"):
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+_MINIFIERS = {".css": minify_css, ".js": minify_js}
+
+
+def build_bundle(name, sources, static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Build one fingerprinted, minified bundle and return its file name"""
+    stem, extension = os.path.splitext(name)
+    parts = []
+    for source in sources:
+        with open(os.path.join(static_dir, source), "r", encoding="utf-8") as source_file:
+            parts.append(_MINIFIERS[extension](source_file.read()))
+    content = "".join(parts).encode("utf-8")
+
+    fingerprint = hashlib.sha256(content).hexdigest()[:12]
+    filename = f"{stem}.{fingerprint}.min{extension}"
+    path = os.path.join(dist_dir, filename)
+    # Same name means same content, so concurrent workers can skip or race safely
+    if not os.path.exists(path):
+        os.makedirs(dist_dir, exist_ok=True)
+        atomic_write_bytes(path, content)
+    return filename
+
+
+def build_assets(static_dir=STATIC_DIR, dist_dir=DIST_DIR):
+    """Build every bundle; returns {bundle name: fingerprinted file name}"""
+    return {
+        name: build_bundle(name, sources, static_dir, dist_dir)
+        for name, sources in BUNDLES.items()
+    }
+
+
+class ImmutableStaticFiles(StaticFiles):
+    """Static files served with a long-lived cache header (for fingerprinted names only)"""
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
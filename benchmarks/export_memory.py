@@ -0,0 +1,126 @@
+"""Memory and time of the marks export.
+
+Builds a synthetic roster (100k students by default, half of them with a
+recorded marking in a SQLite store) and exports it three ways, reporting
+the peak memory tracemalloc sees on top of the roster and store, and the
+wall time:
+
+* a pandas DataFrame of every row written with ``to_excel`` (how the
+  workbook is written today)
+* ``export.iter_csv`` over ``export.export_rows``, discarding the chunks
+* ``export.iter_xlsx`` over ``export.export_rows``, discarding the chunks
+
+The streaming exports should peak at the same few MB for any cohort size.
+Run from the project directory:
+
+    python benchmarks/export_memory.py --rows 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from export import COLUMNS, export_rows, iter_csv, iter_xlsx  # noqa: E402
+from grading import CRITERIA  # noqa: E402
+from records import StudentRecord  # noqa: E402
+from roster import Roster  # noqa: E402
+from storage import SQLiteStore  # noqa: E402
+
+MODULES = [f"EEE-{level}-{code}" for level in (4, 5, 6) for code in ("CAO", "DLD", "SIG", "PWR", "EMB", "COM")]
+ASSESSORS = ["Dr Oswaldo Cadenas", "Dr Thomas Rushton", "Dr Craig Sayers"]
+
+
+def sample_roster(count):
+    roster = Roster("synthetic")
+    categories = {}
+    for index in range(count):
+        student_id = str(4000000 + index)
+        row = {
+            "Student_ID": student_id,
+            "Name": f"Name{index % 5000}",
+            "Surname": f"Surname{index % 9000}",
+            "Course": "EEE",
+            "Mode": "FT" if index % 3 else "PT",
+            "Module": MODULES[index % len(MODULES)],
+            "Title": f"Project {index}",
+            "Supervisor": ASSESSORS[index % len(ASSESSORS)],
+        }
+        if index % 4 == 0:
+            row["Marks"] = str(40 + index % 500 / 10)
+            row["Comments"] = "Well structured report with a clear evaluation of the results."
+        roster.students[student_id] = StudentRecord.from_mapping(row, categories)
+    return roster
+
+
+def sample_store(path, count):
+    store = SQLiteStore(path)
+    with store._connect() as conn:
+        conn.executemany(
+            "INSERT INTO markings (student_id, assessor, module, scores, final_grade, comment, saved_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (str(4000000 + index), ASSESSORS[(index + 1) % len(ASSESSORS)], MODULES[index % len(MODULES)],
+                 "{" + ", ".join(f'"{criterion}": {(index * 7 + offset * 13) % 101}'
+                                 for offset, criterion in enumerate(CRITERIA)) + "}",
+                 40 + index % 500 / 10, "Good use of sources.", "2025-06-01T10:00:00")
+                for index in range(0, count, 2)
+            ],
+        )
+    return store
+
+
+def measure(run):
+    """(peak bytes allocated while ``run()`` executes, seconds) - timed in a separate run, as tracing slows it"""
+    gc.collect()
+    started = time.perf_counter()
+    run()
+    seconds = time.perf_counter() - started
+    gc.collect()
+    tracemalloc.start()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak, seconds
+
+
+def main(count):
+    import pandas as pd
+
+    with tempfile.TemporaryDirectory() as directory:
+        roster = sample_roster(count)
+        store = sample_store(os.path.join(directory, "store.sqlite"), count)
+        output = os.path.join(directory, "marks.xlsx")
+
+        def dataframe_to_excel():
+            frame = pd.DataFrame(list(export_rows(roster, store)), columns=COLUMNS)
+            frame.to_excel(output, index=False)
+
+        def streaming_csv():
+            for _ in iter_csv(export_rows(roster, store)):
+                pass
+
+        def streaming_xlsx():
+            for _ in iter_xlsx(export_rows(roster, store)):
+                pass
+
+        print(f"{count:,} students, {(count + 1) // 2:,} markings\n")
+        print(f"{'':<28}{'peak memory':>14}{'time':>10}")
+        for label, run in [
+            ("DataFrame.to_excel", dataframe_to_excel),
+            ("streaming CSV", streaming_csv),
+            ("streaming XLSX", streaming_xlsx),
+        ]:
+            peak, seconds = measure(run)
+            print(f"{label:<28}{peak / 2**20:>11.1f} MB{seconds:>9.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="number of students")
+    main(parser.parse_args().rows)
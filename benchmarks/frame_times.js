@@ -0,0 +1,98 @@
+/*
+ * Client-side frame-time probe for the assessment dashboard.
+ *
+ * Paste into the browser devtools console with the dashboard open (select a
+ * student first so every grade selector and slider is rendered). It reports:
+ *
+ *  - frame times (requestAnimationFrame deltas) and long tasks while the page
+ *    is idle, and again while the grade selectors are hovered in turn
+ *  - the cost of one sweep of the old 500 ms setInterval DOM polling loop on
+ *    the current page, and what that added up to per second of idle time
+ *
+ * Run it on a build before and after the grade selector script became event
+ * driven to compare idle frame times; the sweep cost shows what the old loop
+ * spent on this page even when nothing changed.
+ */
+(async function frameTimeProbe(options) {
+    options = Object.assign({idleSeconds: 10, hoverSeconds: 5, sweepRuns: 200}, options);
+
+    function percentile(sorted, p) {
+        if (!sorted.length) return 0;
+        return sorted[Math.min(sorted.length - 1, Math.floor(p / 100 * sorted.length))];
+    }
+
+    function recordFrames(seconds, during) {
+        return new Promise(function(resolve) {
+            var deltas = [];
+            var longTasks = [];
+            var observer = null;
+            if (window.PerformanceObserver && PerformanceObserver.supportedEntryTypes &&
+                    PerformanceObserver.supportedEntryTypes.indexOf('longtask') >= 0) {
+                observer = new PerformanceObserver(function(list) {
+                    list.getEntries().forEach(function(entry) { longTasks.push(entry.duration); });
+                });
+                observer.observe({entryTypes: ['longtask']});
+            }
+            var start = performance.now();
+            var last = start;
+            function frame(now) {
+                deltas.push(now - last);
+                last = now;
+                if (during) during(now - start);
+                if (now - start < seconds * 1000) {
+                    requestAnimationFrame(frame);
+                } else {
+                    if (observer) observer.disconnect();
+                    var sorted = deltas.slice(1).sort(function(a, b) { return a - b; });
+                    var total = sorted.reduce(function(sum, d) { return sum + d; }, 0);
+                    resolve({
+                        frames: sorted.length,
+                        mean_ms: +(total / sorted.length).toFixed(2),
+                        p95_ms: +percentile(sorted, 95).toFixed(2),
+                        max_ms: +(sorted[sorted.length - 1] || 0).toFixed(2),
+                        frames_over_20ms: sorted.filter(function(d) { return d > 20; }).length,
+                        long_tasks: longTasks.length
+                    });
+                }
+            }
+            requestAnimationFrame(function(now) { last = now; requestAnimationFrame(frame); });
+        });
+    }
+
+    // The body of the removed setInterval loop, run against the current DOM
+    function legacySweep() {
+        $('select').each(function() {
+            $(this).siblings('.dropdown-arrow, svg').remove();
+        });
+        $('.grade-select-container').each(function() {
+            $(this).find('svg, .dropdown-arrow').not('.custom-arrow').remove();
+        });
+    }
+
+    var results = {};
+    results.idle = await recordFrames(options.idleSeconds);
+
+    var containers = $('.grade-select-container').toArray();
+    var hovered = -1;
+    results.hover = await recordFrames(options.hoverSeconds, function(elapsed) {
+        var index = Math.floor(elapsed / 250) % Math.max(containers.length, 1);
+        if (index === hovered || !containers.length) return;
+        if (hovered >= 0) $(containers[hovered]).trigger('mouseleave');
+        hovered = index;
+        $(containers[hovered]).trigger('mouseenter');
+    });
+    if (hovered >= 0) $(containers[hovered]).trigger('mouseleave');
+
+    var sweepStart = performance.now();
+    for (var i = 0; i < options.sweepRuns; i++) legacySweep();
+    var sweepMs = (performance.now() - sweepStart) / options.sweepRuns;
+    results.legacy_polling = {
+        selects_on_page: $('select').length,
+        grade_selectors: containers.length,
+        ms_per_sweep: +sweepMs.toFixed(3),
+        idle_ms_per_second: +(sweepMs * 2).toFixed(3)
+    };
+
+    console.table(results);
+    return results;
+})();
@@ -0,0 +1,96 @@
+"""Load test for the multi-worker deployment mode.
+
+Each worker process repeatedly does the server-side work of one
+"Generate PDF Report" click - render the report, save it to the shared
+store, record the marks and read the report back as the download route
+would - against a single shared store. Throughput is reported for each
+worker count so scaling can be compared.
+
+Run from the project directory:
+
+    python benchmarks/load_test.py --store sqlite:////tmp/assessment_load.sqlite --workers 1 2 4
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_REPORT = {
+    'module_name': "EEE-5-CAO",
+    'report_title': "Analysis of Computer Architecture Optimization",
+    'student_name': "John Smith",
+    'assessor_name': "Dr Oswaldo Cadenas",
+    'assessor_comments': "No additional comments.",
+    'final_grade': "65.0",
+    'research_score': 65,
+    'subject_knowledge_score': 72,
+    'critical_analysis_score': 58,
+    'problem_solving_score': 66,
+    'practical_competence_score': 81,
+    'communication_score': 63,
+    'academic_integrity_score': 70,
+}
+
+
+def _worker(args):
+    """Run the report pipeline until the deadline and return the iteration count"""
+    store_location, worker_index, deadline = args
+    os.chdir(PROJECT_DIR)
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ["ASSESSMENT_STORE"] = store_location
+    from report_pdf import create_pdf
+    from storage import get_store
+
+    store = get_store()
+    completed = 0
+    while time.time() < deadline:
+        student_id = f"load-{worker_index}-{completed}"
+        buffer = io.BytesIO()
+        create_pdf(SAMPLE_REPORT, buffer)
+        report_key = store.put_report(student_id, f"assessment_{student_id}.pdf", buffer.getvalue())
+        store.record_marks(student_id, SAMPLE_REPORT['final_grade'], SAMPLE_REPORT['assessor_comments'], report_key)
+        if store.get_report(report_key) is None:
+            raise RuntimeError(f"Report {report_key} missing right after it was stored")
+        completed += 1
+    return completed
+
+
+def run(store_location, worker_counts, duration):
+    print(f"Store: {store_location}  duration per run: {duration}s")
+    print(f"{'workers':>8} {'reports':>8} {'reports/s':>10} {'speedup':>8}")
+    baseline = None
+    for workers in worker_counts:
+        # Give every process the same start line so imports are not timed
+        with multiprocessing.get_context("spawn").Pool(workers) as pool:
+            pool.map(_warm_up, [store_location] * workers)
+            deadline = time.time() + duration
+            counts = pool.map(_worker, [(store_location, index, deadline) for index in range(workers)])
+        total = sum(counts)
+        throughput = total / duration
+        baseline = baseline or throughput
+        print(f"{workers:>8} {total:>8} {throughput:>10.1f} {throughput / baseline:>7.2f}x")
+
+
+def _warm_up(store_location):
+    """Import the app and the (lazily loaded) report renderer before the timed run starts"""
+    os.chdir(PROJECT_DIR)
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ["ASSESSMENT_STORE"] = store_location
+    import final_code  # noqa: F401
+    import report_pdf  # noqa: F401
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default="sqlite:///" + os.path.join(PROJECT_DIR, "load_test_store.sqlite"),
+                        help="store location shared by all workers (see storage.py)")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                        help="worker counts to measure")
+    parser.add_argument("--duration", type=float, default=10.0,
+                        help="seconds per measurement")
+    options = parser.parse_args()
+    run(options.store, options.workers, options.duration)
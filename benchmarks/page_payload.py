@@ -0,0 +1,104 @@
+"""Page payload measurement.
+
+Starts the dashboard on a free port, downloads the page and every
+stylesheet and script it references, and reports:
+
+* first load - the HTML plus every asset
+* repeat load - what a browser with a warm cache still downloads: the HTML,
+  plus a revalidation request for each asset without a long-lived cache header
+* inline baseline - the HTML plus the unminified CSS/JS sources, which is
+  what every page load used to cost when they were inlined in ``app_ui``
+
+Sizes are shown raw and gzip-compressed. Run from the project directory:
+
+    python benchmarks/page_payload.py
+"""
+import gzip
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from urllib.parse import urljoin
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from assets import BUNDLES, STATIC_DIR  # noqa: E402
+
+_ASSET_PATTERN = re.compile(r'<(?:link[^>]+href|script[^>]+src)="([^"]+\.(?:css|js))"')
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _fetch(url):
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return response.read(), response.headers.get("Cache-Control", "")
+
+
+def _sizes(data):
+    return len(data), len(gzip.compress(data))
+
+
+def _row(label, raw, compressed, requests):
+    print(f"{label:<16}{raw:>12,}{compressed:>12,}{requests:>10}")
+
+
+def measure(base_url):
+    html, _ = _fetch(base_url)
+    html_raw, html_gzip = _sizes(html)
+
+    assets = []
+    for path in dict.fromkeys(_ASSET_PATTERN.findall(html.decode("utf-8"))):
+        body, cache_control = _fetch(urljoin(base_url, path))
+        raw, compressed = _sizes(body)
+        assets.append((path, raw, compressed, cache_control))
+
+    print(f"{'asset':<60}{'bytes':>10}{'gzip':>10}  cache-control")
+    for path, raw, compressed, cache_control in assets:
+        print(f"{path[-60:]:<60}{raw:>10,}{compressed:>10,}  {cache_control or '-'}")
+    print()
+
+    revalidated = [asset for asset in assets if "max-age" not in asset[3]]
+    sources = b"".join(
+        open(os.path.join(STATIC_DIR, source), "rb").read()
+        for source_list in BUNDLES.values() for source in source_list
+    )
+    inline_raw, inline_gzip = _sizes(html + sources)
+
+    print(f"{'':<16}{'bytes':>12}{'gzip':>12}{'requests':>10}")
+    _row("first load", html_raw + sum(a[1] for a in assets), html_gzip + sum(a[2] for a in assets), 1 + len(assets))
+    _row("repeat load", html_raw, html_gzip, 1 + len(revalidated))
+    _row("HTML only", html_raw, html_gzip, 1)
+    _row("inline baseline", inline_raw, inline_gzip, 1)
+
+
+def main():
+    port = _free_port()
+    env = dict(os.environ, ASSESSMENT_PORT=str(port), ASSESSMENT_WORKERS="1")
+    server = subprocess.Popen(
+        [sys.executable, "final_code.py"], cwd=PROJECT_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}/"
+    try:
+        for _ in range(100):
+            try:
+                _fetch(urljoin(base_url, "healthz"))
+                break
+            except OSError:
+                time.sleep(0.2)
+        measure(base_url)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Benchmark of the two report renderers.
+
+Compares create_pdf (full platypus layout per report) with
+create_pdf_stamped (cached background form plus stamped fields), for
+single reports and for one multi-page file holding a whole cohort.
+
+Run from the project directory:
+
+    python benchmarks/pdf_render_bench.py --reports 200
+"""
+import argparse
+import io
+import os
+import sys
+import time
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.chdir(PROJECT_DIR)
+
+from grading import CRITERIA  # noqa: E402
+from report_pdf import create_pdf, create_pdf_stamped, render_stamped_reports  # noqa: E402
+
+
+def sample_reports(count):
+    """Reports with varying names, titles and scores"""
+    reports = []
+    for index in range(count):
+        report = {
+            'module_name': "EEE-5-CAO" if index % 2 else "EEE-4-DLD",
+            'report_title': f"Performance Evaluation of Cache Memories, part {index}",
+            'student_name': f"Student {index}",
+            'assessor_name': "Dr Oswaldo Cadenas",
+            'assessor_comments': "Clear structure and a well argued analysis of the results. " * (1 + index % 3),
+            'final_grade': f"{40 + index % 60}.0",
+        }
+        for offset, criterion in enumerate(CRITERIA):
+            report[f'{criterion}_score'] = (index * 7 + offset * 13) % 101
+        reports.append(report)
+    return reports
+
+
+def time_per_report(render, reports):
+    started = time.perf_counter()
+    total_bytes = 0
+    for report in reports:
+        buffer = io.BytesIO()
+        render(report, buffer)
+        total_bytes += len(buffer.getvalue())
+    elapsed = time.perf_counter() - started
+    return elapsed / len(reports), total_bytes / len(reports)
+
+
+def main(count):
+    reports = sample_reports(count)
+    # Warm both paths so one-off costs (fonts, styles, backgrounds) are not timed
+    time_per_report(create_pdf, reports[:2])
+    time_per_report(create_pdf_stamped, reports[:2])
+
+    platypus_time, platypus_size = time_per_report(create_pdf, reports)
+    stamped_time, stamped_size = time_per_report(create_pdf_stamped, reports)
+    print(f"{'renderer':<28} {'ms/report':>10} {'bytes/report':>13}")
+    print(f"{'create_pdf (platypus)':<28} {platypus_time * 1000:>10.2f} {platypus_size:>13.0f}")
+    print(f"{'create_pdf_stamped':<28} {stamped_time * 1000:>10.2f} {stamped_size:>13.0f}")
+    print(f"speedup: {platypus_time / stamped_time:.1f}x")
+
+    started = time.perf_counter()
+    buffer = io.BytesIO()
+    render_stamped_reports(reports, buffer)
+    elapsed = time.perf_counter() - started
+    print(f"{'cohort file (stamped)':<28} {elapsed / count * 1000:>10.2f} {len(buffer.getvalue()) / count:>13.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=200, help="number of reports to render")
+    main(parser.parse_args().reports)
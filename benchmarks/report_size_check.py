@@ -0,0 +1,62 @@
+"""Report size regression check.
+
+Measures bytes per report for a standalone report and for a bundle of
+reports in one file, with the original full-size logo ("before") and the
+optimised logo ("after"). Exits with status 1 if the optimised output goes
+over the size budgets below, so it can run in CI.
+
+Run from the project directory:
+
+    python benchmarks/report_size_check.py
+"""
+import io
+import os
+import sys
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.chdir(PROJECT_DIR)
+
+import report_pdf  # noqa: E402
+from pdf_render_bench import sample_reports  # noqa: E402
+
+# Budgets in bytes per report for the optimised output
+STANDALONE_BUDGET = 30000
+BUNDLE_BUDGET = 4000
+BUNDLE_SIZE = 50
+
+
+def bytes_per_report(reports):
+    standalone = io.BytesIO()
+    report_pdf.create_pdf(reports[0], standalone)
+    bundle = io.BytesIO()
+    report_pdf.create_report_bundle(reports, bundle)
+    return len(standalone.getvalue()), len(bundle.getvalue()) / len(reports)
+
+
+def main():
+    reports = sample_reports(BUNDLE_SIZE)
+
+    # Stamped backgrounds embed the logo, so lay them out again for each run
+    optimised_logo = report_pdf.get_report_logo_path
+    report_pdf.get_report_logo_path = report_pdf.get_logo_path
+    try:
+        report_pdf._report_backgrounds.clear()
+        before = bytes_per_report(reports)
+    finally:
+        report_pdf.get_report_logo_path = optimised_logo
+        report_pdf._report_backgrounds.clear()
+    after = bytes_per_report(reports)
+
+    print(f"{'':<22} {'before':>10} {'after':>10} {'budget':>10}")
+    print(f"{'standalone report':<22} {before[0]:>10.0f} {after[0]:>10.0f} {STANDALONE_BUDGET:>10}")
+    print(f"{f'bundle of {BUNDLE_SIZE} (per report)':<22} {before[1]:>10.0f} {after[1]:>10.0f} {BUNDLE_BUDGET:>10}")
+
+    if after[0] > STANDALONE_BUDGET or after[1] > BUNDLE_BUDGET:
+        print("FAILED: report size over budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""Memory footprint of roster rows and report payloads.
+
+Builds a synthetic roster (100k rows by default, a few dozen distinct
+courses, modules and supervisors, like a registry export) and measures with
+tracemalloc what each representation holds:
+
+* roster rows as dicts (what ``import_roster`` used to keep) versus
+  ``StudentRecord`` objects with interned category columns
+* a pandas DataFrame of the same rows with object columns versus
+  ``category`` dtype for Course/Mode/Module/Supervisor (sized with
+  ``memory_usage(deep=True)``)
+* report payloads as dicts versus ``AssessmentRecord`` objects
+
+Every cell is a freshly built string, as it is when a workbook is parsed.
+Run from the project directory:
+
+    python benchmarks/roster_memory.py --rows 100000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+
+from records import CATEGORY_COLUMNS, CRITERIA, AssessmentRecord, StudentRecord  # noqa: E402
+from roster import REQUIRED_COLUMNS  # noqa: E402
+
+COURSES = ["EEE", "CS", "ME", "CE", "BME", "SE"]
+MODES = ["FT", "PT"]
+MODULES = [f"EEE-{level}-{code}" for level in (4, 5, 6) for code in ("CAO", "DLD", "SIG", "PWR", "EMB", "COM")]
+SUPERVISORS = [f"Dr Supervisor {index}" for index in range(40)]
+
+
+def _fresh(value):
+    """A new string object with the value (parsers do not share cell strings)"""
+    return "".join(list(value))
+
+
+def sample_rows(count):
+    rows = []
+    for index in range(count):
+        rows.append({
+            "Student_ID": str(4000000 + index),
+            "Name": _fresh(f"Name{index % 5000}"),
+            "Surname": _fresh(f"Surname{index % 9000}"),
+            "Course": _fresh(COURSES[index % len(COURSES)]),
+            "Mode": _fresh(MODES[index % len(MODES)]),
+            "Module": _fresh(MODULES[index % len(MODULES)]),
+            "Title": _fresh(f"Analysis of design trade-offs in project {index}"),
+            "Supervisor": _fresh(SUPERVISORS[index % len(SUPERVISORS)]),
+        })
+    return rows
+
+
+def sample_reports(count):
+    reports = []
+    for index in range(count):
+        report = {
+            'module_name': _fresh(MODULES[index % len(MODULES)]),
+            'report_title': _fresh(f"Analysis of design trade-offs in project {index}"),
+            'student_name': _fresh(f"Name{index % 5000}"),
+            'assessor_name': _fresh(SUPERVISORS[index % len(SUPERVISORS)]),
+            'assessor_comments': "No additional comments.",
+            'final_grade': str(40 + index % 600 / 10),
+        }
+        for offset, criterion in enumerate(CRITERIA):
+            report[f'{criterion}_score'] = (index * 7 + offset * 13) % 101
+        reports.append(report)
+    return reports
+
+
+def measure(build):
+    """Bytes still allocated by the object ``build()`` returns"""
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def _row(label, size, baseline, count):
+    change = f"{size / baseline:.0%}" if baseline else ""
+    print(f"{label:<38}{size / 2**20:>10.1f} MB{size / count:>10.0f} B/row{change:>8}")
+
+
+def main(count):
+    import pandas as pd
+
+    print(f"{count:,} rows, category columns: {', '.join(CATEGORY_COLUMNS)}\n")
+
+    dict_rows = measure(lambda: {row["Student_ID"]: row for row in sample_rows(count)})
+
+    def student_records():
+        categories = {}
+        return {row["Student_ID"]: StudentRecord.from_mapping(row, categories) for row in sample_rows(count)}
+
+    record_rows = measure(student_records)
+
+    # pandas may keep strings in buffers tracemalloc does not see, so frames report their own size
+    frame = pd.DataFrame(sample_rows(count), columns=REQUIRED_COLUMNS, dtype=object)
+    object_frame = int(frame.memory_usage(deep=True).sum())
+    frame = frame.astype({column: "category" for column in CATEGORY_COLUMNS})
+    categorical_frame = int(frame.memory_usage(deep=True).sum())
+    del frame
+
+    dict_reports = measure(lambda: sample_reports(count))
+
+    def assessment_records():
+        records = []
+        for report in sample_reports(count):
+            scores = {criterion: report[f'{criterion}_score'] for criterion in CRITERIA}
+            records.append(AssessmentRecord(
+                report['module_name'], report['report_title'], report['student_name'],
+                report['assessor_name'], report['assessor_comments'], report['final_grade'], scores,
+            ))
+        return records
+
+    record_reports = measure(assessment_records)
+
+    print(f"{'':<38}{'memory':>13}{'':>16}{'vs base':>8}")
+    _row("roster rows: dicts", dict_rows, 0, count)
+    _row("roster rows: StudentRecord", record_rows, dict_rows, count)
+    _row("DataFrame: object columns", object_frame, 0, count)
+    _row("DataFrame: category columns", categorical_frame, object_frame, count)
+    _row("report payloads: dicts", dict_reports, 0, count)
+    _row("report payloads: AssessmentRecord", record_reports, dict_reports, count)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000, help="number of roster rows and reports")
+    main(parser.parse_args().rows)
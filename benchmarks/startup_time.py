@@ -0,0 +1,119 @@
+"""Cold-start measurement for the dashboard.
+
+Imports ``final_code`` in fresh interpreters with ``python -X importtime``
+and reports:
+
+* the cumulative import time of ``final_code`` (median of several runs)
+* the top-level packages that account for it
+* whether the heavy optional dependencies (pandas, ReportLab, PIL) were
+  loaded at import, which they should not be - they are imported on first
+  use, e.g. by the warm-up check once the server is up
+* time from launching the server process until ``/healthz`` answers
+
+Run from the project directory:
+
+    python benchmarks/startup_time.py --runs 5
+"""
+import argparse
+import os
+import re
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ["pandas", "reportlab", "PIL"]
+
+_IMPORT_TIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+_PROBE = (
+    "import sys, final_code; "
+    f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+)
+
+
+def import_profile():
+    """(cumulative microseconds of final_code, {top-level package: microseconds}, heavy modules loaded)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _PROBE],
+        cwd=PROJECT_DIR, capture_output=True, text=True, check=True,
+    )
+    total = 0
+    packages = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = match.groups()
+        if name == "final_code":
+            total = int(cumulative_us)
+        # Self times summed per top-level package, so nested imports are not counted twice
+        packages[name.split(".")[0]] += int(self_us)
+    packages.pop("final_code", None)
+    loaded = [name for name in result.stdout.strip().split(",") if name]
+    return total, packages, loaded
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def time_to_healthy():
+    """Seconds from starting the server process until /healthz responds"""
+    port = _free_port()
+    env = dict(os.environ, ASSESSMENT_PORT=str(port), ASSESSMENT_WORKERS="1")
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "final_code.py"], cwd=PROJECT_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=5).close()
+                return time.perf_counter() - started
+            except OSError:
+                if server.poll() is not None:
+                    raise RuntimeError("Server exited before becoming healthy")
+                time.sleep(0.02)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(runs, top):
+    profiles = [import_profile() for _ in range(runs)]
+    totals = [profile[0] for profile in profiles]
+    packages = defaultdict(list)
+    for _, package_times, _ in profiles:
+        for name, microseconds in package_times.items():
+            packages[name].append(microseconds)
+
+    print(f"import final_code: {statistics.median(totals) / 1000:.0f} ms median "
+          f"(min {min(totals) / 1000:.0f} ms, {runs} runs)")
+    loaded = profiles[-1][2]
+    print(f"heavy modules loaded at import: {', '.join(loaded) if loaded else 'none'}")
+    print()
+    print(f"{'package':<28}{'ms':>8}")
+    ranked = sorted(packages.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, times in ranked[:top]:
+        print(f"{name:<28}{statistics.median(times) / 1000:>8.1f}")
+    print()
+
+    healthy = [time_to_healthy() for _ in range(runs)]
+    print(f"process start -> /healthz: {statistics.median(healthy):.2f} s median (min {min(healthy):.2f} s)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per measurement")
+    parser.add_argument("--top", type=int, default=12, help="packages to list")
+    options = parser.parse_args()
+    main(options.runs, options.top)
@@ -0,0 +1,99 @@
+"""Message count for selecting a student.
+
+Starts the dashboard on a free port, opens a Shiny websocket session like a
+browser would, selects a known and an unknown student ID, and counts what
+the server sends back for each selection: websocket messages, input
+update messages (each one is a separate client-side update and repaint),
+custom messages and notifications.
+
+Requires the ``websockets`` package. Run from the project directory:
+
+    python benchmarks/student_select_messages.py
+"""
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import Counter
+
+import websockets
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_DIR)
+os.chdir(PROJECT_DIR)
+
+from roster import get_roster  # noqa: E402
+
+QUIET_SECONDS = 1.0
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _drain(websocket):
+    """Messages received until the server has been quiet for QUIET_SECONDS"""
+    messages = []
+    try:
+        while True:
+            messages.append(json.loads(await asyncio.wait_for(websocket.recv(), QUIET_SECONDS)))
+    except asyncio.TimeoutError:
+        return messages
+
+
+def _count(messages):
+    counts = Counter(websocket_messages=len(messages))
+    for message in messages:
+        counts["input_updates"] += len(message.get("inputMessages", []))
+        for custom_type in message.get("custom", {}):
+            counts[f"custom:{custom_type}"] += 1
+        if "notification" in message:
+            counts["notifications"] += 1
+    return counts
+
+
+async def _session(port, student_ids):
+    async with websockets.connect(f"ws://127.0.0.1:{port}/websocket/") as websocket:
+        await websocket.send(json.dumps({"method": "init", "data": {
+            "student_id": "", ".clientdata_url_search": "", ".clientdata_url_pathname": "/",
+        }}))
+        await _drain(websocket)
+        results = {}
+        for label, student_id in student_ids:
+            await websocket.send(json.dumps({"method": "update", "data": {"student_id": student_id}}))
+            results[label] = _count(await _drain(websocket))
+        return results
+
+
+def main():
+    known_id = get_roster().student_ids()[0]
+    port = _free_port()
+    env = dict(os.environ, ASSESSMENT_PORT=str(port), ASSESSMENT_WORKERS="1")
+    server = subprocess.Popen(
+        [sys.executable, "final_code.py"], cwd=PROJECT_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/healthz", timeout=5).close()
+                break
+            except OSError:
+                time.sleep(0.2)
+        results = asyncio.run(_session(port, [("known student", known_id), ("unknown student", "no-such-id")]))
+    finally:
+        server.terminate()
+        server.wait()
+
+    for label, counts in results.items():
+        print(f"{label}: " + ", ".join(f"{name}={value}" for name, value in sorted(counts.items())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Streaming export of marks.
+
+One row per roster student: their details, the assessor and
+per-criterion scores of the marking behind their recorded mark, the final
+grade, its band and the comments.
+Students are read from the roster and their markings fetched from the
+store ``CHUNK_SIZE`` students at a time, so the rows are produced as a
+stream and memory stays flat however large the cohort:
+
+* CSV is encoded a chunk at a time and sent as it is produced
+* XLSX is written the same way: the worksheet XML is generated row by
+  row straight into the deflate stream of the zip container, which is
+  handed out a chunk at a time - no shared string table, no temporary
+  file. (openpyxl's write-only mode is bounded too, but several times
+  slower per row.)
+
+    python export.py marks.xlsx [--module EEE-5-CAO]
+"""
+import argparse
+import csv
+import io
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from grading import CRITERIA, CRITERIA_DISPLAY_NAMES, get_grading_scheme, parse_mark, recorded_marking
+from storage import get_store
+
+# Students per store lookup, and CSV rows per chunk sent
+CHUNK_SIZE = 1000
+
+COLUMNS = (
+    ["Student_ID", "Name", "Surname", "Course", "Mode", "Module", "Supervisor", "Assessor", "Markings"]
+    + [CRITERIA_DISPLAY_NAMES[criterion] for criterion in CRITERIA]
+    + ["Final Grade", "Band", "Comments"]
+)
+
+FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Control characters a worksheet cell may not hold
+_ILLEGAL_XLSX_CHARACTERS = re.compile(r"[\000-\010]|[\013-\014]|[\016-\037]")
+
+_XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+_MAIN_NAMESPACE = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+_RELATIONSHIP_NAMESPACE = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+
+# Every part of the workbook except the worksheet, which is streamed
+_XLSX_PARTS = {
+    "[Content_Types].xml": (
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    "_rels/.rels": (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    "xl/workbook.xml": (
+        f'<workbook xmlns="{_MAIN_NAMESPACE}" xmlns:r="{_RELATIONSHIP_NAMESPACE}">'
+        '<sheets><sheet name="Marks" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '<Relationship Id="rId2" Target="styles.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles"/>'
+        '</Relationships>'
+    ),
+    # Style 0 is the default, style 1 the bold header
+    "xl/styles.xml": (
+        f'<styleSheet xmlns="{_MAIN_NAMESPACE}">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+        '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+        '<fill><patternFill patternType="gray125"/></fill></fills>'
+        '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+        '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+        '<cellXfs count="2"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+        '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/></cellXfs>'
+        '<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>'
+        '</styleSheet>'
+    ),
+}
+
+# Worksheet around the rows, with the header row frozen
+_SHEET_START = (
+    f'<worksheet xmlns="{_MAIN_NAMESPACE}"><sheetViews><sheetView workbookViewId="0">'
+    '<pane ySplit="1" topLeftCell="A2" activePane="bottomLeft" state="frozen"/>'
+    '</sheetView></sheetViews><sheetData>'
+)
+_SHEET_END = "</sheetData></worksheet>"
+
+
+def _students(roster, module):
+    for student_id, record in roster.students.items():
+        if module is None or record.get("Module") == module:
+            yield student_id, record
+
+
+def export_rows(roster, store=None, module=None, chunk_size=CHUNK_SIZE):
+    """Rows of the export (lists in ``COLUMNS`` order), one per student of the roster (or of one module).
+
+    The final grade is the student's recorded mark (``store.get_marks``,
+    or the workbook's for marks entered there directly); the assessor and
+    scores come from the marking with that grade (``recorded_marking``), so
+    a later, unreconciled second marking does not show against it. A
+    student not yet reported gets the grade of their first marking.
+    """
+    store = store or get_store()
+    chunk = []
+    for student in _students(roster, module):
+        chunk.append(student)
+        if len(chunk) == chunk_size:
+            yield from _chunk_rows(chunk, store)
+            chunk = []
+    if chunk:
+        yield from _chunk_rows(chunk, store)
+
+
+def _chunk_rows(chunk, store):
+    student_ids = [student_id for student_id, _ in chunk]
+    markings = store.get_markings_many(student_ids)
+    recorded = store.get_marks_many(student_ids)
+    for student_id, record in chunk:
+        student_markings = markings.get(student_id, [])
+        if student_id in recorded:
+            final_grade = parse_mark(recorded[student_id]["marks"])
+            comment = recorded[student_id]["comment"]
+        else:
+            final_grade = parse_mark(record.get("Marks"))
+            comment = record.get("Comments") or record.get("Comment")
+        marking = recorded_marking(student_markings, {"marks": final_grade, "comment": comment})
+        if final_grade is None and marking is not None:
+            final_grade = marking["final_grade"]
+        comment = comment or (marking["comment"] if marking else "")
+        scores = marking["scores"] if marking else {}
+        yield (
+            [student_id, record.get("Name", ""), record.get("Surname", ""), record.get("Course", ""),
+             record.get("Mode", ""), record.get("Module", ""), record.get("Supervisor", ""),
+             marking["assessor"] if marking else "", len(student_markings)]
+            + [scores.get(criterion) for criterion in CRITERIA]
+            + [final_grade,
+               get_grading_scheme(record.get("Module") or None).band_for(final_grade) if final_grade is not None else "",
+               comment or ""]
+        )
+
+
+def iter_csv(rows, chunk_size=CHUNK_SIZE):
+    """CSV of the rows as UTF-8 bytes, ``chunk_size`` rows at a time (with a BOM so Excel detects UTF-8)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write("\ufeff")
+    writer.writerow(COLUMNS)
+    count = 0
+    for row in rows:
+        writer.writerow(["" if value is None else value for value in row])
+        count += 1
+        if count % chunk_size == 0:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def _column_letters(count):
+    letters = []
+    for index in range(count):
+        name = ""
+        index += 1
+        while index:
+            index, remainder = divmod(index - 1, 26)
+            name = chr(65 + remainder) + name
+        letters.append(name)
+    return letters
+
+
+def _row_xml(number, values, letters, style=0):
+    style_attribute = f' s="{style}"' if style else ""
+    cells = []
+    for letter, value in zip(letters, values):
+        if value is None or value == "":
+            continue
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c r="{letter}{number}"{style_attribute}><v>{value!r}</v></c>')
+        else:
+            text = escape(_ILLEGAL_XLSX_CHARACTERS.sub("", str(value)))
+            cells.append(f'<c r="{letter}{number}"{style_attribute} t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row r="{number}">{"".join(cells)}</row>'
+
+
+class _ChunkBuffer:
+    """Unseekable write target for the zip stream that hands out what has been written so far"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def iter_xlsx(rows, chunk_size=CHUNK_SIZE):
+    """XLSX workbook of the rows as bytes, compressed ``chunk_size`` rows at a time"""
+    letters = _column_letters(len(COLUMNS))
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as workbook:
+        for name, content in _XLSX_PARTS.items():
+            workbook.writestr(name, _XML_DECLARATION + content)
+        with workbook.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write((_XML_DECLARATION + _SHEET_START + _row_xml(1, COLUMNS, letters, style=1)).encode("utf-8"))
+            pending = []
+            for number, row in enumerate(rows, 2):
+                pending.append(_row_xml(number, row, letters))
+                if len(pending) == chunk_size:
+                    sheet.write("".join(pending).encode("utf-8"))
+                    pending = []
+                    yield buffer.take()
+            sheet.write(("".join(pending) + _SHEET_END).encode("utf-8"))
+    yield buffer.take()
+
+
+def write_export(rows, path):
+    """Write the rows to a .csv or .xlsx file"""
+    chunks = iter_xlsx(rows) if path.lower().endswith(".xlsx") else iter_csv(rows)
+    with open(path, "wb") as output_file:
+        for chunk in chunks:
+            output_file.write(chunk)
+
+
+if __name__ == "__main__":
+    from roster import get_roster
+
+    parser = argparse.ArgumentParser(description="Export marks and per-criterion scores to CSV or XLSX")
+    parser.add_argument("output", help="file to write; .csv or .xlsx")
+    parser.add_argument("--roster", default="student_records.xlsx")
+    parser.add_argument("--module", help="only students of this module")
+    args = parser.parse_args()
+
+    write_export(export_rows(get_roster(args.roster), module=args.module), args.output)
+    print(f"Marks exported to {args.output}")
@@ -0,0 +1,287 @@
+"""Feedback snippet bank for the assessor comment box.
+
+Snippets come from two sources:
+
+* curated snippets in ``feedback_snippets.json``
+* sentences mined from saved feedback - the ``Comments`` column of the
+  roster workbook and the comments of recorded markings
+
+Every snippet is tagged with a module (or none, for every module), a
+criterion (detected from its wording, or none) and a grade band (of the
+criterion's score where known, else of the final grade). The bank keeps
+the snippets in buckets per (module, criterion, band) and indexes their
+words with a sorted token list for prefix matches (bisect) and trigram
+postings for typo-tolerant matches. A suggestion request only touches the
+buckets that fit the student's module and grades and the postings of the
+words being typed, never the whole bank.
+
+    {"snippets": [{"text": "...", "module": "EEE-5-CAO", "criterion": "research", "bands": ["A+", "A"]}]}
+"""
+import bisect
+import heapq
+import json
+import os
+import re
+import threading
+import time
+from collections import Counter
+
+from grading import CRITERIA, get_grading_scheme
+from storage import get_store
+
+SNIPPET_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "feedback_snippets.json")
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 25
+# Seconds before the mined snippets are refreshed (in the background)
+REFRESH_INTERVAL = 300.0
+# Weight of a curated snippet, as if it had been written this many times
+CURATED_WEIGHT = 5
+
+# Placeholder comments the form fills in, never worth suggesting
+_PLACEHOLDERS = {"no additional comments.", "required comments not provided.", "error retrieving comments."}
+_MIN_SNIPPET_WORDS = 3
+_TRIGRAM_PROBES = 8
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n+")
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z']+")
+
+# Words that tie a sentence to a criterion; a sentence mentioning more than
+# one criterion is kept for the final-grade band only
+CRITERION_KEYWORDS = {
+    "research": ("research", "literature", "sources", "background", "survey"),
+    "subject_knowledge": ("knowledge", "understanding", "theory", "concepts", "subject"),
+    "critical_analysis": ("analysis", "critical", "critically", "evaluation", "evaluate", "discussion"),
+    "problem_solving": ("testing", "tested", "problem", "problems", "debugging", "solution", "solutions"),
+    "practical_competence": ("practical", "implementation", "implemented", "hardware", "prototype", "build"),
+    "communication": ("communication", "presentation", "written", "writing", "structure", "structured", "figures"),
+    "academic_integrity": ("integrity", "plagiarism", "referencing", "references", "citation", "citations", "cited"),
+}
+_KEYWORD_CRITERIA = {keyword: criterion for criterion, keywords in CRITERION_KEYWORDS.items() for keyword in keywords}
+
+
+def _tokens(text):
+    return [token.strip("'") for token in _TOKEN_SPLIT.split(str(text or "").lower()) if token.strip("'")]
+
+
+def _trigrams(text):
+    padded = f"  {' '.join(_tokens(text))} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def split_sentences(comment):
+    """Sentences of a comment that are worth suggesting again"""
+    sentences = []
+    for sentence in _SENTENCE_SPLIT.split(str(comment or "").strip()):
+        sentence = " ".join(sentence.split())
+        if len(sentence.split()) >= _MIN_SNIPPET_WORDS and sentence.lower() not in _PLACEHOLDERS:
+            sentences.append(sentence)
+    return sentences
+
+
+def detect_criterion(sentence):
+    """The one criterion a sentence talks about, or None"""
+    found = {_KEYWORD_CRITERIA[token] for token in _tokens(sentence) if token in _KEYWORD_CRITERIA}
+    return found.pop() if len(found) == 1 else None
+
+
+class FeedbackBank:
+    """Snippets bucketed by (module, criterion, band) with prefix and trigram indexes"""
+
+    def __init__(self):
+        self.snippets = []        # text of each snippet
+        self._normalised = []     # its words, lower case, for "starts with" ranking
+        self.tags = []            # (module, criterion, band) of each snippet
+        self.weights = []         # how often it was written (curated snippets count extra)
+        self._lookup = {}         # (normalised text, tags) -> snippet index
+        self._buckets = {}        # (module, criterion, band) -> snippet indices
+        self._postings = {}       # token -> snippet indices
+        self._trigrams = {}       # trigram -> snippet indices
+        self._sorted_tokens = []
+        self.built_at = time.time()
+
+    def __len__(self):
+        return len(self.snippets)
+
+    def add(self, text, module=None, criterion=None, band=None, weight=1):
+        """Add a snippet, or count it again if the same text with the same tags is known"""
+        tags = (module or None, criterion or None, band or None)
+        key = (" ".join(_tokens(text)), tags)
+        index = self._lookup.get(key)
+        if index is not None:
+            self.weights[index] += weight
+            return index
+        index = self._lookup[key] = len(self.snippets)
+        self.snippets.append(text)
+        self._normalised.append(key[0])
+        self.tags.append(tags)
+        self.weights.append(weight)
+        self._buckets.setdefault(tags, []).append(index)
+        for token in dict.fromkeys(_tokens(text)):
+            self._postings.setdefault(token, []).append(index)
+        for trigram in _trigrams(text):
+            self._trigrams.setdefault(trigram, []).append(index)
+        return index
+
+    def add_comment(self, comment, module=None, final_band=None, criterion_bands=None):
+        """Mine the sentences of a saved comment"""
+        for sentence in split_sentences(comment):
+            criterion = detect_criterion(sentence)
+            if criterion is not None and criterion_bands and criterion in criterion_bands:
+                self.add(sentence, module, criterion, criterion_bands[criterion])
+            else:
+                self.add(sentence, module, None, final_band)
+
+    def finish(self):
+        """Sort the token list once all snippets are added"""
+        self._sorted_tokens = sorted(self._postings)
+        return self
+
+    def _eligible(self, module, band, criterion_bands):
+        """Snippets that fit the student: their module (or any), their final band and each criterion's band"""
+        eligible = set()
+        for snippet_module in {module or None, None}:
+            for snippet_band in {band or None, None}:
+                eligible.update(self._buckets.get((snippet_module, None, snippet_band), ()))
+            for criterion, criterion_band in (criterion_bands or {}).items():
+                for snippet_band in {criterion_band or None, None}:
+                    eligible.update(self._buckets.get((snippet_module, criterion, snippet_band), ()))
+        return eligible
+
+    def _prefix_matches(self, query_tokens, eligible):
+        """Eligible snippets where every query token prefixes one of their words"""
+        matches = None
+        for token in query_tokens:
+            start = bisect.bisect_left(self._sorted_tokens, token)
+            end = bisect.bisect_left(self._sorted_tokens, token + "\uffff", lo=start)
+            found = set()
+            for word in self._sorted_tokens[start:end]:
+                found.update(self._postings[word])
+            matches = found if matches is None else matches & found
+            matches &= eligible
+            if not matches:
+                return set()
+        return matches or set()
+
+    def _fuzzy_matches(self, query, eligible, exclude):
+        query_trigrams = [trigram for trigram in _trigrams(query) if trigram in self._trigrams]
+        probes = sorted(query_trigrams, key=lambda trigram: len(self._trigrams[trigram]))[:_TRIGRAM_PROBES]
+        if not probes:
+            return Counter()
+        hits = Counter()
+        for trigram in probes:
+            hits.update(index for index in self._trigrams[trigram] if index in eligible and index not in exclude)
+        threshold = max(1, (len(probes) + 1) // 2)
+        return Counter({index: count for index, count in hits.items() if count >= threshold})
+
+    def suggest(self, query, module=None, band=None, criterion_bands=None, limit=DEFAULT_LIMIT):
+        """Top ``limit`` snippets for the sentence being typed, as [{"text", "criterion", "band"}, ...]
+
+        Snippets that start with the typed words come first, then those
+        containing them anywhere, then typo-tolerant matches; ties go to the
+        most frequently written snippet. An empty query lists the most
+        frequent snippets for the student's grades.
+        """
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        eligible = self._eligible(module, band, criterion_bands)
+        query_tokens = _tokens(query)
+        if not query_tokens:
+            ranked = heapq.nlargest(limit, eligible, key=lambda index: (self.weights[index], -index))
+            return [self._result(index) for index in ranked]
+
+        matches = self._prefix_matches(query_tokens, eligible)
+        typed = " ".join(query_tokens)
+
+        def rank(index):
+            starts = self._normalised[index].startswith(typed)
+            return (starts, self.weights[index], -index)
+
+        ranked = heapq.nlargest(limit, matches, key=rank)
+        if len(ranked) < limit:
+            fuzzy = self._fuzzy_matches(query, eligible, set(ranked))
+            ranked += heapq.nlargest(limit - len(ranked), fuzzy,
+                                     key=lambda index: (fuzzy[index], self.weights[index], -index))
+        return [self._result(index) for index in ranked]
+
+    def _result(self, index):
+        _, criterion, band = self.tags[index]
+        return {"text": self.snippets[index], "criterion": criterion, "band": band}
+
+
+def build_feedback_bank(roster=None, store=None, config_path=SNIPPET_CONFIG_FILE):
+    """Bank of curated snippets plus the sentences of every saved comment"""
+    bank = FeedbackBank()
+    try:
+        with open(config_path, "r", encoding="utf-8") as config_file:
+            curated = json.load(config_file).get("snippets", [])
+    except OSError:
+        curated = []
+    for snippet in curated:
+        for band in snippet.get("bands") or [None]:
+            bank.add(snippet["text"], snippet.get("module"), snippet.get("criterion"), band, CURATED_WEIGHT)
+
+    # Final marks and comments written back to the workbook
+    if roster is not None:
+        for record in roster.students.values():
+            comment = record.get("Comments") or record.get("Comment")
+            if not comment:
+                continue
+            module = record.get("Module") or None
+            try:
+                final_band = get_grading_scheme(module).band_for(float(record.get("Marks")))
+            except (TypeError, ValueError):
+                final_band = None
+            bank.add_comment(comment, module, final_band)
+
+    # Recorded markings also know the band of every criterion
+    for marking in (store or get_store()).list_markings():
+        scheme = get_grading_scheme(marking["module"])
+        criterion_bands = {
+            criterion: scheme.band_for(marking["scores"][criterion])
+            for criterion in CRITERIA if criterion in marking["scores"]
+        }
+        bank.add_comment(marking["comment"], marking["module"] or None,
+                         scheme.band_for(marking["final_grade"]), criterion_bands)
+    return bank.finish()
+
+
+_bank = None
+_bank_lock = threading.Lock()
+_refreshing = threading.Event()
+
+
+def get_feedback_bank():
+    """Process-wide feedback bank: built on first use, then refreshed in the
+    background every ``REFRESH_INTERVAL`` seconds while the old one keeps serving"""
+    global _bank
+    with _bank_lock:
+        if _bank is None:
+            _bank = _build_current()
+            return _bank
+        bank = _bank
+    if time.time() - bank.built_at > REFRESH_INTERVAL and not _refreshing.is_set():
+        _refreshing.set()
+        threading.Thread(target=_refresh, name="feedback-bank", daemon=True).start()
+    return bank
+
+
+def _build_current():
+    from roster import get_roster
+    try:
+        roster = get_roster("student_records.xlsx")
+    except Exception as e:
+        print(f"Feedback bank built without the roster comments: {e}")
+        roster = None
+    return build_feedback_bank(roster)
+
+
+def _refresh():
+    global _bank
+    try:
+        bank = _build_current()
+        with _bank_lock:
+            _bank = bank
+    except Exception as e:
+        print(f"Feedback bank refresh failed: {e}")
+    finally:
+        _refreshing.clear()
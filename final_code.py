@@ -1,146 +1,94 @@
 from shiny import App, render, ui, reactive      
-import pandas as pd
 from datetime import datetime
-import tempfile
-import webbrowser
 import os
 import pathlib
-import sys
-import subprocess
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch, cm
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 import io
+import json
+import asyncio
+import contextlib
+import threading
+from urllib.parse import quote, urlencode
+from concurrent.futures import ThreadPoolExecutor, wait as wait_for_futures
+from starlette.applications import Starlette
+from starlette.responses import HTMLResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from grading import CRITERIA_DISPLAY_NAMES, get_grading_scheme, load_grading_schemes, recorded_marking
+from storage import get_store, file_lock, atomic_write_bytes, safe_filename
+from roster import get_roster, keep_snapshot, normalise_student_id, roster_signature
+from search import StudentSearchIndex, get_search_index
+from roster_watch import get_roster_watcher
+from records import AssessmentRecord
+from singleflight import get_single_flight, request_key
+from retention import get_report_retention
+from jobs import get_job_queue
+from allocation import allocate_roster, load_assessors
+from feedback import get_feedback_bank
+from assets import DIST_DIR, ImmutableStaticFiles, build_assets
 
-# Constants for grade ranges
-GRADE_RANGES = {
-    'A+': {'min': 80, 'max': 100, 'color': '#4CAF50'},  # Green
-    'A': {'min': 70, 'max': 79, 'color': '#8BC34A'},    # Light Green
-    'B': {'min': 60, 'max': 69, 'color': '#CDDC39'},    # Lime
-    'C': {'min': 50, 'max': 59, 'color': '#FFEB3B'},    # Yellow
-    'D': {'min': 40, 'max': 49, 'color': '#FFC107'},    # Amber
-    'E': {'min': 30, 'max': 39, 'color': '#FF9800'},    # Orange
-    'F': {'min': 0, 'max': 29, 'color': '#F44336'}      # Red
-}
+# Default grading scheme - per-module schemes are configured in grading_schemes.json
+DEFAULT_GRADING_SCHEME = get_grading_scheme()
+
+# Constants for grade ranges (kept for callers that predate the scheme engine)
+GRADE_RANGES = DEFAULT_GRADING_SCHEME.grade_ranges
 
 # Assessment criteria weights in percentage
-CRITERIA_WEIGHTS = {
-    'research': 5,
-    'subject_knowledge': 20,
-    'critical_analysis': 25,
-    'problem_solving': 30,
-    'practical_competence': 5,
-    'communication': 10,
-    'academic_integrity': 5
+CRITERIA_WEIGHTS = DEFAULT_GRADING_SCHEME.weights
+
+# Read-only form inputs filled from the roster when a student is selected
+STUDENT_FIELD_INPUTS = {
+    "student_name": "Name",
+    "student_surname": "Surname",
+    "student_course": "Course",
+    "student_mode": "Mode",
+    "module_name": "Module",
+    "report_title": "Title",
+    "supervisor": "Supervisor",
 }
 
+# Deployment settings - with more than one worker, every worker shares the
+# store configured through ASSESSMENT_STORE (see storage.py)
+WORKER_COUNT = int(os.environ.get("ASSESSMENT_WORKERS", "1"))
+SERVER_HOST = os.environ.get("ASSESSMENT_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("ASSESSMENT_PORT", "8051"))
+
+# Minified, fingerprinted CSS/JS bundles built from static/ (see assets.py)
+ASSET_BUNDLES = build_assets()
+
 # List of all criteria for checking completeness
 ALL_CRITERIA = list(CRITERIA_WEIGHTS.keys())
 
-# Mapping from criteria IDs to display names
-CRITERIA_DISPLAY_NAMES = {
-    'research': 'Research',
-    'subject_knowledge': 'Subject Knowledge',
-    'critical_analysis': 'Critical Analysis',
-    'problem_solving': 'Testing and Problem-Solving Skills',
-    'practical_competence': 'Practical Competence',
-    'communication': 'Communication and Presentation',
-    'academic_integrity': 'Academic Integrity'
-}
-
-# Function to get student details
-# FIXED: Function to get student details - completely revised with column mapping
-# FIXED: Function to get student details - completely revised with column mapping
+# Function to get student details from the indexed roster
 def get_student_details(student_id, filename="student_records.xlsx"):
-    """Get details for a specific student with column name cleaning"""
+    """Get details for a specific student from the validated, indexed roster"""
     try:
-        # Print the student ID for debugging
         print(f"Looking up student with ID: {student_id}")
         
-        # Try to read the Excel file
-        try:
-            # Read the Excel file
-            df = pd.read_excel(filename)
-            print(f"Successfully read Excel file with {len(df)} records")
-            
-            # Debug: Print the first few rows to see the data
-            print("First 2 rows of data:")
-            print(df.head(2))
-            
-            # CRITICAL FIX: Clean column names by removing trailing spaces
-            df.columns = [col.strip() for col in df.columns]
-            print(f"Cleaned Excel columns: {df.columns.tolist()}")
-            
-            # Debug: Print student IDs from the first column
-            print("Student IDs in file:", df["Student_ID"].tolist())
-            
-            # Create a mapping for our standard field names to Excel columns
-            column_mapping = {
-                "Student_ID": "Student_ID",
-                "Name": "Name",
-                "Surname": "Surname",
-                "Course": "Course",
-                "Mode": "Mode",
-                "Module": "Module",
-                "Title": "Title",
-                "Supervisor": "Supervisor"
-            }
-            
-            # CRITICAL FIX: Convert student_id to string for comparison
-            student_id_str = str(student_id).strip()
-            
-            # DEBUG: Show ID types for comparison
-            print(f"Looking for ID: {student_id_str}")
-            print("ID types in Excel:")
-            for idx, excel_id in enumerate(df["Student_ID"].head(3)):
-                print(f"  Excel ID: {excel_id} (type: {type(excel_id).__name__})")
-                
-            # CRITICAL FIX: Convert all IDs to strings for comparison
-            match_found = False
-            for idx, row in df.iterrows():
-                if str(row["Student_ID"]).strip() == student_id_str:
-                    student_row = row
-                    match_found = True
-                    print(f"Found match for ID: {student_id_str}!")
-                    break
-            
-            if not match_found:
-                print(f"Student ID {student_id} not found after string conversion check")
-                return None
-            
-            # Build the student info dictionary with our standardized field names
-            student_info = {}
-            for field, column in column_mapping.items():
-                if column in student_row.index:
-                    value = student_row[column]
-                    # Handle NaN values
-                    if pd.isna(value):
-                        value = ""
-                    student_info[field] = value
-                    print(f"Set {field} = {value}")
-            
-            print(f"Found student record: {student_info}")
-            return student_info
-            
-        except Exception as e:
-            print(f"Error reading Excel file: {e}")
-            import traceback
-            traceback.print_exc()
+        # The roster is imported once and re-imported only when the file changes
+        roster = get_roster(filename)
+        student_row = roster.get(student_id)
+        
+        if student_row is None:
+            print(f"Student ID {student_id} not found in roster")
             return None
         
+        # A compact, read-only StudentRecord, decoded from the shared roster snapshot on each lookup
+        print(f"Found student record: {student_row}")
+        return student_row
+        
     except Exception as e:
         print(f"Exception in get_student_details: {e}")
         import traceback
         traceback.print_exc()
         return None
+
 # Function to update student marks and comments
 # FIXED: Update student record function with column mapping support
 # FIXED: Update student record function with column mapping support
 def update_student_record(student_id, marks, comment, filename="student_records.xlsx"):
     """Update marks and comment for a specific student with column mapping support"""
+    # pandas is only needed to rewrite the workbook, so it is loaded on the first save
+    import pandas as pd
+    
     try:
         # Define column names (these were missing)
         id_column = "Student_ID"
@@ -152,51 +100,60 @@ def update_student_record(student_id, marks, comment, filename="student_records.
         excel_path = os.path.join(script_dir, filename)
         print(f"Trying to update Excel at: {excel_path}")
         
-        # Read the existing Excel file
-        df = pd.read_excel(excel_path)
-        print(f"Read Excel file with {len(df)} rows for updating")
+        # Serialise read-modify-write across worker processes
+        with file_lock(excel_path):
+            # Read the existing Excel file
+            signature = roster_signature(excel_path)
+            df = pd.read_excel(excel_path)
+            print(f"Read Excel file with {len(df)} rows for updating")
         
-        # Clean column names
-        df.columns = [col.strip() for col in df.columns]
-        print(f"Available columns: {df.columns.tolist()}")
+            # Clean column names
+            df.columns = [col.strip() for col in df.columns]
+            print(f"Available columns: {df.columns.tolist()}")
         
-        # Check if required columns exist
-        if id_column not in df.columns:
-            print(f"Error: Required column '{id_column}' not found in Excel file")
-            return False, f"Required column '{id_column}' not found in Excel"
+            # Check if required columns exist
+            if id_column not in df.columns:
+                print(f"Error: Required column '{id_column}' not found in Excel file")
+                return False, f"Required column '{id_column}' not found in Excel"
             
-        # Create columns if they don't exist
-        if marks_column not in df.columns:
-            print(f"Creating new column '{marks_column}'")
-            df[marks_column] = ""
+            # Create columns if they don't exist
+            if marks_column not in df.columns:
+                print(f"Creating new column '{marks_column}'")
+                df[marks_column] = ""
             
-        if comment_column not in df.columns:
-            print(f"Creating new column '{comment_column}'")
-            df[comment_column] = ""
+            if comment_column not in df.columns:
+                print(f"Creating new column '{comment_column}'")
+                df[comment_column] = ""
         
-        # IMPORTANT FIX: Convert student_id to string for comparison
-        student_id_str = str(student_id).strip()
-        print(f"Looking for student ID: {student_id_str}")
+            # Compare normalised IDs so 123, 123.0 and " 123" all match
+            student_id_str = normalise_student_id(student_id)
+            print(f"Looking for student ID: {student_id_str}")
         
-        # Check if student exists - with string conversion
-        student_found = False
-        for idx, row in df.iterrows():
-            if str(row[id_column]).strip() == student_id_str:
-                student_found = True
-                break
-                
-        if not student_found:
-            print(f"Student ID {student_id} not found in records")
-            return False, "Student ID not found"
+            def normalised_or_blank(value):
+                try:
+                    return normalise_student_id(value)
+                except ValueError:
+                    return ""
         
-        # Update with string comparison
-        print(f"Updating student {student_id_str} with marks={marks}")
-        df.loc[df[id_column].astype(str).str.strip() == student_id_str, marks_column] = marks
-        df.loc[df[id_column].astype(str).str.strip() == student_id_str, comment_column] = comment
+            matches = df[id_column].map(normalised_or_blank) == student_id_str
+            if not matches.any():
+                print(f"Student ID {student_id} not found in records")
+                return False, "Student ID not found"
         
-        # Save back to Excel with absolute path
-        df.to_excel(excel_path, index=False)
-        print(f"Successfully saved updated data to {excel_path}")
+            # Update the matching row(s)
+            print(f"Updating student {student_id_str} with marks={marks}")
+            df[marks_column] = df[marks_column].astype(object)
+            df[comment_column] = df[comment_column].astype(object)
+            df.loc[matches, marks_column] = marks
+            df.loc[matches, comment_column] = comment
+        
+            # Save back to Excel atomically so readers never see a half-written file
+            buffer = io.BytesIO()
+            df.to_excel(buffer, index=False)
+            atomic_write_bytes(excel_path, buffer.getvalue())
+            print(f"Successfully saved updated data to {excel_path}")
+            # Only marks changed, so the imported roster stays valid (no re-import or reload)
+            keep_snapshot(excel_path, signature)
         
         return True, "Student record updated successfully"
         
@@ -206,278 +163,242 @@ def update_student_record(student_id, marks, comment, filename="student_records.
         traceback.print_exc()
         return False, f"Error updating record: {str(e)}"
 
-def calculate_final_grade(scores):
+def calculate_final_grade(scores, scheme=None):
     """Calculate weighted final grade based on criteria weights"""
-    weighted_sum = sum(
-        scores[f'{criterion}_score'] * CRITERIA_WEIGHTS[criterion]
-        for criterion in ALL_CRITERIA
-    )
-    
-    # Divide by total weight (100%)
-    final_grade = weighted_sum / 100
-    return round(final_grade, 1)
+    scheme = scheme or DEFAULT_GRADING_SCHEME
+    return scheme.calculate_final_grade(scores)
 
-def find_logo_path():
-    """Find the logo file using relative paths or create a dummy logo if not found"""
-    # Try several common locations
-    possible_locations = [
-        "lsbu_logo.png",                         # Current directory
-        os.path.join("assets", "lsbu_logo.png"), # Assets subdirectory
-        os.path.join("..", "assets", "lsbu_logo.png"), # Parent dir assets
-        os.path.join(os.path.dirname(__file__), "lsbu_logo.png"), # Script directory
-    ]
-    
-    for location in possible_locations:
-        if os.path.exists(location):
-            return location
-    
-    # If not found, create a dummy logo file
+def render_and_store_report(student_id, report_data, filename):
+    """Render a report and put it in the store; returns a result dict with ``report_key`` when ``ok``"""
+    from report_pdf import render_report
+    
+    # Generate PDF in memory with exception logging
+    pdf_buffer = io.BytesIO()
     try:
-        from PIL import Image, ImageDraw, ImageFont
-        
-        # Create a blank image for the logo
-        img = Image.new('RGB', (200, 100), color=(0, 51, 102))  # LSBU blue color
-        d = ImageDraw.Draw(img)
-        
-        # Add text (if font not available, it will use default)
-        try:
-            font = ImageFont.truetype("arial.ttf", 36)
-        except:
-            font = ImageFont.load_default()
-            
-        d.text((40, 30), "LSBU", fill=(255, 255, 255), font=font)
-        
-        # Save to a temporary location
-        temp_logo_path = os.path.join(tempfile.gettempdir(), "lsbu_logo_temp.png")
-        img.save(temp_logo_path)
-        print(f"Created temporary logo at: {temp_logo_path}")
-        return temp_logo_path
+        render_report(report_data, pdf_buffer)
+        print(f"PDF successfully created: {filename}")
     except Exception as e:
-        print(f"Error creating dummy logo: {e}")
-        # If creation fails, return None
-        return None
-
-# PDF generation function with fixes
-def create_pdf(data, output_path):
-    # Reduced margins to use more page space
-    doc = SimpleDocTemplate(output_path, pagesize=A4, 
-                          leftMargin=0.3*inch, rightMargin=0.3*inch, 
-                          topMargin=0.4*inch, bottomMargin=0.4*inch)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Create custom styles with updated alignment
-    styles.add(ParagraphStyle(
-        name='ModuleName',
-        parent=styles['Normal'],
-        fontSize=12,
-        alignment=TA_RIGHT,  # Keep right alignment
-    ))
+        print(f"Error in create_pdf function: {e}")
+        import traceback
+        traceback.print_exc()
+        return {"ok": False, "message": f"PDF generation failed in create_pdf function: {str(e)}"}
+    
+    # Verify the PDF was created
+    pdf_bytes = pdf_buffer.getvalue()
+    if not pdf_bytes:
+        return {"ok": False, "message": "PDF file was created but is empty. Check ReportLab installation."}
+    
+    # Save the report to the shared store so any worker can serve it
+    store = get_store()
+    try:
+        new_report_key = store.put_report(student_id, filename, pdf_bytes)
+    except Exception as e:
+        print(f"Error saving PDF to report store: {e}")
+        return {"ok": False, "message": f"PDF was generated but could not be saved: {str(e)}"}
+    # Keep the report store within its quota (throttled, off the request path)
+    BACKGROUND_EXECUTOR.submit(get_report_retention().maybe_enforce)
+    return {"ok": True, "report_key": new_report_key, "filename": filename}
 
-    styles.add(ParagraphStyle(
-        name='DivisionText',
-        parent=styles['Normal'],
-        fontSize=12,
-        alignment=TA_RIGHT,  # Changed from CENTER to RIGHT
-    ))
+def generate_and_save_report(student_id, report_data, filename):
+    """Render a report and save it with the marks of a student.
 
-    styles.add(ParagraphStyle(
-        name='EngineeringText',
-        parent=styles['Normal'],
-        fontSize=14,
-        fontName='Helvetica-Bold',
-        alignment=TA_RIGHT,  # Changed from CENTER to RIGHT
-        leading=16,
-    ))
-    
-    styles.add(ParagraphStyle(
-        name='CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        alignment=TA_CENTER,
-        spaceAfter=12,
-    ))
+    Returns a result dict (``ok``, ``message``, ``report_key``,
+    ``filename``) so that it can be shared between identical requests.
+    """
+    result = render_and_store_report(student_id, report_data, filename)
+    if not result["ok"]:
+        return result
+    new_report_key = result["report_key"]
+    store = get_store()
     
-    styles.add(ParagraphStyle(
-        name='CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=16,
-        alignment=TA_CENTER,
-        spaceAfter=20,
-    ))
+    # After successful PDF generation, update Excel
+    final_grade_value = report_data['final_grade']
+    assessor_comments = report_data['assessor_comments']
+    success, message = update_student_record(student_id, final_grade_value, assessor_comments)
+    if not success:
+        # Not ok, so the result is not remembered and a retry writes the workbook again;
+        # the draft is kept and the marks stay on the previous report until then
+        return {"ok": False, "message": f"PDF generated, but the marks could not be saved: {message}. Please try again."}
+    store.record_marks(student_id, final_grade_value, assessor_comments, report_key=new_report_key)
+    # The report's marks are also this assessor's marking, for double marking
+    store.put_marking(
+        student_id, report_data['assessor_name'], report_data['module_name'],
+        {criterion: report_data[f'{criterion}_score'] for criterion in ALL_CRITERIA},
+        final_grade_value, assessor_comments,
+    )
+    store.delete_draft(student_id)
     
-    styles.add(ParagraphStyle(
-        name='NormalLarge',
-        parent=styles['Normal'],
-        fontSize=12,  # Increased normal text size
-    ))
+    message = f"PDF report generated successfully: {filename}"
+    return {"ok": True, "message": message, "report_key": new_report_key, "filename": filename}
+
+def is_current_report(store, student_id, report_key):
+    """Whether ``report_key`` is still the student's recorded report (and has not been deleted)"""
+    marks = store.get_marks(student_id)
+    return bool(marks) and marks.get("report_key") == report_key and store.has_report(report_key)
+
+def generate_report_once(student_id, report_data, filename):
+    """generate_and_save_report, shared between identical requests; returns (result, reused)"""
+    store = get_store()
+    if isinstance(report_data, AssessmentRecord):
+        # Same key as the equivalent report-data dict
+        key_data = report_data.to_dict()
+    else:
+        key_data = report_data
+    key = request_key("generate_report", student_id, key_data)
+    return get_single_flight().run(
+        key,
+        lambda: generate_and_save_report(student_id, report_data, filename),
+        is_valid=lambda previous: is_current_report(store, student_id, previous.get("report_key")),
+    )
+
+# Bulk report runs: one persistent job per module, one item per marked student
+def cohort_report_students(module_name):
+    """Students of a module with a recorded report and marking, in ID order"""
+    store = get_store()
+    marked = {marking["student_id"] for marking in store.list_markings(module_name)}
+    return sorted(student_id for student_id in marked if store.get_marks(student_id))
+
+def cohort_report_data(student_id):
+    """(recorded marks, report data) of a student's report, from the marking behind it"""
+    store = get_store()
+    marks = store.get_marks(student_id)
+    if not marks:
+        raise ValueError(f"No report recorded for student {student_id}")
+    marking = recorded_marking(store.get_markings(student_id), marks)
+    if marking is None:
+        raise ValueError(f"No marking recorded for student {student_id}")
+    student = get_student_details(student_id)
+    if student is None:
+        raise ValueError(f"Student {student_id} is not in the roster")
+    report_data = AssessmentRecord(
+        module_name=marking["module"] or "Module not specified",
+        report_title=student.get("Title") or "Report title not specified",
+        student_name=student.get("Name") or "Student name not specified",
+        assessor_name=marking["assessor"],
+        assessor_comments=marking["comment"] or "No additional comments.",
+        final_grade=marking["final_grade"],
+        scores=marking["scores"],
+    )
+    return marks, report_data
+
+def generate_cohort_report(student_id, params):
+    """Job item: rebuild a student's report PDF from the marking behind their recorded report.
+
+    Only the PDF is rebuilt: the workbook and the markings are left as
+    they are, and the recorded marks just point at the new report.
+    """
+    marks, report_data = cohort_report_data(student_id)
+    safe_name = "".join(c if c.isalnum() else "_" for c in report_data["student_name"])
+    filename = f"assessment_{safe_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    result = render_and_store_report(student_id, report_data, filename)
+    if not result["ok"]:
+        raise RuntimeError(result["message"])
+    get_store().record_marks(student_id, marks["marks"], marks["comment"], report_key=result["report_key"])
+    return {"report_key": result["report_key"]}
+
+def bundle_cohort_reports(job, items):
+    """Job finish: all the module's regenerated reports in one PDF, for printing and the exam board.
+
+    Pages share one copy of the logo (and, with ``ASSESSMENT_PDF_MODE=stamped``,
+    one background form per scheme), so the bundle renders and stores in a
+    fraction of the time and size of the separate reports.
+    """
+    from report_pdf import create_report_bundle
     
-    # Logo loading with more robust error handling
-    try:
-        logo_path = find_logo_path()
-        
-        if logo_path and os.path.exists(logo_path):
-            try:
-                # Test if the file is valid by attempting to open it
-                with open(logo_path, 'rb') as test_file:
-                    test_file.read(10)  # Read first 10 bytes to check if readable
-                
-                # If no error, proceed with image creation
-                logo_content = Image(logo_path, width=2.0*inch, height=1.0*inch)
-                print(f"Successfully loaded logo from: {logo_path}")
-            except Exception as logo_error:
-                print(f"Error opening logo file {logo_path}: {logo_error}")
-                logo_content = Paragraph("LSBU", styles['Heading2'])
-        else:
-            print("Logo path not valid, using text fallback")
-            logo_content = Paragraph("LSBU", styles['Heading2'])
-    except Exception as e:
-        print(f"Exception in logo handling: {e}")
-        logo_content = Paragraph("LSBU", styles['Heading2'])
-    
-    # Restructured header layout - adjusted cell structure
-    header_data = [
-        [
-            logo_content,
-            Paragraph("Module Name: " + data['module_name'], styles['ModuleName']),
-        ],
-        [
-            "",  # Empty cell - logo spans vertically
-            Paragraph("Division of", styles['DivisionText']),
-        ],
-        [
-            "",  # Empty cell  
-            Paragraph("Electrical and Electronic Engineering", styles['EngineeringText']),
-        ]
-    ]
+    module_name = job["params"]["module"]
+    reports = [cohort_report_data(item["item"])[1] for item in items if item["status"] == "done"]
+    pdf_buffer = io.BytesIO()
+    create_report_bundle(reports, pdf_buffer)
+    filename = f"assessment_{safe_filename(module_name)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    # Stored as a report of the module, so it downloads like any other report
+    report_key = get_store().put_report(f"module_{module_name}", filename, pdf_buffer.getvalue())
+    BACKGROUND_EXECUTOR.submit(get_report_retention().maybe_enforce)
+    return {"report_key": report_key, "reports": len(reports)}
 
-    # Adjusted header table with proper dimensions
-    header_table = Table(header_data, colWidths=[2.5*inch, 4.0*inch])
-    header_table.setStyle(TableStyle([
-        ('VALIGN', (0, 0), (0, 2), 'TOP'),  # Logo aligned to top
-        ('VALIGN', (1, 0), (1, 0), 'TOP'),  # Module name at top
-        ('VALIGN', (1, 1), (1, 2), 'MIDDLE'),  # Division text vertically centered
-        ('ALIGN', (0, 0), (0, 2), 'LEFT'),   # Logo left aligned
-        ('ALIGN', (1, 0), (1, 2), 'RIGHT'),  # All right column elements right-aligned
-        ('SPAN', (0, 0), (0, 2)),  # Logo spans all rows
-        ('GRID', (0, 0), (-1, -1), 0, colors.white),  # Invisible grid
-        ('RIGHTPADDING', (1, 0), (1, 2), 5),  # Reduced right padding to pull text more to edge
-        ('BOTTOMPADDING', (1, 1), (1, 1), 0),  # Remove padding between Division and Engineering
-        ('TOPPADDING', (1, 2), (1, 2), 0),     # Remove padding between Division and Engineering
-    ]))
-    elements.append(header_table)
-    elements.append(Spacer(1, 0.4*inch))
-    
-    # Title with larger text
-    elements.append(Paragraph("Assessment", styles['CustomTitle']))
-    elements.append(Paragraph(f"Assignment 2 - Report: {data['report_title']}", styles['CustomSubtitle']))
-    
-    # Create grade table with fixed column structure
-    # First row with student name (span across all columns)
-    grade_data = [
-        [Paragraph(f"Student: {data['student_name']}", styles['NormalLarge']), '', '', '', '', '', '', ''],
-    ]
-    
-    # Grade range headers - corrected structure with criteria column empty
-    grade_data.append(['', 'A+', 'A', 'B', 'C', 'D', 'E', 'F'])
-    
-    # FIX: Grade ranges - with correct string format instead of subtraction
-    grade_data.append([
-        '', 
-        f"{GRADE_RANGES['A+']['min']}-{GRADE_RANGES['A+']['max']}", 
-        f"{GRADE_RANGES['A']['min']}-{GRADE_RANGES['A']['max']}", 
-        f"{GRADE_RANGES['B']['min']}-{GRADE_RANGES['B']['max']}",
-        f"{GRADE_RANGES['C']['min']}-{GRADE_RANGES['C']['max']}", 
-        f"{GRADE_RANGES['D']['min']}-{GRADE_RANGES['D']['max']}", 
-        f"{GRADE_RANGES['E']['min']}-{GRADE_RANGES['E']['max']}", 
-        f"{GRADE_RANGES['F']['min']}-{GRADE_RANGES['F']['max']}"
-    ])
-    
-    # Assessment criteria rows - with weights displayed
-    criteria = [
-        (f"{CRITERIA_DISPLAY_NAMES['research']} ({CRITERIA_WEIGHTS['research']}%)", data['research_score']),
-        (f"{CRITERIA_DISPLAY_NAMES['subject_knowledge']} ({CRITERIA_WEIGHTS['subject_knowledge']}%)", data['subject_knowledge_score']),
-        (f"{CRITERIA_DISPLAY_NAMES['critical_analysis']} ({CRITERIA_WEIGHTS['critical_analysis']}%)", data['critical_analysis_score']),
-        (f"{CRITERIA_DISPLAY_NAMES['problem_solving']} ({CRITERIA_WEIGHTS['problem_solving']}%)", data['problem_solving_score']),
-        (f"{CRITERIA_DISPLAY_NAMES['practical_competence']} ({CRITERIA_WEIGHTS['practical_competence']}%)", data['practical_competence_score']),
-        (f"{CRITERIA_DISPLAY_NAMES['communication']} ({CRITERIA_WEIGHTS['communication']}%)", data['communication_score']),
-        (f"{CRITERIA_DISPLAY_NAMES['academic_integrity']} ({CRITERIA_WEIGHTS['academic_integrity']}%)", data['academic_integrity_score'])
-    ]
-    
-    for criterion, score in criteria:
-        row = [Paragraph(criterion, styles['NormalLarge'])]  # Using larger font
-        # Determine which column the score falls into
-        score_int = int(score)
-        for grade in ['A+', 'A', 'B', 'C', 'D', 'E', 'F']:
-            grade_range = GRADE_RANGES[grade]
-            if grade_range['min'] <= score_int <= grade_range['max']:
-                row.append(score)
-            else:
-                row.append('')
-        
-        grade_data.append(row)
-    
-    # Create and style the grade table with proportional column widths
-    # Using full available width and taller rows
-    available_width = doc.width
-    col_widths = [available_width * 0.40] + [available_width * 0.086] * 7  # Adjusted for full width
-    grade_table = Table(grade_data, colWidths=col_widths, rowHeights=[0.5*inch] + [0.4*inch] * 9)  # Taller rows
-    grade_table.setStyle(TableStyle([
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('SPAN', (0, 0), (-1, 0)),  # Span the student name row
-        ('ALIGN', (1, 1), (-1, -1), 'CENTER'),  # Center-align all grade columns
-        ('ALIGN', (0, 1), (0, -1), 'LEFT'),     # Left-align criteria column
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BACKGROUND', (0, 1), (-1, 2), colors.lightgrey),  # Grey background for headers
-        ('FONTSIZE', (1, 1), (-1, 2), 12),  # Larger font for headers
-    ]))
-    elements.append(grade_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Assessor's comments - larger and using more width
-    comments_data = [
-        [Paragraph("Assessor's Comments", styles['NormalLarge']), 
-         Paragraph("Comments (Written Feedback) of the overall Assignment Performance", styles['NormalLarge'])],
-        [Paragraph(data['assessor_comments'], styles['NormalLarge'])]
-    ]
-    
-    comments_table = Table(comments_data, colWidths=[available_width * 0.25, available_width * 0.75], rowHeights=[0.4*inch, 1.2*inch])  # Taller rows
-    comments_table.setStyle(TableStyle([
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('SPAN', (0, 1), (1, 1)),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),  # Grey background for header
-    ]))
-    elements.append(comments_table)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Final assessment row - larger text and more width
-    final_row = [
-        [Paragraph(f"Assessed by: {data['assessor_name']}", styles['NormalLarge']),
-         Paragraph("*Grade (%)", styles['NormalLarge']),
-         Paragraph(data['final_grade'], styles['NormalLarge'])]
-    ]
-    
-    final_table = Table(final_row, colWidths=[available_width * 0.6, available_width * 0.2, available_width * 0.2], rowHeights=[0.45*inch])  # Taller row
-    final_table.setStyle(TableStyle([
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('ALIGN', (1, 0), (2, 0), 'CENTER'),  # Center the grade columns
-    ]))
-    elements.append(final_table)
-    
-    # Disclaimer - larger text
-    elements.append(Spacer(1, 0.25*inch))
-    elements.append(Paragraph("* This grade is provisional only and may be subject to change.", styles['NormalLarge']))
-    
-    # Current month/year - larger text
-    elements.append(Spacer(1, 0.5*inch))
-    current_date = datetime.now().strftime("%B %Y")  # FIX: Using proper date format
-    date_paragraph = Paragraph(current_date, styles['NormalLarge'])
-    date_paragraph.hAlign = 'RIGHT'
-    elements.append(date_paragraph)
-    
-    doc.build(elements)
+# Allocation and term archiving run as one-item jobs, so that they survive a
+# restart and show their progress and outcome in the job list
+def allocate_students_job(roster_path, params):
+    """Job item: allocate the roster's students to the configured assessors"""
+    allocation = allocate_roster(get_roster(roster_path))
+    return {"message": allocation.summary()}
+
+def archive_term_job(term, params):
+    """Job item: snapshot the current term into the archive.
+
+    The dashboard refuses an archived term before queueing unless asked to
+    replace it, so the job always overwrites: a rerun after a crash must not
+    fail on the file its first run wrote.
+    """
+    from archive import archive_term
+    counts = archive_term(params["year"], term, get_roster(params["roster"]), overwrite=True)
+    return {"message": f"Archived {sum(counts.values())} row(s) of {len(counts)} module(s) for {term}"}
+
+def single_item_result(job, items):
+    """Job finish of one-item jobs: the item's result is the job's"""
+    return items[0]["result"]
+
+# Background work for rapid marking (prefetching students, saving reports)
+BACKGROUND_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="assessment-background")
+
+def fetch_student(student_id, pending_save=None):
+    """Roster record and saved draft of a student, after any save still running for them"""
+    if pending_save is not None:
+        wait_for_futures([pending_save])
+    return get_student_details(student_id), get_store().get_draft(student_id)
+
+# Comment block, rendered once. Whether comments are required follows the
+# browser-side grade preview, so the textarea is never rebuilt while typing
+def comment_section():
+    return ui.div(
+        {"id": "comment_block", "style": "display: none;",
+         "data-min-words": str(DEFAULT_GRADING_SCHEME.min_comment_words)},
+        ui.h5("Assessor Comments", style="margin-bottom: 10px;"),
+        ui.p(
+            {"id": "comment_required_notice",
+             "style": "display: none; color: #721c24; background-color: #f8d7da; padding: 10px; border-radius: 5px;"},
+            "This grade requires detailed feedback (minimum ",
+            ui.tags.span({"id": "comment_min_words"}, str(DEFAULT_GRADING_SCHEME.min_comment_words)),
+            " words)."
+        ),
+        ui.div(
+            {"id": "comment_optional_toggle"},
+            ui.input_checkbox("show_comments", "Add comments for this assessment", False),
+        ),
+        ui.div(
+            {"id": "comment_editor", "style": "display: none;"},
+            # Sent to the server when the textarea loses focus, not on every keystroke
+            ui.input_text_area(
+                "assessor_comments",
+                "",
+                rows=6,
+                resize="vertical",
+                placeholder="Please provide detailed feedback for this grade...",
+                width="100%",
+                update_on="blur"
+            ),
+            # Snippets from the feedback bank for the sentence being typed (feedback-suggestions.js)
+            ui.tags.ul({"id": "feedback_suggestions", "class": "feedback-suggestions", "role": "listbox",
+                        "style": "display: none;"}),
+            ui.div({"id": "comment_word_counter", "class": "comment-word-counter"}, "0 words"),
+        ),
+        ui.div(
+            {"id": "comment_warning", "class": "alert alert-danger", "role": "alert", "style": "display: none;"},
+            ui.tags.b("Warning: "),
+            ui.tags.span({"id": "comment_warning_text"})
+        )
+    )
+
+# Live final grade, computed in the browser (static/js/grade-preview.js) from the
+# slider positions with the weights and bands of the current grading scheme. The server recomputes the
+# grade itself when a report is generated, so this is only a preview
+def grade_preview():
+    return ui.div(
+        {"id": "calculated_grade", "data-scheme": json.dumps(DEFAULT_GRADING_SCHEME.to_dict())},
+        ui.h3(
+            {"style": "color: #999; font-weight: bold; text-align: center;"},
+            "Final Grade: Not yet calculated"
+        )
+    )
 
 # Helper function to generate the grade selector UI - reused for all criteria
 def create_grade_selector(id_prefix, label, default_grade="A"):
@@ -485,7 +406,7 @@ def create_grade_selector(id_prefix, label, default_grade="A"):
     grade_select = ui.input_select(
         f"{id_prefix}_grade", 
         "",  # Empty label to prevent it showing inline
-        choices=list(GRADE_RANGES.keys()),
+        choices=DEFAULT_GRADING_SCHEME.grades,
         selected=default_grade,
         width="100%"
     )
@@ -515,255 +436,11 @@ def create_grade_selector(id_prefix, label, default_grade="A"):
 # Enhanced UI with new features
 app_ui = ui.page_fluid(
     ui.tags.head(
-        ui.tags.style("""
-        .card {
-            border-radius: 10px;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.1);
-            margin-bottom: 20px;
-            border: none;
-        }
-        .card-header {
-            background-color: #003366;
-            color: white;
-            border-radius: 10px 10px 0 0 !important;
-            padding: 12px 20px;
-            font-weight: bold;
-        }
-        .card-body {
-            padding: 20px;
-        }
-        .form-group {
-            margin-bottom: 15px;
-        }
-        .btn-success {
-            background-color: #28a745;
-            border-color: #28a745;
-            font-weight: bold;
-            padding: 10px 25px;
-        }
-        .premium-textarea {
-            border: 1px solid #ced4da;
-            border-radius: 8px;
-            padding: 10px;
-            transition: border-color 0.15s ease-in-out, box-shadow 0.15s ease-in-out;
-            font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-            resize: vertical;
-        }
-        .premium-textarea:focus {
-            border-color: #80bdff;
-            box-shadow: 0 0 0 0.2rem rgba(0, 123, 255, 0.25);
-        }
-        .alert {
-            border-radius: 8px;
-            padding: 15px;
-            margin-bottom: 15px;
-        }
-        .grade-slider .irs-bar,
-        .grade-slider .irs-bar-edge {
-            background-color: var(--slider-color, #007bff);
-            border-color: var(--slider-color, #007bff);
-        }
-        .grade-slider.AP .irs-bar { --slider-color: #4CAF50; }
-        .grade-slider.A .irs-bar { --slider-color: #8BC34A; }
-        .grade-slider.B .irs-bar { --slider-color: #CDDC39; }
-        .grade-slider.C .irs-bar { --slider-color: #FFEB3B; }
-        .grade-slider.D .irs-bar { --slider-color: #FFC107; }
-        .grade-slider.E .irs-bar { --slider-color: #FF9800; }
-        .grade-slider.F .irs-bar { --slider-color: #F44336; }
-        
-        /* Fixed position container to prevent shaking */
-        .grade-select-container {
-            position: relative;
-            width: 100px;
-            height: 100px;
-            margin: 0 auto;
-            overflow: visible;
-        }
-        
-        /* Remove any unwanted text labels */
-        .grade-select-container label {
-            display: none !important;
-        }
-        
-        /* Custom grade styling with fixed positioning and NO default indicators */
-        .grade-select-container select {
-            position: absolute;
-            top: 0;
-            left: 0;
-            width: 100px !important;
-            height: 100px !important;
-            font-size: 36px !important;
-            font-weight: bold !important;
-            text-align: center !important;
-            text-align-last: center !important;
-            padding: 0 !important;
-            border: 2px solid #ccc !important;
-            border-radius: 8px !important;
-            background-color: #f8f9fa !important;
-            cursor: pointer !important;
-            margin: 0 !important;
-            display: block !important;
-            
-            /* Fully remove all default dropdown indicators */
-            appearance: none !important;
-            -webkit-appearance: none !important;
-            -moz-appearance: none !important;
-            background-image: none !important;
-            z-index: 10;
-        }
-        
-        /* Add a dropdown arrow to the right of the letter */
-        .grade-select-container::after {
-            content: "⌄" !important;
-            position: absolute !important;
-            top: 28px !important;  /* Vertically center with the grade letter */
-            right: 15px !important;  /* Position on right side */
-            font-size: 24px !important;
-            color: #666 !important;
-            z-index: 11 !important;
-        }
-        
-        /* Remove any additional dropdown indicators that might be added by frameworks */
-        .grade-select-container .selectize-input::after,
-        .grade-select-container select + span,
-        .grade-select-container select + div,
-        .grade-select-container select + svg {
-            display: none !important;
-        }
-        
-        /* Force size when hovering with fixed positioning - position to the LEFT */
-        .grade-select-container.hovering select {
-            height: auto !important;
-            min-height: 250px !important;
-            overflow: visible !important;
-            z-index: 9999 !important;
-            left: -100px !important; /* Move dropdown to the left side */
-        }
-        
-        /* Style dropdown options with consistent size */
-        .grade-select-container select option {
-            padding: 10px 0 !important;
-            font-size: 28px !important;
-            font-weight: bold !important;
-            text-align: center !important;
-            width: 100px !important;
-            box-sizing: border-box !important;
-        }
-        
-        /* Hide any stray text that might be appearing */
-        .grade-select-container + span,
-        .grade-select-container + div {
-            display: none !important;
-        }
-        
-        /* Style for criterion labels */
-        .criterion-label {
-            font-weight: bold;
-            margin-bottom: 5px;
-            display: block !important;
-            font-size: 14px;
-        }
-        """)
+        # Fingerprinted bundles built from static/ (see assets.py), cached by browsers
+        ui.tags.link(rel="stylesheet", href=f"assets/{ASSET_BUNDLES['dashboard.css']}"),
+        ui.tags.script(src=f"assets/{ASSET_BUNDLES['dashboard.js']}", defer=True)
     ),
     
-    # JavaScript with improved stability
-    ui.tags.script("""
-    $(document).ready(function() {
-        // Create a consistent container for the dropdown
-        function setupGradeContainers() {
-            $('.grade-select-container').each(function() {
-                var $this = $(this);
-                var $select = $this.find('select');
-                
-                // Make sure the option width matches the container
-                $select.find('option').css({
-                    'width': '100px',
-                    'box-sizing': 'border-box'
-                });
-                
-                // Remove any unwanted elements
-                $this.find('.selectize-dropdown-content').siblings().remove();
-                $this.siblings('svg, .dropdown-arrow').remove();
-            });
-        }
-        
-        // Run initial setup
-        setupGradeContainers();
-        setTimeout(setupGradeContainers, 500);
-        
-        // Hover behavior with stability improvements
-        $(document).on('mouseenter', '.grade-select-container', function() {
-            var $this = $(this);
-            
-            // First, close any other open dropdowns
-            $('.grade-select-container').not($this).removeClass('hovering')
-                .find('select').attr('size', '1');
-            
-            // Then open this one
-            $this.addClass('hovering');
-            $this.find('select').attr('size', '7');
-            
-            // Prevent scrolling of the page when hovering
-            $this.find('select').on('wheel', function(e) {
-                e.stopPropagation();
-            });
-        });
-        
-        $(document).on('mouseleave', '.grade-select-container', function() {
-            var $this = $(this);
-            
-            // Wait a bit to determine if we truly left
-            setTimeout(function() {
-                if (!$this.is(':hover')) {
-                    $this.removeClass('hovering');
-                    $this.find('select').attr('size', '1');
-                }
-            }, 50);
-        });
-        
-        // Handle click outside to close all dropdowns
-        $(document).on('click', function(e) {
-            if(!$(e.target).closest('.grade-select-container').length) {
-                $('.grade-select-container').removeClass('hovering');
-                $('select[id$="_grade"]').attr('size', '1');
-            }
-        });
-        
-        // Prevent shaking on select
-        $(document).on('click', '.grade-select-container select option', function() {
-            var $select = $(this).closest('select');
-            var $container = $select.closest('.grade-select-container');
-            
-            // Immediately close after selection to prevent shaking
-            setTimeout(function() {
-                $container.removeClass('hovering');
-                $select.attr('size', '1');
-                $select.blur();
-            }, 10);
-        });
-        
-        // Remove any stray text nodes and unwanted elements
-        $('.grade-select-container').each(function() {
-            $(this).siblings().filter(function() {
-                return (this.nodeType === 3 && $.trim(this.nodeValue) !== '') || 
-                       (this.nodeType === 1 && !$(this).hasClass('form-control'));
-            }).remove();
-        });
-        
-        // Remove extra dropdown arrows
-        setInterval(function() {
-            $('select').each(function() {
-                var $select = $(this);
-                $select.siblings('.dropdown-arrow, svg').remove();
-            });
-            
-            $('.grade-select-container').each(function() {
-                $(this).find('svg, .dropdown-arrow').not('.custom-arrow').remove();
-            });
-        }, 500);
-    });
-    """),
-    
     # Header with logo and title
     # Header with properly sized logo and better layout
 ui.div(
@@ -786,8 +463,28 @@ ui.card(
         ui.row(
             ui.column(6,
                 ui.h5("Student Information"),
-                ui.input_select("student_id", "Student ID", 
-                          choices=pd.read_excel("student_records.xlsx")["Student_ID"].tolist()),
+                # Choices are loaded on demand from the search endpoint (see script below)
+                ui.input_selectize("student_id", "Student ID", choices=[],
+                          options={
+                              "placeholder": "Search by ID, name, surname or module",
+                              "valueField": "value",
+                              "labelField": "label",
+                              "searchField": ["label"],
+                              "loadThrottle": 150,
+                              "preload": "focus",
+                          }),
+                ui.input_switch("my_allocation", "Only students allocated to the selected assessor", True),
+                ui.div(
+                    {"class": "rapid-marking"},
+                    ui.input_switch("rapid_marking", "Rapid marking (previous/next through the roster)", False),
+                    ui.panel_conditional(
+                        "input.rapid_marking",
+                        ui.input_action_button("previous_student", "Previous", class_="btn-outline-secondary btn-sm"),
+                        ui.input_action_button("next_student", "Next", class_="btn-outline-secondary btn-sm"),
+                        ui.input_action_button("generate_next", "Generate & Next", class_="btn-success btn-sm"),
+                        ui.div({"class": "rapid-marking-status"}, ui.output_text("rapid_marking_status")),
+                    ),
+                ),
                 ui.input_text("student_name", "Name"),
                 ui.input_text("student_surname", "Surname"),
                 ui.input_text("student_course", "Course"),
@@ -800,27 +497,6 @@ ui.card(
                 ui.input_text("supervisor", "Supervisor"),
             )
         ),
-        # Add CSS to make fields appear read-only using JavaScript
-        ui.tags.script("""
-        $(document).ready(function() {
-            // Make fields read-only after the page loads
-            $("#student_name").prop("readonly", true);
-            $("#student_surname").prop("readonly", true);
-            $("#student_course").prop("readonly", true);
-            $("#student_mode").prop("readonly", true);
-            $("#module_name").prop("readonly", true);
-            $("#report_title").prop("readonly", true);
-            $("#supervisor").prop("readonly", true);
-        });
-        """),
-        # Add CSS to style read-only fields
-        ui.tags.style("""
-        #student_name, #student_surname, #student_course, #student_mode,
-        #module_name, #report_title, #supervisor {
-            background-color: #f8f9fa;
-            cursor: not-allowed;
-        }
-        """)
     )
 ),
      # Assessment Scores Section with Grade Selectors
@@ -879,7 +555,7 @@ ui.card(
             
             ui.div(
                 {"style": "margin-top: 20px; padding: 15px; background-color: #f8f9fa; border-radius: 8px;"},
-                ui.output_ui("calculated_grade"),
+                grade_preview(),
             ),
             
             # Assessment status
@@ -894,14 +570,13 @@ ui.card(
             ui.row(
                 ui.column(4,
                     ui.input_select("assessor_name", "Assessor Name", 
-                           choices=["Dr Oswaldo Cadenas", "Dr Thomas Rushton", "Dr Craig Sayers"],
-                           selected="Dr Oswaldo Cadenas"),
+                           choices=[assessor.name for assessor in load_assessors()]),
+                    ui.output_ui("second_marking_status"),
                 ),
                 ui.column(8,
-                    ui.output_ui("comment_section"),
+                    comment_section(),
                 )
             ),
-            ui.output_ui("comment_warning"),
         )
     ),
     
@@ -910,47 +585,108 @@ ui.card(
         ui.card_body(
             {"style": "text-align: center;"},
             ui.input_action_button("generate", "Generate PDF Report", class_="btn-success btn-lg"),
+            ui.input_action_button("save_draft", "Save Draft", class_="btn-secondary btn-lg"),
+            ui.input_action_button("submit_marking", "Submit Second Marking", class_="btn-outline-primary btn-lg"),
             ui.div(
                 {"style": "margin-top: 15px;"},
-                ui.output_text("generate_status")
+                ui.output_text("generate_status"),
+                ui.output_text("draft_status"),
+                ui.output_text("marking_status")
             ),
             # Add download option for the generated PDF
             ui.output_ui("download_option")
         )
+    ),
+    
+    # Long-running operations, processed by the persistent job queue (see jobs.py)
+    ui.card(
+        ui.card_header("Bulk Operations"),
+        ui.card_body(
+            ui.tags.p(
+                {"class": "text-muted small"},
+                "Runs in the background and survives page reloads and server restarts.",
+            ),
+            ui.input_action_button("bulk_reports", "Generate All Reports for This Module", class_="btn-outline-success"),
+            ui.input_action_button("allocate_students", "Allocate Students to Assessors", class_="btn-outline-primary"),
+            ui.div({"style": "margin-top: 10px;"}, ui.output_text("bulk_status"), ui.output_text("allocation_status")),
+            ui.output_ui("job_progress"),
+            ui.div({"style": "margin-top: 10px;"}, ui.output_ui("export_links")),
+            ui.hr(),
+            ui.h6("Archive a Closed Term"),
+            ui.layout_columns(
+                ui.input_text("archive_term", "Term", placeholder="e.g. Semester 1"),
+                ui.input_text("archive_year", "Academic year", placeholder="e.g. 2025 for 2025/26 (default: current)"),
+            ),
+            ui.input_checkbox("archive_overwrite", "Replace the term if it is already archived", False),
+            ui.input_action_button("archive_term_button", "Archive Term", class_="btn-outline-secondary"),
+            ui.tags.a("Grade trends across terms", href="archive/trends", target="_blank", style="margin-left: 10px;"),
+            ui.div({"style": "margin-top: 10px;"}, ui.output_text("archive_status")),
+        )
     )
 )
 
 def server(input, output, session):
 
+    # Draft loaded for the selected student (restored into the form)
+    loaded_draft = reactive.Value(None)
+    
+    # Initial slider value: the draft score if it fits the band, else the band midpoint
+    def initial_score(criterion, grade_range):
+        draft = loaded_draft() or {}
+        score = draft.get("scores", {}).get(criterion)
+        if score is not None and grade_range['min'] <= score <= grade_range['max']:
+            return score
+        return (grade_range['min'] + grade_range['max']) // 2
+
     @reactive.Effect
-    def update_student_info():
+    async def update_student_info():
      if "student_id" in input and input.student_id():
         # Get student details with additional error handling
         student_id = input.student_id()
         print(f"Selected student ID: {student_id}")
         
-        student_info = get_student_details(student_id)
+        # Use the prefetched record and draft if rapid marking already loaded them
+        future = prefetched.pop(student_id, None)
+        if future is None:
+            future = BACKGROUND_EXECUTOR.submit(fetch_student, student_id, saving.get(student_id))
+        student_info, draft = await asyncio.wrap_future(future)
+        
+        with reactive.isolate():
+            if "rapid_marking" in input and input.rapid_marking():
+                prefetch_neighbours(student_id)
         
         if student_info:
             print("Student info found, updating UI fields")
             
             try:
-                # Update UI elements with proper error handling for each field
-                # Using our standardized field names from the mapping
-                ui.update_text("student_name", value=student_info.get("Name", ""))
-                ui.update_text("student_surname", value=student_info.get("Surname", ""))
-                ui.update_text("student_course", value=student_info.get("Course", ""))
-                ui.update_text("student_mode", value=student_info.get("Mode", ""))
-                ui.update_text("module_name", value=student_info.get("Module", ""))
-                ui.update_text("report_title", value=student_info.get("Title", ""))
-                ui.update_text("supervisor", value=student_info.get("Supervisor", ""))
+                # All fields and restored draft inputs go out in one message
+                # so the browser fills them in a single pass
+                values = {
+                    input_id: student_info.get(field, "")
+                    for input_id, field in STUDENT_FIELD_INPUTS.items()
+                }
+                
+                # Restore any saved draft for this student
+                loaded_draft.set(draft)
+                if draft:
+                    for criterion, grade in draft.get("grades", {}).items():
+                        values[f"{criterion}_grade"] = grade
+                    if draft.get("assessor_name"):
+                        values["assessor_name"] = draft["assessor_name"]
+                draft_comment = (draft or {}).get("comments", "")
+                values["assessor_comments"] = draft_comment
+                values["show_comments"] = bool(draft_comment)
                 
                 # Show a notification that the student data was loaded
-                ui.notification_show(
-                    "Student information loaded successfully",
-                    type="message",
-                    duration=3
-                )
+                await session.send_custom_message("populate_student", {
+                    "values": values,
+                    "scheme": student_scheme(values),
+                    "notification": {
+                        "message": "Student information loaded successfully" + (" (draft restored)" if draft else ""),
+                        "type": "message",
+                        "duration": 3,
+                    },
+                })
                 
             except Exception as e:
                 print(f"Error updating student information UI: {e}")
@@ -965,27 +701,215 @@ def server(input, output, session):
                 )
         else:
             print(f"No student information found for ID: {student_id}")
+            loaded_draft.set(None)
             
-            # Clear fields if no student found
-            ui.update_text("student_name", value="")
-            ui.update_text("student_surname", value="")
-            ui.update_text("student_course", value="")
-            ui.update_text("student_mode", value="")
-            ui.update_text("module_name", value="")
-            ui.update_text("report_title", value="")
-            ui.update_text("supervisor", value="")
-            
-            # Show warning notification
-            ui.notification_show(
-                f"No student record found for ID: {student_id}",
-                type="warning",
-                duration=4
+            # Clear fields if no student found, and show a warning notification
+            values = {input_id: "" for input_id in STUDENT_FIELD_INPUTS}
+            await session.send_custom_message("populate_student", {
+                "values": values,
+                "scheme": student_scheme(values),
+                "notification": {
+                    "message": f"No student record found for ID: {student_id}",
+                    "type": "warning",
+                    "duration": 4,
+                },
+            })
+
+    # Rapid marking: Previous/Next walk the roster in order. The neighbours of
+    # the current student are prefetched in the background, and with
+    # "Generate & Next" the report of the student being left is generated and
+    # saved while the next one loads
+    prefetched = {}  # student_id -> future of (student_info, draft)
+    saving = {}      # student_id -> future of a report still being saved
+    announcements = set()  # running announce_saved_report tasks
+    rapid_status = reactive.Value("")
+    
+    def prefetch_neighbours(student_id):
+        roster = get_roster()
+        neighbours = {roster.neighbour(student_id, offset) for offset in (-1, 1)} - {None}
+        for stale_id in set(prefetched) - neighbours:
+            prefetched.pop(stale_id).cancel()
+        for neighbour_id in neighbours - set(prefetched):
+            prefetched[neighbour_id] = BACKGROUND_EXECUTOR.submit(
+                fetch_student, neighbour_id, saving.get(neighbour_id)
             )
+    
+    @reactive.Effect
+    def toggle_rapid_marking():
+        if input.rapid_marking():
+            with reactive.isolate():
+                if input.student_id():
+                    prefetch_neighbours(input.student_id())
+        else:
+            for future in prefetched.values():
+                future.cancel()
+            prefetched.clear()
+    
+    def select_student(student_id):
+        option = get_search_index(get_roster()).option_for(student_id)
+        choices = {option["value"]: option["label"]} if option else [student_id]
+        ui.update_selectize("student_id", choices=choices, selected=student_id)
+    
+    async def announce_saved_report(student_id, future):
+        try:
+            result, reused = await asyncio.wrap_future(future)
+        except Exception as e:
+            print(f"Error generating PDF in the background: {e}")
+            result, reused = {"ok": False, "message": f"Error generating PDF: {str(e)}"}, False
+        finally:
+            if saving.get(student_id) is future:
+                del saving[student_id]
+        
+        async with reactive.lock():
+            if result["ok"]:
+                generated_reports.append((student_id, result["report_key"]))
+                report_key.set(result["report_key"])
+                generation_success.set(True)
+                with reactive.isolate():
+                    markings_changed.set(markings_changed() + 1)
+            note = " (already generated with the same marks)" if reused else ""
+            rapid_status.set(f"Student {student_id}: {result['message']}{note}")
+            await reactive.flush()
+    
+    def move_to_neighbour(offset, generate=False):
+        student_id = input.student_id()
+        roster = get_roster()
+        if student_id:
+            target_id = roster.neighbour(student_id, offset)
+        else:
+            student_ids = roster.student_ids()
+            target_id = student_ids[0 if offset > 0 else -1] if student_ids else None
+        if target_id is None:
+            rapid_status.set("This is the " + ("last" if offset > 0 else "first") + " student in the roster.")
+            return
+        
+        if generate and student_id:
+            can_generate, message = can_generate_pdf()
+            if not can_generate:
+                rapid_status.set(message)
+                return
+            report_data, filename = collect_report_data()
+            # The save runs while the next student loads; a prefetch of this
+            # student waits for it so that it never reads a stale draft
+            future = BACKGROUND_EXECUTOR.submit(generate_report_once, student_id, report_data, filename)
+            saving[student_id] = future
+            stale = prefetched.pop(student_id, None)
+            if stale is not None:
+                stale.cancel()
+            task = asyncio.create_task(announce_saved_report(student_id, future))
+            announcements.add(task)
+            task.add_done_callback(announcements.discard)
+            rapid_status.set(f"Saving the report of student {student_id}...")
+        
+        select_student(target_id)
+    
+    @reactive.Effect
+    @reactive.event(input.previous_student)
+    def go_to_previous_student():
+        move_to_neighbour(-1)
+    
+    @reactive.Effect
+    @reactive.event(input.next_student)
+    def go_to_next_student():
+        move_to_neighbour(1)
+    
+    @reactive.Effect
+    @reactive.event(input.generate_next)
+    def generate_and_go_to_next_student():
+        move_to_neighbour(1, generate=True)
+    
+    @output
+    @render.text
+    def rapid_marking_status():
+        return rapid_status()
+    
+    # Live roster updates: the watcher thread reports changed rows and this
+    # session forwards the ones its browser shows - selector labels and the
+    # fields of the open student - in one message
+    session_loop = asyncio.get_running_loop()
+    
+    async def push_roster_changes(changes, roster):
+        # Prefetched records of changed students are stale
+        for student_id in [*changes.changed, *changes.removed]:
+            future = prefetched.pop(student_id, None)
+            if future is not None:
+                future.cancel()
+        
+        index = get_search_index(roster)
+        label_columns = set(StudentSearchIndex.SEARCH_FIELDS)
+        relabelled = [student_id for student_id in changes.changed
+                      if changes.changed_columns(student_id) & label_columns]
+        message = {
+            "options": [index.option_for(student_id) for student_id in relabelled],
+            "removed": changes.removed,
+            # New students only need the browser to forget its cached searches
+            "added": len(changes.added),
+        }
+        
+        async with reactive.lock():
+            with reactive.isolate():
+                current_id = input.student_id() if "student_id" in input else ""
+            if current_id in changes.changed and \
+                    changes.changed_columns(current_id) & set(STUDENT_FIELD_INPUTS.values()):
+                record = changes.changed[current_id][1]
+                message["values"] = {
+                    input_id: record.get(field, "") for input_id, field in STUDENT_FIELD_INPUTS.items()
+                }
+                message["scheme"] = student_scheme(message["values"])
+                message["notification"] = {
+                    "message": f"The roster record of student {current_id} was updated",
+                    "type": "message",
+                    "duration": 4,
+                }
+            elif current_id in changes.removed:
+                message["notification"] = {
+                    "message": f"Student {current_id} is no longer in the roster",
+                    "type": "warning",
+                    "duration": 6,
+                }
+            
+            # Marks and comments written back by report generation change nothing shown here
+            if message["options"] or message["removed"] or message["added"] or "notification" in message:
+                await session.send_custom_message("roster_changed", message)
+    
+    def report_push_error(future):
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Error pushing roster changes: {future.exception()}")
+    
+    def on_roster_change(changes, roster):
+        # Called on the watcher thread; the session's own event loop does the sending
+        future = asyncio.run_coroutine_threadsafe(push_roster_changes(changes, roster), session_loop)
+        future.add_done_callback(report_push_error)
+    
+    session.on_ended(get_roster_watcher().subscribe(on_roster_change))
+    
+    # Grading scheme of the selected student's module
+    @reactive.Calc
+    def grading_scheme():
+        module_name = input.module_name() if "module_name" in input else None
+        return get_grading_scheme(module_name)
+    
+    # Keep the grade selectors in step with the bands of the current scheme
+    shown_grades = reactive.Value(DEFAULT_GRADING_SCHEME.grades)
+    
+    @reactive.Effect
+    def update_grade_choices():
+        scheme = grading_scheme()
+        with reactive.isolate():
+            if scheme.grades == shown_grades():
+                return
+            shown_grades.set(scheme.grades)
+            for criterion in ALL_CRITERIA:
+                select_id = f"{criterion}_grade"
+                current = input[select_id]() if select_id in input else None
+                selected = current if current in scheme.grade_ranges else scheme.grades[0]
+                ui.update_select(select_id, choices=scheme.grades, selected=selected)
 
     @output
     @render.image
     def logo_image():
-        logo_path = find_logo_path()
+        from report_pdf import get_logo_path
+        logo_path = get_logo_path()
         return {"src": logo_path, "height": "100px", "contentType": "image/png"}
 
     # Explicitly define each criterion slider UI function with initial hidden state
@@ -1000,11 +924,11 @@ def server(input, output, session):
             )
             
         grade = input.research_grade()
-        grade_range = GRADE_RANGES[grade]
+        grade_range = grading_scheme().grade_range(grade)
         return ui.div(
             {"class": f"grade-slider {grade.replace('+', 'P')}"},
             ui.input_slider("research_score", "", min=grade_range['min'], max=grade_range['max'], 
-                      value=(grade_range['min'] + grade_range['max']) // 2,
+                      value=initial_score("research", grade_range),
                       step=1)
         )
     
@@ -1019,11 +943,11 @@ def server(input, output, session):
             )
             
         grade = input.subject_knowledge_grade()
-        grade_range = GRADE_RANGES[grade]
+        grade_range = grading_scheme().grade_range(grade)
         return ui.div(
             {"class": f"grade-slider {grade.replace('+', 'P')}"},
             ui.input_slider("subject_knowledge_score", "", min=grade_range['min'], max=grade_range['max'], 
-                      value=(grade_range['min'] + grade_range['max']) // 2,
+                      value=initial_score("subject_knowledge", grade_range),
                       step=1)
         )
     
@@ -1038,11 +962,11 @@ def server(input, output, session):
             )
             
         grade = input.critical_analysis_grade()
-        grade_range = GRADE_RANGES[grade]
+        grade_range = grading_scheme().grade_range(grade)
         return ui.div(
             {"class": f"grade-slider {grade.replace('+', 'P')}"},
             ui.input_slider("critical_analysis_score", "", min=grade_range['min'], max=grade_range['max'], 
-                      value=(grade_range['min'] + grade_range['max']) // 2,
+                      value=initial_score("critical_analysis", grade_range),
                       step=1)
         )
     
@@ -1057,11 +981,11 @@ def server(input, output, session):
             )
             
         grade = input.problem_solving_grade()
-        grade_range = GRADE_RANGES[grade]
+        grade_range = grading_scheme().grade_range(grade)
         return ui.div(
             {"class": f"grade-slider {grade.replace('+', 'P')}"},
             ui.input_slider("problem_solving_score", "", min=grade_range['min'], max=grade_range['max'], 
-                      value=(grade_range['min'] + grade_range['max']) // 2,
+                      value=initial_score("problem_solving", grade_range),
                       step=1)
         )
     
@@ -1076,11 +1000,11 @@ def server(input, output, session):
             )
             
         grade = input.practical_competence_grade()
-        grade_range = GRADE_RANGES[grade]
+        grade_range = grading_scheme().grade_range(grade)
         return ui.div(
             {"class": f"grade-slider {grade.replace('+', 'P')}"},
             ui.input_slider("practical_competence_score", "", min=grade_range['min'], max=grade_range['max'], 
-                      value=(grade_range['min'] + grade_range['max']) // 2,
+                      value=initial_score("practical_competence", grade_range),
                       step=1)
         )
     
@@ -1095,11 +1019,11 @@ def server(input, output, session):
             )
             
         grade = input.communication_grade()
-        grade_range = GRADE_RANGES[grade]
+        grade_range = grading_scheme().grade_range(grade)
         return ui.div(
             {"class": f"grade-slider {grade.replace('+', 'P')}"},
             ui.input_slider("communication_score", "", min=grade_range['min'], max=grade_range['max'], 
-                      value=(grade_range['min'] + grade_range['max']) // 2,
+                      value=initial_score("communication", grade_range),
                       step=1)
         )
     
@@ -1114,11 +1038,11 @@ def server(input, output, session):
             )
             
         grade = input.academic_integrity_grade()
-        grade_range = GRADE_RANGES[grade]
+        grade_range = grading_scheme().grade_range(grade)
         return ui.div(
             {"class": f"grade-slider {grade.replace('+', 'P')}"},
             ui.input_slider("academic_integrity_score", "", min=grade_range['min'], max=grade_range['max'], 
-                      value=(grade_range['min'] + grade_range['max']) // 2,
+                      value=initial_score("academic_integrity", grade_range),
                       step=1)
         )
     
@@ -1137,11 +1061,19 @@ def server(input, output, session):
         except:
             return False
     
+    # Completeness as a value, so that its dependents only re-run when it flips
+    # rather than on every slider movement
+    assessment_is_complete = reactive.Value(False)
+    
+    @reactive.Effect
+    def track_assessment_complete():
+        assessment_is_complete.set(assessment_complete())
+    
     # Show assessment status with more accurate information
     @output
     @render.ui
     def assessment_status():
-        if assessment_complete():
+        if assessment_is_complete():
             return ui.div(
                 {"class": "alert alert-success", "style": "margin-top: 15px;"},
                 ui.tags.i({"class": "fa fa-check-circle"}),
@@ -1152,7 +1084,7 @@ def server(input, output, session):
             missing_criteria = []
             for criterion in ALL_CRITERIA:
                 score_id = f"{criterion}_score"
-                if score_id not in input or input[score_id]() is None:
+                if score_id not in input:
                     missing_criteria.append(CRITERIA_DISPLAY_NAMES[criterion])
             
             missing_text = ", ".join(missing_criteria) if missing_criteria else "all assessment criteria"
@@ -1180,114 +1112,51 @@ def server(input, output, session):
                 else:
                     scores[score_id] = 50  # Default to middle value
                     
-            return calculate_final_grade(scores)
+            return calculate_final_grade(scores, grading_scheme())
         except Exception as e:
             print(f"Error calculating final grade: {e}")
             import traceback
             traceback.print_exc()
             return 0  # Default to 0 if there's an error
     
-    # Display calculated grade with professional styling
-    @output
-    @render.ui
-    def calculated_grade():
-        try:
-            grade = final_grade()
-            
-            # Determine color based on grade
-            color = "#4CAF50"  # Default green
-            if grade < 30:
-                color = "#F44336"  # Red for F
-            elif grade < 40:
-                color = "#FF9800"  # Orange for E
-            elif grade < 50:
-                color = "#FFC107"  # Amber for D
-            elif grade < 60:
-                color = "#FFEB3B"  # Yellow for C
-            elif grade < 70:
-                color = "#CDDC39"  # Lime for B
-            
-            return ui.div(
-                ui.h3(
-                    {"style": f"color: {color}; font-weight: bold; text-align: center;"},
-                    f"Calculated Final Grade: {grade}%"
-                )
-            )
-        except:
-            return ui.div(
-                ui.h3(
-                    {"style": "color: #999; font-weight: bold; text-align: center;"},
-                    "Final Grade: Not yet calculated"
-                )
-            )
-    
     # Determine if comment is required based on grade
     @reactive.Calc
     def comment_required():
-        grade = final_grade()
-        return grade < 30 or grade > 69
+        return grading_scheme().comment_required(final_grade())
     
-    # Dynamic comment section based on assessment completeness and grade
-    @output
-    @render.ui
-    def comment_section():
-        if not assessment_complete():
-            return ui.div()  # Return empty if assessment is not complete
-        
-        grade = final_grade()
-        is_required = comment_required()
-        
-        if is_required:
-            return ui.div(
-                ui.h5("Assessor Comments", style="margin-bottom: 10px;"),
-                ui.p(
-                    {"style": "color: #721c24; background-color: #f8d7da; padding: 10px; border-radius: 5px;"},
-                    "This grade requires detailed feedback (minimum 15 words)."
-                ),
-                ui.input_text_area(
-                    "assessor_comments", 
-                    "", 
-                    rows=6, 
-                    resize="vertical",
-                    placeholder="Please provide detailed feedback for this grade...",
-                    width="100%"
-                )
-            )
-        else:
-            return ui.div(
-                ui.input_checkbox("show_comments", "Add comments for this assessment", False),
-                ui.panel_conditional(
-                    "input.show_comments",
-                    ui.input_text_area(
-                        "assessor_comments", 
-                        "Assessor Comments", 
-                        rows=6, 
-                        resize="vertical",
-                        width="100%"
-                    )
-                )
-            )
+    # The browser computes the live grade preview and the comment requirement
+    # itself; the server only tells it when the assessment becomes complete and
+    # ships the weights and bands again if the module uses a different scheme.
+    # Loading a student sends their module's scheme along with their fields, so
+    # the preview and word counter follow it from the start
+    sent_scheme_name = reactive.Value(DEFAULT_GRADING_SCHEME.name)
     
-    # Warning for insufficient comment length
-    @output
-    @render.ui
-    def comment_warning():
-        if not assessment_complete():
-            return ui.div()  # Return empty if assessment is not complete
-            
-        if not comment_required():
-            return ui.div()
-        
-        comments = input.assessor_comments() if hasattr(input, "assessor_comments") else ""
-        word_count = len(comments.split()) if comments else 0
-        
-        if word_count < 15:
-            return ui.div(
-                {"class": "alert alert-danger", "role": "alert"},
-                ui.tags.b("Warning: "),
-                f"Comments must be at least 15 words (currently {word_count} words)."
-            )
-        return ui.div()
+    def student_scheme(values):
+        scheme = get_grading_scheme(values.get("module_name"))
+        sent_scheme_name.set(scheme.name)
+        return scheme.to_dict()
+    
+    @reactive.Effect
+    async def push_grading_scheme():
+        scheme = grading_scheme()
+        with reactive.isolate():
+            if scheme.name == sent_scheme_name():
+                return
+        sent_scheme_name.set(scheme.name)
+        await session.send_custom_message("grading_scheme", scheme.to_dict())
+    
+    @reactive.Effect
+    async def push_assessment_complete():
+        await session.send_custom_message("assessment_complete", {"complete": assessment_is_complete()})
+    
+    # Word count of the submitted comments. Dependents only re-run when the
+    # count changes, not on every edit of the text
+    comment_words = reactive.Value(0)
+    
+    @reactive.Effect
+    def count_comment_words():
+        comments = input.assessor_comments() if "assessor_comments" in input else ""
+        comment_words.set(len(comments.split()) if comments else 0)
     
     # Validate before generating PDF - improved error handling
     @reactive.Calc
@@ -1297,21 +1166,14 @@ def server(input, output, session):
             
         # Get current grade to determine if comments are required
         try:
-            grade = final_grade()
-            requires_comment = (grade < 30 or grade > 69)
+            requires_comment = comment_required()
             
             # If comment is required, check if it's provided
             if requires_comment:
-                comments = ""
-                if hasattr(input, "assessor_comments"):
-                    try:
-                        comments = input.assessor_comments()
-                    except:
-                        pass
-                
-                word_count = len(comments.split()) if comments else 0
-                if word_count < 15:
-                    return False, "Please provide detailed comments (at least 15 words) as required for this grade."
+                word_count = comment_words()
+                min_words = grading_scheme().min_comment_words
+                if word_count < min_words:
+                    return False, f"Please provide detailed comments (at least {min_words} words) as required for this grade."
             
             # Otherwise check if they enabled comments but didn't provide any
             elif hasattr(input, 'show_comments') and input.show_comments():
@@ -1330,15 +1192,123 @@ def server(input, output, session):
             
         return True, ""
     
-    # Store the generated PDF path
-    pdf_path = reactive.Value(None)
+    # Store the key of the generated PDF in the shared report store
+    report_key = reactive.Value(None)
     generation_success = reactive.Value(False)
     
+    # Bumped whenever a marking is stored, so the second-marking status refreshes
+    markings_changed = reactive.Value(0)
+    
+    # Reports generated in this session, as (student_id, report_key). The one
+    # offered for download is pinned against eviction; when the session ends,
+    # those superseded by a newer report for the same student are deleted
+    generated_reports = []
+    offered_report = {"report_key": None}
+    
+    @reactive.Effect
+    def pin_offered_report():
+        key = report_key()
+        retention = get_report_retention()
+        if offered_report["report_key"] is not None:
+            retention.unpin(offered_report["report_key"])
+        offered_report["report_key"] = key
+        if key is not None:
+            retention.pin(key)
+    
+    def release_session_reports():
+        retention = get_report_retention()
+        if offered_report["report_key"] is not None:
+            retention.unpin(offered_report["report_key"])
+        if generated_reports:
+            BACKGROUND_EXECUTOR.submit(retention.release_session, list(generated_reports))
+    
+    session.on_ended(release_session_reports)
+    
+    # Report data from the current form, for generating a PDF
+    def collect_report_data():
+        # Create a unique filename with safe characters
+        safe_name = "".join(c if c.isalnum() else "_" for c in input.student_name())
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"assessment_{safe_name}_{timestamp}.pdf"
+        
+        print(f"Will generate PDF: {filename}")
+        
+        return collect_assessment(), filename
+    
+    # Marks, final grade and comments from the current form
+    def collect_assessment():
+        # Get comments with better error handling
+        comments = "No additional comments."
+        try:
+            requires_comment = comment_required()
+            
+            if requires_comment and hasattr(input, "assessor_comments"):
+                comments = input.assessor_comments() or "Required comments not provided."
+            elif hasattr(input, "show_comments") and input.show_comments() and hasattr(input, "assessor_comments"):
+                comments = input.assessor_comments() or "No additional comments."
+        except Exception as e:
+            print(f"Error getting comments: {e}")
+            comments = "Error retrieving comments."
+        
+        # Calculate final grade
+        try:
+            calculated_final_grade = final_grade()
+            print(f"Calculated final grade: {calculated_final_grade}")
+        except Exception as e:
+            print(f"Error calculating grade: {e}")
+            calculated_final_grade = 0
+        
+        # Add all criteria scores to the data with error handling
+        scores = {}
+        for criterion in ALL_CRITERIA:
+            try:
+                score_id = f"{criterion}_score"
+                if score_id in input:
+                    scores[criterion] = input[score_id]()
+                else:
+                    scores[criterion] = 50  # Default score if not available
+                    print(f"Warning: Missing score for {criterion}, using default")
+            except Exception as e:
+                scores[criterion] = 50  # Default score if error
+                print(f"Error getting score for {criterion}: {e}")
+        
+        # Collect all data for PDF with error checking
+        report_data = AssessmentRecord(
+            module_name=input.module_name() or "Module not specified",
+            report_title=input.report_title() or "Report title not specified",
+            student_name=input.student_name() or "Student name not specified",
+            assessor_name=input.assessor_name() or "Assessor not specified",
+            assessor_comments=comments,
+            final_grade=calculated_final_grade,
+            scores=scores,
+        )
+        
+        return report_data
+    
+    # In-progress assessment from the current form, for saving as a draft
+    def collect_draft():
+        draft = {
+            "grades": {},
+            "scores": {},
+            "assessor_name": input.assessor_name(),
+            "comments": "",
+        }
+        for criterion in ALL_CRITERIA:
+            grade_id = f"{criterion}_grade"
+            score_id = f"{criterion}_score"
+            if grade_id in input:
+                draft["grades"][criterion] = input[grade_id]()
+            if score_id in input:
+                draft["scores"][criterion] = input[score_id]()
+        if "assessor_comments" in input:
+            draft["comments"] = input.assessor_comments() or ""
+        return draft
+    
     # PDF generation with validation and more detailed error reporting
     @output
     @render.text
     @reactive.event(input.generate)
-    def generate_status():
+    async def generate_status():
         can_generate, message = can_generate_pdf()
         if not can_generate:
             print(f"Cannot generate PDF: {message}")
@@ -1348,215 +1318,703 @@ def server(input, output, session):
         
         try:
             print("Starting PDF generation process...")
-            # Use the system temp directory for better cross-platform compatibility
-            temp_dir = os.path.join(tempfile.gettempdir(), "assessment_reports")
-            print(f"Using temp directory: {temp_dir}")
-            
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir)
-                print(f"Created directory: {temp_dir}")
-            
-            # Create a unique filename with safe characters
-            safe_name = "".join(c if c.isalnum() else "_" for c in input.student_name())
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"assessment_{safe_name}_{timestamp}.pdf"
-            filepath = os.path.join(temp_dir, filename)
-            
-            print(f"Will generate PDF at: {filepath}")
-            
-            # Get comments with better error handling
-            comments = "No additional comments."
-            try:
-                grade = final_grade()
-                requires_comment = (grade < 30 or grade > 69)
-                
-                if requires_comment and hasattr(input, "assessor_comments"):
-                    comments = input.assessor_comments() or "Required comments not provided."
-                elif hasattr(input, "show_comments") and input.show_comments() and hasattr(input, "assessor_comments"):
-                    comments = input.assessor_comments() or "No additional comments."
-            except Exception as e:
-                print(f"Error getting comments: {e}")
-                comments = "Error retrieving comments."
-            
-            # Calculate final grade
-            try:
-                calculated_final_grade = final_grade()
-                print(f"Calculated final grade: {calculated_final_grade}")
-            except Exception as e:
-                print(f"Error calculating grade: {e}")
-                calculated_final_grade = 0
             
-            # Collect all data for PDF with error checking
-            report_data = {
-                'module_name': input.module_name() or "Module not specified",
-                'report_title': input.report_title() or "Report title not specified",
-                'student_name': input.student_name() or "Student name not specified",
-                'assessor_name': input.assessor_name() or "Assessor not specified",
-                'assessor_comments': comments,
-                'final_grade': str(calculated_final_grade)
-            }
-            
-            # Add all criteria scores to the data with error handling
-            for criterion in ALL_CRITERIA:
-                try:
-                    score_id = f"{criterion}_score"
-                    if score_id in input:
-                        report_data[score_id] = input[score_id]()
-                    else:
-                        report_data[score_id] = 50  # Default score if not available
-                        print(f"Warning: Missing score for {criterion}, using default")
-                except Exception as e:
-                    report_data[score_id] = 50  # Default score if error
-                    print(f"Error getting score for {criterion}: {e}")
+            report_data, filename = collect_report_data()
             
             print("All data collected, generating PDF...")
             print(f"Report data: {report_data}")
             
-            # Generate PDF with exception logging
-            try:
-                create_pdf(report_data, filepath)
-                print(f"PDF successfully created at: {filepath}")
-            except Exception as e:
-                print(f"Error in create_pdf function: {e}")
-                import traceback
-                traceback.print_exc()
-                return f"PDF generation failed in create_pdf function: {str(e)}"
-            
-            # Verify the PDF was created
-            if not os.path.exists(filepath):
-                return "PDF file was not created. Check directory permissions."
-            
-            if os.path.getsize(filepath) == 0:
-                return "PDF file was created but is empty. Check ReportLab installation."
+            # Identical requests (double clicks, a second tab on the same student,
+            # retries) share one render and one save instead of writing twice. Waiting
+            # for one in flight can take a while, so it runs off the event loop
+            student_id = input.student_id()
+            store = get_store()
+            result, reused = await asyncio.wrap_future(
+                BACKGROUND_EXECUTOR.submit(generate_report_once, student_id, report_data, filename)
+            )
+            if not result["ok"]:
+                return result["message"]
             
-            # Store the path for download
-            pdf_path.set(filepath)
+            # Store the key for download
+            generated_reports.append((student_id, result["report_key"]))
+            report_key.set(result["report_key"])
             generation_success.set(True)
+            markings_changed.set(markings_changed() + 1)
             
-            # After successful PDF generation, update Excel
-            student_id = input.student_id()
-            final_grade_value = str(calculated_final_grade)  # Convert to string for Excel
-            assessor_comments = comments
-            
-            # Check if student already has marks and ask for confirmation if needed
-            success, message = update_student_record(student_id, final_grade_value, assessor_comments)
+            if reused:
+                print(f"Reusing report {result['report_key']} for an identical request")
+                return f"This report was already generated with the same marks: {result['filename']}"
             
-            # Try to open the PDF but don't fail if it doesn't work
-            try:
-                webbrowser.open(f'file://{os.path.abspath(filepath)}')
-                print(f"Browser should be opening PDF now")
-            except Exception as e:
-                print(f"Warning: Could not open PDF automatically: {str(e)}")
+            # Try to open the PDF locally but don't fail if it doesn't work
+            # (only meaningful when the server runs on the assessor's machine)
+            local_path = store.report_path(result["report_key"])
+            if WORKER_COUNT == 1 and local_path:
+                try:
+                    import webbrowser
+                    webbrowser.open(f'file://{os.path.abspath(local_path)}')
+                    print("Browser should be opening PDF now")
+                except Exception as e:
+                    print(f"Warning: Could not open PDF automatically: {str(e)}")
             
-            if message == "Student already marked":
-                return f"PDF generated successfully, but NOTE: {message}. The record has been updated anyway."
-            else:
-                return f"PDF report generated successfully: {filename}"
+            return result["message"]
                 
         except Exception as e:
             import traceback
             traceback.print_exc()
             return f"Error generating PDF: {str(e)}"
     
+    # Save the in-progress assessment to the shared store
+    @output
+    @render.text
+    @reactive.event(input.save_draft)
+    def draft_status():
+        student_id = input.student_id()
+        if not student_id:
+            return "Please select a student before saving a draft."
+        
+        try:
+            get_store().put_draft(student_id, collect_draft())
+        except Exception as e:
+            print(f"Error saving draft: {e}")
+            return f"Could not save draft: {str(e)}"
+        return f"Draft saved for student {student_id} at {datetime.now().strftime('%H:%M:%S')}"
+    
+    # Independent marking by another assessor, stored next to the first
+    # marking without generating a report or touching the workbook
+    @output
+    @render.text
+    @reactive.event(input.submit_marking)
+    def marking_status():
+        student_id = input.student_id()
+        if not student_id:
+            return "Please select a student before submitting a marking."
+        can_submit, message = can_generate_pdf()
+        if not can_submit:
+            return message
+        
+        assessment = collect_assessment()
+        store = get_store()
+        try:
+            replaced = any(marking["assessor"] == assessment["assessor_name"]
+                           for marking in store.get_markings(student_id))
+            store.put_marking(
+                student_id, assessment["assessor_name"], assessment["module_name"],
+                {criterion: assessment[f"{criterion}_score"] for criterion in ALL_CRITERIA},
+                assessment["final_grade"], assessment["assessor_comments"],
+            )
+        except Exception as e:
+            print(f"Error saving marking: {e}")
+            return f"Could not save marking: {str(e)}"
+        markings_changed.set(markings_changed() + 1)
+        action = "updated" if replaced else "recorded"
+        return f"Marking by {assessment['assessor_name']} {action} for student {student_id}"
+    
+    # Who has marked the selected student and whether a second marking is
+    # still due. Marks are not shown, so the second marking stays independent
+    @output
+    @render.ui
+    def second_marking_status():
+        markings_changed()
+        student_id = input.student_id() if "student_id" in input else None
+        if not student_id:
+            return ui.div()
+        from moderation import second_marking_required
+        
+        markings = get_store().get_markings(student_id)
+        if not markings:
+            return ui.div({"class": "text-muted small"}, "No marking recorded yet.")
+        assessors = ", ".join(marking["assessor"] for marking in markings)
+        module_name = input.module_name() if "module_name" in input else ""
+        moderation_link = ui.tags.a(
+            "Moderation report", href=f"moderation/{quote(module_name, safe='')}", target="_blank"
+        ) if module_name else ""
+        if len(markings) >= 2:
+            return ui.div({"class": "text-success small"}, f"Double marked by {assessors}. ", moderation_link)
+        if second_marking_required(student_id, [marking["final_grade"] for marking in markings], grading_scheme()):
+            return ui.div(
+                {"class": "text-warning small"},
+                f"Marked by {assessors}. Second marking required: select another assessor and "
+                "submit their independent marks.",
+            )
+        return ui.div({"class": "text-muted small"}, f"Marked by {assessors}. Second marking not required.")
+    
     # Download link for the generated PDF with more robust implementation
     @output
     @render.ui
     def download_option():
-        if not generation_success() or pdf_path() is None:
+        if not generation_success() or report_key() is None:
             return ui.div()
         
-        filepath = pdf_path()
-        if not os.path.exists(filepath):
+        store = get_store()
+        key = report_key()
+        if not store.has_report(key):
             return ui.div(
                 {"class": "alert alert-danger", "style": "margin-top: 15px;"},
-                "PDF file no longer exists at the expected location."
+                "PDF report no longer exists in the report store."
             )
         
-        filename = os.path.basename(filepath)
+        local_path = store.report_path(key)
+        location = [
+            ui.tags.p(f"File saved as: {os.path.basename(local_path)}"),
+            ui.tags.p(f"Location: {os.path.dirname(local_path)}"),
+        ] if local_path else []
         
-        # For local file access, provide instructions
         return ui.div(
             {"class": "alert alert-info", "style": "margin-top: 15px;"},
             ui.tags.h4("PDF Generated Successfully"),
-            ui.tags.p(f"File saved as: {filename}"),
-            ui.tags.p(f"Location: {os.path.dirname(filepath)}"),
+            *location,
             ui.tags.p(
-                "If the PDF didn't open automatically, please navigate to the location above and open the file manually."
+                "If the PDF didn't open automatically, download it with the link below."
             ),
-            ui.input_action_button(
-                "open_folder", 
-                "Open Containing Folder",
+            ui.tags.a(
+                "Download PDF Report",
+                href=f"reports/{key}",
+                target="_blank",
                 class_="btn btn-primary"
             )
         )
-# Add a function to test Excel loading at startup
-def test_excel_loading():
-    """Test Excel file loading at application startup"""
-    try:
-        print("Testing Excel file loading...")
-        excel_path = "student_records.xlsx"
+    
+    # Queue a background report run over every marked student of the module
+    @output
+    @render.text
+    @reactive.event(input.bulk_reports)
+    def bulk_status():
+        module_name = input.module_name()
+        if not module_name:
+            return "Please select a student of the module first."
+        students = cohort_report_students(module_name)
+        if not students:
+            return f"No markings recorded for module {module_name} yet."
+        get_job_queue().submit("cohort_reports", students, {"module": module_name},
+                               label=f"Reports for {module_name}")
+        return f"Queued reports for {len(students)} student(s) of {module_name}, and one PDF of them all."
+    
+    # Progress of the latest jobs of every session and worker, refreshed
+    # whenever the job database changes
+    @reactive.poll(lambda: get_job_queue().last_change(), 1)
+    def recent_jobs():
+        return get_job_queue().recent(5)
+    
+    @output
+    @render.ui
+    def job_progress():
+        jobs = recent_jobs()
+        if not jobs:
+            return ui.div()
+        rows = []
+        for job in jobs:
+            processed = job["done"] + job["failed"]
+            percent = round(100 * processed / job["total"]) if job["total"] else 100
+            detail = job["message"] or f"{processed} of {job['total']}" + (f", {job['failed']} failed" if job["failed"] else "")
+            if job["result"] and job["result"].get("message"):
+                detail = job["result"]["message"]
+            if job["result"] and job["result"].get("report_key"):
+                detail = ui.span(detail, " ", ui.tags.a("Download PDF", href=f"reports/{job['result']['report_key']}", target="_blank"))
+            cancel = ui.tags.button(
+                "Cancel",
+                class_="btn btn-link btn-sm",
+                onclick=f"Shiny.setInputValue('cancel_job', '{job['job_id']}', {{priority: 'event'}})",
+            ) if job["status"] in ("queued", "running") and not job["cancel_requested"] else ""
+            rows.append(ui.tags.tr(
+                ui.tags.td(job["label"]),
+                ui.tags.td(job["status"] + (" (cancelling)" if job["cancel_requested"] and job["status"] == "running" else "")),
+                ui.tags.td(
+                    {"style": "width: 35%;"},
+                    ui.div(
+                        {"class": "progress"},
+                        ui.div({"class": "progress-bar", "role": "progressbar", "style": f"width: {percent}%;"}, f"{percent}%"),
+                    ),
+                ),
+                ui.tags.td(detail),
+                ui.tags.td(cancel),
+            ))
+        return ui.tags.table({"class": "table table-sm", "style": "margin-top: 10px;"}, ui.tags.tbody(*rows))
+    
+    @reactive.Effect
+    @reactive.event(input.cancel_job)
+    def cancel_job():
+        get_job_queue().cancel(input.cancel_job())
+    
+    # Spread the roster across the configured assessors (see allocation.py)
+    @output
+    @render.text
+    @reactive.event(input.allocate_students)
+    def allocation_status():
+        get_job_queue().submit("allocation", ["student_records.xlsx"], label="Allocation of students to assessors")
+        return "Allocation queued; its progress and result show in the job list."
+    
+    # A finished allocation (from any session or worker) changes which students the selector offers
+    finished_allocations = None
+    
+    @reactive.Effect
+    async def announce_allocations():
+        nonlocal finished_allocations
+        finished = {job["job_id"] for job in recent_jobs() if job["kind"] == "allocation" and job["status"] == "done"}
+        if finished_allocations is not None and finished - finished_allocations:
+            await session.send_custom_message("allocation_changed", {})
+        finished_allocations = finished
+
+    # Download links for the marks export, for the whole cohort and the current module
+    @output
+    @render.ui
+    def export_links():
+        module_name = input.module_name() if "module_name" in input else ""
+        links = [("All students", "")]
+        if module_name:
+            links.append((module_name, f"&module={quote(module_name, safe='')}"))
+        return ui.div(
+            {"class": "small"},
+            ui.tags.b("Export marks: "),
+            *[
+                ui.tags.span(
+                    f"{label} (",
+                    ui.tags.a("Excel", href=f"export/marks?format=xlsx{query}"),
+                    ", ",
+                    ui.tags.a("CSV", href=f"export/marks?format=csv{query}"),
+                    ") ",
+                )
+                for label, query in links
+            ],
+        )
+
+    # Snapshot the term into the Parquet archive (see archive.py)
+    @output
+    @render.text
+    @reactive.event(input.archive_term_button)
+    def archive_status():
+        from archive import academic_year, is_term_archived
+        term = " ".join(input.archive_term().split())
+        year = input.archive_year().strip()
+        if not term:
+            return "Enter the term to archive"
+        if year and not year.isdigit():
+            return f"Academic year must be a year such as 2025, not '{year}'"
+        year = int(year) if year else academic_year()
+        if is_term_archived(year, term) and not input.archive_overwrite():
+            return f"Term '{term}' of {year} is already archived; tick 'Replace' to archive it again"
+        get_job_queue().submit("archive_term", [term], {"year": year, "roster": "student_records.xlsx"},
+                               label=f"Archive of {term} {year}")
+        return f"Archiving of {term} {year} queued; its progress and result show in the job list."
+# Sample data for the throwaway report rendered during warm-up
+WARM_UP_REPORT = {
+    'module_name': "Warm-up",
+    'report_title': "Warm-up report",
+    'student_name': "Warm-up",
+    'assessor_name': "Warm-up",
+    'assessor_comments': "No additional comments.",
+    'final_grade': "50.0",
+    **{f"{criterion}_score": 50 for criterion in ALL_CRITERIA},
+}
+
+# Outcome of the startup phase, reported by the readiness endpoint
+startup_status = {"ready": False, "started_at": None, "finished_at": None, "checks": {}}
+
+def run_startup_checks(excel_path="student_records.xlsx"):
+    """Validate the roster and warm every cache the first request would otherwise pay for"""
+    startup_status["started_at"] = datetime.now().isoformat(timespec="seconds")
+    checks = {}
+    
+    def check(name, func):
+        started = datetime.now()
+        try:
+            detail = func()
+            checks[name] = {"ok": True, "detail": detail}
+        except Exception as e:
+            print(f"Startup check '{name}' failed: {e}")
+            checks[name] = {"ok": False, "detail": str(e)}
+        checks[name]["seconds"] = round((datetime.now() - started).total_seconds(), 3)
+        print(f"Startup check '{name}': {'OK' if checks[name]['ok'] else 'FAILED'} - {checks[name]['detail']}")
+    
+    def roster_check():
+        # Importing validates the schema and leaves the roster cached
         if not os.path.exists(excel_path):
-            print(f"WARNING: Excel file '{excel_path}' not found in current directory")
-            print(f"Current working directory: {os.getcwd()}")
-            print("Available files in current directory:")
-            for file in os.listdir():
-                print(f"  {file}")
-            return False
-            
-        # Try to read the file
-        df = pd.read_excel(excel_path)
-        print(f"Successfully loaded Excel file with {len(df)} rows")
-        print(f"Excel columns: {df.columns.tolist()}")
-        
-        # Print the first row as an example
-        if len(df) > 0:
-            print("First row example:")
-            print(df.iloc[0].to_dict())
-        
-        return True
+            raise FileNotFoundError(f"Roster '{excel_path}' not found in {os.getcwd()}")
+        roster = get_roster(excel_path)
+        if len(roster) == 0:
+            raise ValueError("Roster contains no students")
+        get_search_index(roster)
+        return roster.summary()
+    
+    def grading_check():
+        return f"{len(load_grading_schemes())} grading scheme(s) loaded"
+    
+    def template_check():
+        # First import of ReportLab, off the request path
+        from report_pdf import get_logo_path, get_report_styles
+        get_report_styles()
+        logo_path = get_logo_path()
+        return f"Report styles built, logo: {logo_path or 'text fallback'}"
+    
+    def pdf_check():
+        from report_pdf import render_report
+        buffer = io.BytesIO()
+        render_report(WARM_UP_REPORT, buffer)
+        if not buffer.getvalue().startswith(b"%PDF"):
+            raise ValueError("Warm-up render did not produce a PDF")
+        return f"Rendered {len(buffer.getvalue())} byte warm-up report"
+    
+    def store_check():
+        return repr(get_store())
+    
+    def retention_check():
+        retention = get_report_retention()
+        deleted, freed = retention.enforce()
+        return (f"Quota {retention.max_bytes / 2**20:g} MB, max age {retention.max_age_days:g} days: "
+                f"{deleted} report(s) deleted, {freed / 2**20:.1f} MB freed")
+    
+    def moderation_check():
+        # The moderation engine brings in numpy; load it before the first board view
+        import moderation
+        return f"numpy {moderation.np.__version__} loaded"
+    
+    def archive_check():
+        # The archive brings in pyarrow; load it before the first trends query
+        from archive import archived_terms, pa
+        return f"pyarrow {pa.__version__} loaded, {len(archived_terms())} term(s) archived"
+    
+    def assessors_check():
+        assessors = load_assessors()
+        allocated = len(get_store().get_allocation())
+        return f"{len(assessors)} assessor(s) configured, {allocated} student(s) allocated"
+    
+    def feedback_bank_check():
+        return f"{len(get_feedback_bank())} feedback snippets indexed"
+    
+    def job_queue_check():
+        job_queue = get_job_queue()
+        unfinished = sum(job["status"] in ("queued", "running") for job in job_queue.recent(50))
+        return f"{job_queue!r}, {unfinished} unfinished job(s) among the latest 50"
+    
+    def workbook_writer_check():
+        # pandas is imported lazily; load it here so the first save does not wait for it
+        import pandas as pd
+        return f"pandas {pd.__version__} loaded"
+    
+    check("roster", roster_check)
+    check("grading_schemes", grading_check)
+    check("report_template", template_check)
+    check("warm_up_pdf", pdf_check)
+    check("store", store_check)
+    check("report_retention", retention_check)
+    check("workbook_writer", workbook_writer_check)
+    check("moderation", moderation_check)
+    check("archive", archive_check)
+    check("assessors", assessors_check)
+    check("job_queue", job_queue_check)
+    check("feedback_bank", feedback_bank_check)
+    
+    startup_status["checks"] = checks
+    startup_status["finished_at"] = datetime.now().isoformat(timespec="seconds")
+    startup_status["ready"] = all(result["ok"] for result in checks.values())
+    return startup_status["ready"]
+
+# Liveness - the process is up and serving requests
+async def liveness(request):
+    return JSONResponse({"status": "alive"})
+
+# Readiness - startup checks have passed and caches are warm
+async def readiness(request):
+    status_code = 200 if startup_status["ready"] else 503
+    return JSONResponse(dict(startup_status, status="ready" if startup_status["ready"] else "starting"),
+                        status_code=status_code)
+
+# Run the startup phase in every worker without blocking liveness
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    threading.Thread(target=run_startup_checks, name="startup-checks", daemon=True).start()
+    roster_watcher = get_roster_watcher("student_records.xlsx")
+    roster_watcher.start()
+    job_queue = get_job_queue()
+    job_queue.register("cohort_reports", generate_cohort_report, finish=bundle_cohort_reports)
+    job_queue.register("allocation", allocate_students_job, finish=single_item_result)
+    job_queue.register("archive_term", archive_term_job, finish=single_item_result)
+    job_queue.start()
+    yield
+    roster_watcher.stop()
+    # Unfinished jobs go back to the queue and resume on the next start
+    await asyncio.to_thread(job_queue.stop)
+
+# Serve stored reports over plain HTTP so any worker can answer (no sticky sessions)
+async def download_report(request):
+    report = get_store().get_report(request.path_params["report_key"])
+    if report is None:
+        return PlainTextResponse("Report not found", status_code=404)
+    filename, pdf_bytes = report
+    return Response(
+        pdf_bytes,
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'inline; filename="{filename}"'}
+    )
+
+# Board-ready reconciliation view of the double marking of a module (?format=csv to download)
+MODERATION_COLUMNS = {
+    "student_id": "Student ID",
+    "status": "Status",
+    "markers": "Markers (final grade, band)",
+    "final_spread": "Final spread",
+    "band_disagreement": "Band disagreement",
+    "flagged_criteria": "Criteria over tolerance (spread)",
+    "agreed_mark": "Agreed mark",
+    "agreed_grade": "Agreed grade",
+}
+
+def moderation_page(result, rows):
+    """HTML page of a module's reconciliation view"""
+    from moderation import STATUS_ORDER
+    summary = result.summary()
+    settings = result.scheme.moderation
+
+    def cell(column, value):
+        if value is None:
+            return ""
+        if isinstance(value, bool):
+            return "Yes" if value else ""
+        if column == "final_spread":
+            return f"{value:g}"
+        return value
+
+    return "<!DOCTYPE html>" + str(ui.tags.html(
+        ui.tags.head(
+            ui.tags.meta(charset="utf-8"),
+            ui.tags.title(f"Moderation - {result.module}"),
+            ui.tags.style(
+                "body { font-family: sans-serif; margin: 24px; }"
+                "table { border-collapse: collapse; width: 100%; font-size: 13px; }"
+                "th, td { border: 1px solid #ccc; padding: 4px 8px; text-align: left; }"
+                "th { background: #f0f0f0; }"
+                "tr.reconcile { background: #fdecea; } tr.awaiting { background: #fff8e1; }"
+            ),
+        ),
+        ui.tags.body(
+            ui.tags.h1(f"Moderation report: {result.module}"),
+            ui.tags.p(
+                f"{summary['scripts']} scripts, {summary['double_marked']} double marked. "
+                + ", ".join(f"{status}: {summary[status]}" for status in STATUS_ORDER)
+                + f". Tolerances: {settings['criterion_tolerance']} marks per criterion, "
+                f"{settings['final_tolerance']} marks on the final grade; sample rate {settings['sample_rate']:.0%}."
+            ),
+            ui.tags.p(f"Mean final-grade spread of double-marked scripts: {summary['mean_final_spread']:.1f}")
+            if summary["mean_final_spread"] is not None else "",
+            ui.tags.p(ui.tags.a("Download CSV", href="?format=csv")),
+            ui.tags.table(
+                ui.tags.thead(ui.tags.tr(*[ui.tags.th(label) for label in MODERATION_COLUMNS.values()])),
+                ui.tags.tbody(*[
+                    ui.tags.tr(
+                        {"class": {"Needs reconciliation": "reconcile", "Awaiting second marking": "awaiting"}.get(row["status"], "")},
+                        *[ui.tags.td(cell(column, row[column])) for column in MODERATION_COLUMNS],
+                    )
+                    for row in rows
+                ]),
+            ),
+        ),
+    ))
+
+async def moderation_report(request):
+    from moderation import moderate_stored_module, reconciliation_rows
+    module = request.path_params["module"]
+    try:
+        result = await asyncio.to_thread(moderate_stored_module, module)
     except Exception as e:
-        print(f"ERROR testing Excel loading: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+        print(f"Error building moderation report for {module}: {e}")
+        return PlainTextResponse("Moderation report unavailable", status_code=503)
+    rows = reconciliation_rows(result)
+    if request.query_params.get("format") == "csv":
+        import csv
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=["student_id", "status", "second_marking_required", "markers",
+                                                    "final_spread", "band_disagreement", "flagged_criteria",
+                                                    "agreed_mark", "agreed_grade"])
+        writer.writeheader()
+        writer.writerows(rows)
+        return Response(
+            buffer.getvalue(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="moderation_{safe_filename(module)}.csv"'}
+        )
+    return HTMLResponse(moderation_page(result, rows))
 
-# Add a function to test Excel loading at startup
-def test_excel_loading():
-    """Test Excel file loading at application startup"""
+TREND_LABELS = {
+    "year": "Year",
+    "term": "Term",
+    "assessor": "Assessor",
+    "module": "Module",
+    "markings": "Markings",
+    "students": "Students",
+    "final_grade": "Final grade",
+    **{f"{criterion}_score": name for criterion, name in CRITERIA_DISPLAY_NAMES.items()},
+}
+
+def trends_page(by, rows, terms, filters=""):
+    """HTML page of the archive's grade trends; ``filters`` is the query string of the year and module filters"""
+    from archive import TREND_GROUPS
+    columns = [column for column in TREND_LABELS if rows and column in rows[0]]
+    return "<!DOCTYPE html>" + str(ui.tags.html(
+        ui.tags.head(
+            ui.tags.meta(charset="utf-8"),
+            ui.tags.title("Grade trends"),
+            ui.tags.style(
+                "body { font-family: sans-serif; margin: 24px; }"
+                "table { border-collapse: collapse; font-size: 13px; }"
+                "th, td { border: 1px solid #ccc; padding: 4px 8px; text-align: right; }"
+                "th { background: #f0f0f0; }"
+            ),
+        ),
+        ui.tags.body(
+            ui.tags.h1(f"Grade trends by {by}"),
+            ui.tags.p(
+                f"{len(terms)} archived term(s)"
+                + (f", {terms[0]['year']} to {terms[-1]['year']}. " if terms else ". ")
+                + "Mean marks per group; add from, to and module to the address to narrow the span."
+            ),
+            ui.tags.p(
+                *[ui.tags.a(f"By {group}", href=f"?by={group}{filters}", style="margin-right: 12px;") for group in TREND_GROUPS],
+                ui.tags.a("Download CSV", href=f"?by={by}&format=csv{filters}"),
+            ),
+            ui.tags.table(
+                ui.tags.thead(ui.tags.tr(*[ui.tags.th(TREND_LABELS[column]) for column in columns])),
+                ui.tags.tbody(*[
+                    ui.tags.tr(*[ui.tags.td("" if row[column] is None else row[column]) for column in columns])
+                    for row in rows
+                ]),
+            ),
+        ),
+    ))
+
+# Cross-term grade trends from the Parquet archive
+async def archive_trends(request):
+    from archive import TREND_GROUPS, archived_terms, grade_trends
+    params = request.query_params
+    by = params.get("by", "criterion")
+    if by not in TREND_GROUPS:
+        return PlainTextResponse(f"by must be one of {', '.join(TREND_GROUPS)}", status_code=400)
     try:
-        print("Testing Excel file loading...")
-        excel_path = "student_records.xlsx"
-        if not os.path.exists(excel_path):
-            print(f"WARNING: Excel file '{excel_path}' not found in current directory")
-            print(f"Current working directory: {os.getcwd()}")
-            print("Available files in current directory:")
-            for file in os.listdir():
-                print(f"  {file}")
-            return False
-            
-        # Try to read the file
-        df = pd.read_excel(excel_path)
-        print(f"Successfully loaded Excel file with {len(df)} rows")
-        print(f"Excel columns: {df.columns.tolist()}")
-        
-        # Print the first row as an example
-        if len(df) > 0:
-            print("First row example:")
-            print(df.iloc[0].to_dict())
-        
-        return True
+        filters = {
+            "first_year": int(params["from"]) if params.get("from") else None,
+            "last_year": int(params["to"]) if params.get("to") else None,
+            "modules": params.getlist("module") or None,
+        }
+    except ValueError:
+        return PlainTextResponse("from and to must be years", status_code=400)
+    try:
+        rows = await asyncio.to_thread(grade_trends, by, **filters)
     except Exception as e:
-        print(f"ERROR testing Excel loading: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+        print(f"Error querying the archive: {e}")
+        return PlainTextResponse("Archive unavailable", status_code=503)
+    if params.get("format") == "csv":
+        import csv
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=list(rows[0]) if rows else TREND_GROUPS[by])
+        writer.writeheader()
+        writer.writerows(rows)
+        return Response(
+            buffer.getvalue(),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="grade_trends_by_{by}.csv"'}
+        )
+    terms = await asyncio.to_thread(archived_terms)
+    filters = urlencode([(key, value) for key, value in params.multi_items() if key not in ("by", "format")])
+    return HTMLResponse(trends_page(by, rows, terms, f"&{filters}" if filters else ""))
+
+# Marks export, streamed in constant memory (see export.py)
+async def export_marks(request):
+    from export import FORMATS, export_rows, iter_csv, iter_xlsx
+    export_format = request.query_params.get("format", "xlsx")
+    if export_format not in FORMATS:
+        return PlainTextResponse(f"format must be one of {', '.join(FORMATS)}", status_code=400)
+    module = request.query_params.get("module") or None
+    try:
+        roster = get_roster("student_records.xlsx")
+    except Exception as e:
+        print(f"Error loading roster for export: {e}")
+        return PlainTextResponse("Roster unavailable", status_code=503)
+    rows = export_rows(roster, module=module)
+    filename = f"marks_{safe_filename(module)}" if module else "marks"
+    # A plain iterator: Starlette produces each chunk in a worker thread, off the event loop
+    return StreamingResponse(
+        iter_xlsx(rows) if export_format == "xlsx" else iter_csv(rows),
+        media_type=FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{export_format}"'}
+    )
+
+# Student search for the selector - top-k matches from the roster index
+def allocated_students(store, assessor):
+    """IDs of the students allocated to an assessor, or None when nothing has been allocated"""
+    allocation = store.get_allocation()
+    if not allocation:
+        return None
+    return [student_id for student_id, name in allocation.items() if name == assessor]
+
+async def search_students(request):
+    query = request.query_params.get("q", "")
+    try:
+        limit = int(request.query_params.get("limit", "20"))
+    except ValueError:
+        limit = 20
+    try:
+        roster = get_roster("student_records.xlsx")
+    except Exception as e:
+        print(f"Error loading roster for search: {e}")
+        return JSONResponse({"results": [], "error": "Roster unavailable"}, status_code=503)
+    index = get_search_index(roster)
+    # ?assessor=<name> limits the results to the students allocated to them,
+    # as long as an allocation has been made. Their students are looked up
+    # once per allocation, not on every keystroke.
+    allowed = None
+    assessor = request.query_params.get("assessor")
+    if assessor:
+        store = get_store()
+        version = store.allocation_version()
+        if version is not None:
+            allowed = index.restriction(("allocation", version, assessor),
+                                        lambda: allocated_students(store, assessor))
+    return JSONResponse({"results": index.search(query, limit, allowed)})
+
+# Feedback suggestions for the comment box - snippets for the sentence being
+# typed that fit the student's module, final band and criterion bands
+async def suggest_feedback(request):
+    params = request.query_params
+    try:
+        limit = int(params.get("limit", "8"))
+    except ValueError:
+        limit = 8
+    criterion_bands = {
+        criterion: params[f"{criterion}_band"] for criterion in ALL_CRITERIA if params.get(f"{criterion}_band")
+    }
+    suggestions = get_feedback_bank().suggest(
+        params.get("q", ""), params.get("module") or None, params.get("band") or None, criterion_bands, limit
+    )
+    return JSONResponse({"suggestions": suggestions})
 
 # Create the Shiny application
-app = App(app_ui, server)
+shiny_app = App(app_ui, server)
+
+# Mount it next to the report route
+app = Starlette(lifespan=lifespan, routes=[
+    Route("/healthz", liveness),
+    Route("/readyz", readiness),
+    Route("/reports/{report_key}", download_report),
+    Route("/api/students/search", search_students),
+    Route("/api/feedback/suggest", suggest_feedback),
+    Route("/moderation/{module:path}", moderation_report),
+    Route("/archive/trends", archive_trends),
+    Route("/export/marks", export_marks),
+    Mount("/assets", app=ImmutableStaticFiles(directory=DIST_DIR), name="assets"),
+    Mount("/", app=shiny_app),
+])
 
 if __name__ == "__main__":
-    # Test Excel loading first
-    test_excel_loading()
+    import uvicorn
     
     # Use a different port to avoid conflicts
-    app.run(port=8051)  
\ No newline at end of file
+    if WORKER_COUNT > 1:
+        # Worker processes import the app by name, so pass an import string
+        print(f"Starting {WORKER_COUNT} workers sharing store: {get_store()!r}")
+        uvicorn.run(
+            f"{pathlib.Path(__file__).stem}:app",
+            host=SERVER_HOST,
+            port=SERVER_PORT,
+            workers=WORKER_COUNT,
+            app_dir=os.path.dirname(os.path.abspath(__file__))
+        )
+    else:
+        uvicorn.run(app, host=SERVER_HOST, port=SERVER_PORT)  
\ No newline at end of file
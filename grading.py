@@ -0,0 +1,268 @@
+"""Grading scheme engine for the assessment dashboard.
+
+A grading scheme bundles everything that decides how a score is graded:
+the letter bands with their colours, the criteria weights and which bands
+need detailed feedback. Schemes are read from ``grading_schemes.json``
+(a ``default`` entry plus optional per-module overrides keyed by the
+``Module`` column of the roster) and each one is compiled into a 0-100
+lookup table, so score -> band -> colour is a single list index.
+"""
+import json
+import math
+import os
+
+# Built-in scheme, used when no config file is found and as the base that
+# per-module entries in the config file are merged onto.
+DEFAULT_SCHEME_CONFIG = {
+    "bands": [
+        {"grade": "A+", "min": 80, "max": 100, "color": "#4CAF50"},  # Green
+        {"grade": "A", "min": 70, "max": 79, "color": "#8BC34A"},    # Light Green
+        {"grade": "B", "min": 60, "max": 69, "color": "#CDDC39"},    # Lime
+        {"grade": "C", "min": 50, "max": 59, "color": "#FFEB3B"},    # Yellow
+        {"grade": "D", "min": 40, "max": 49, "color": "#FFC107"},    # Amber
+        {"grade": "E", "min": 30, "max": 39, "color": "#FF9800"},    # Orange
+        {"grade": "F", "min": 0, "max": 29, "color": "#F44336"},     # Red
+    ],
+    "weights": {
+        "research": 5,
+        "subject_knowledge": 20,
+        "critical_analysis": 25,
+        "problem_solving": 30,
+        "practical_competence": 5,
+        "communication": 10,
+        "academic_integrity": 5,
+    },
+    "comment_required_grades": ["A+", "A", "F"],
+    "min_comment_words": 15,
+    # Double marking: every script in a comment_required band is second marked,
+    # plus this share of the others; markers agree when they are within the
+    # tolerances (in marks) on each criterion and on the final grade
+    "moderation": {
+        "sample_rate": 0.1,
+        "criterion_tolerance": 10,
+        "final_tolerance": 5,
+    },
+}
+
+# Assessment criteria in report order (every scheme uses the same criteria)
+CRITERIA = tuple(DEFAULT_SCHEME_CONFIG["weights"])
+
+# Mapping from criteria IDs to display names
+CRITERIA_DISPLAY_NAMES = {
+    'research': 'Research',
+    'subject_knowledge': 'Subject Knowledge',
+    'critical_analysis': 'Critical Analysis',
+    'problem_solving': 'Testing and Problem-Solving Skills',
+    'practical_competence': 'Practical Competence',
+    'communication': 'Communication and Presentation',
+    'academic_integrity': 'Academic Integrity'
+}
+
+DEFAULT_SCHEME_NAME = "default"
+SCHEME_CONFIG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "grading_schemes.json")
+
+MIN_SCORE = 0
+MAX_SCORE = 100
+
+
+class GradingScheme:
+    """A compiled grading scheme with O(1) score to band lookup"""
+
+    def __init__(self, name, bands, weights, comment_required_grades, min_comment_words, moderation=None):
+        self.name = name
+        # Bands are kept in display order (best grade first)
+        self.bands = [dict(band) for band in bands]
+        self.weights = dict(weights)
+        self.comment_required_grades = frozenset(comment_required_grades)
+        self.min_comment_words = int(min_comment_words)
+        # Partial moderation settings in a module entry fall back to the defaults
+        self.moderation = dict(DEFAULT_SCHEME_CONFIG["moderation"], **(moderation or {}))
+
+        self.grades = [band["grade"] for band in self.bands]
+        # Same shape as the old GRADE_RANGES constant so existing callers keep working
+        self.grade_ranges = {
+            band["grade"]: {"min": band["min"], "max": band["max"], "color": band["color"]}
+            for band in self.bands
+        }
+
+        self._validate()
+
+        # Compile the bands into a lookup table indexed by whole score
+        self._band_table = [None] * (MAX_SCORE + 1)
+        for band in self.bands:
+            for score in range(band["min"], band["max"] + 1):
+                self._band_table[score] = band["grade"]
+        self._color_table = [self.grade_ranges[grade]["color"] for grade in self._band_table]
+
+    def _validate(self):
+        """Check that the bands tile 0-100 exactly and the weights sum to 100"""
+        covered = [0] * (MAX_SCORE + 1)
+        for band in self.bands:
+            if band["min"] > band["max"]:
+                raise ValueError(f"Scheme '{self.name}': band {band['grade']} has min > max")
+            for score in range(band["min"], band["max"] + 1):
+                if not MIN_SCORE <= score <= MAX_SCORE:
+                    raise ValueError(f"Scheme '{self.name}': band {band['grade']} is outside {MIN_SCORE}-{MAX_SCORE}")
+                covered[score] += 1
+        gaps = [score for score, count in enumerate(covered) if count == 0]
+        overlaps = [score for score, count in enumerate(covered) if count > 1]
+        if gaps:
+            raise ValueError(f"Scheme '{self.name}': scores {gaps[0]}-{gaps[-1]} are not covered by any band")
+        if overlaps:
+            raise ValueError(f"Scheme '{self.name}': score {overlaps[0]} falls into more than one band")
+        unknown = self.comment_required_grades - set(self.grades)
+        if unknown:
+            raise ValueError(f"Scheme '{self.name}': unknown grades in comment_required_grades: {sorted(unknown)}")
+        total_weight = sum(self.weights.values())
+        if total_weight != 100:
+            raise ValueError(f"Scheme '{self.name}': criteria weights sum to {total_weight}, expected 100")
+        if not 0 <= self.moderation["sample_rate"] <= 1:
+            raise ValueError(f"Scheme '{self.name}': moderation sample_rate must be between 0 and 1")
+
+    @staticmethod
+    def _index(score):
+        """Whole-score table index, truncating like the PDF grade columns always have"""
+        try:
+            index = int(score)
+        except (TypeError, ValueError):
+            return MIN_SCORE
+        return min(max(index, MIN_SCORE), MAX_SCORE)
+
+    @staticmethod
+    def _upper_index(score):
+        """Table index of the next whole score up (the score itself when whole)"""
+        try:
+            index = math.ceil(score)
+        except (TypeError, ValueError):
+            return MIN_SCORE
+        return min(max(index, MIN_SCORE), MAX_SCORE)
+
+    def band_for(self, score):
+        """Letter grade for a score"""
+        return self._band_table[self._index(score)]
+
+    def color_for(self, score):
+        """Display colour for a score"""
+        return self._color_table[self._index(score)]
+
+    def grade_range(self, grade):
+        """Min/max/colour of a letter grade"""
+        return self.grade_ranges[grade]
+
+    def comment_required(self, score):
+        """Whether a score needs detailed feedback.
+
+        Decided on the unrounded score rather than its (truncated) band: a
+        score between two whole marks needs feedback when either of them
+        does, so 69.1 needs it like 70 (the dashboard's original
+        ``grade > 69`` rule) and 29.9 like 29.
+        """
+        return (self._band_table[self._index(score)] in self.comment_required_grades
+                or self._band_table[self._upper_index(score)] in self.comment_required_grades)
+
+    def to_dict(self):
+        """JSON-serialisable form of the scheme, for the browser-side grade preview"""
+        return {
+            "name": self.name,
+            "bands": self.bands,
+            "weights": self.weights,
+            "comment_required_grades": sorted(self.comment_required_grades),
+            "min_comment_words": self.min_comment_words,
+        }
+
+    def calculate_final_grade(self, scores):
+        """Calculate weighted final grade from a dict of '<criterion>_score' values"""
+        weighted_sum = sum(
+            scores[f'{criterion}_score'] * weight
+            for criterion, weight in self.weights.items()
+        )
+        # Divide by total weight (100%)
+        return round(weighted_sum / 100, 1)
+
+
+def _build_scheme(name, config, base=None):
+    """Merge a (possibly partial) config entry onto a base config and compile it"""
+    merged = dict(base or DEFAULT_SCHEME_CONFIG)
+    merged.update(config or {})
+    if base is not None and set(merged["weights"]) != set(base["weights"]):
+        raise ValueError(f"Scheme '{name}': criteria must match the default scheme {sorted(base['weights'])}")
+    return GradingScheme(
+        name,
+        merged["bands"],
+        merged["weights"],
+        merged["comment_required_grades"],
+        merged["min_comment_words"],
+        merged.get("moderation"),
+    ), merged
+
+
+# Cache of compiled schemes keyed by config file path, invalidated on mtime change
+_scheme_cache = {}
+
+
+def load_grading_schemes(config_path=SCHEME_CONFIG_FILE):
+    """Load and compile all grading schemes from the config file"""
+    try:
+        mtime = os.path.getmtime(config_path)
+    except OSError:
+        mtime = None
+
+    cached = _scheme_cache.get(config_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    raw = {}
+    if mtime is not None:
+        with open(config_path, "r", encoding="utf-8") as config_file:
+            raw = json.load(config_file)
+    else:
+        print(f"Grading scheme config '{config_path}' not found, using built-in default scheme")
+
+    default_scheme, default_config = _build_scheme(DEFAULT_SCHEME_NAME, raw.get(DEFAULT_SCHEME_NAME))
+    schemes = {DEFAULT_SCHEME_NAME: default_scheme}
+    for module_name, module_config in raw.get("modules", {}).items():
+        schemes[module_name], _ = _build_scheme(module_name, module_config, base=default_config)
+
+    _scheme_cache[config_path] = (mtime, schemes)
+    return schemes
+
+
+def get_grading_scheme(module_name=None, config_path=SCHEME_CONFIG_FILE):
+    """Grading scheme for a module, falling back to the default scheme"""
+    schemes = load_grading_schemes(config_path)
+    if module_name:
+        scheme = schemes.get(str(module_name).strip())
+        if scheme is not None:
+            return scheme
+    return schemes[DEFAULT_SCHEME_NAME]
+
+
+def parse_mark(value):
+    """A mark as a float, or None when it is blank, NaN or not a number (workbook cells, stored marks)"""
+    try:
+        mark = float(value)
+    except (TypeError, ValueError):
+        return None
+    return mark if mark == mark else None
+
+
+def recorded_marking(markings, marks):
+    """The marking behind a student's recorded report.
+
+    ``markings`` are the student's markings, oldest first, and ``marks``
+    their recorded marks (``store.get_marks``). A later second marking is
+    an unreconciled opinion, not the result, so the marking with the
+    recorded final grade (and comment, when several share the grade) is
+    chosen, falling back to the first marking.
+    """
+    if not markings:
+        return None
+    grade = parse_mark(marks.get("marks")) if marks else None
+    if grade is not None:
+        same_grade = [marking for marking in markings if abs(marking["final_grade"] - grade) < 0.05]
+        for marking in same_grade:
+            if marking["comment"] == marks.get("comment"):
+                return marking
+        if same_grade:
+            return same_grade[0]
+    return markings[0]
@@ -0,0 +1,387 @@
+"""Persistent background jobs for long-running bulk operations.
+
+A job is a list of items (e.g. the students of a module) processed one by
+one by a handler registered for the job's kind. Jobs and items live in a
+SQLite database, so that:
+
+* every finished item is a checkpoint - its status and result are
+  committed before the next item starts
+* a job whose worker stopped or crashed (no heartbeat for ``STALE_AFTER``
+  seconds) is picked up again by any worker and resumes at the first
+  unfinished item
+* cancelling a job is a flag the worker checks between items
+* progress (items done/failed of total) can be read at any time by the UI
+
+While a job runs, a timer thread refreshes its heartbeat every
+``HEARTBEAT_INTERVAL`` seconds, so an item that takes longer than
+``STALE_AFTER`` is not taken over by another worker. An item that was in
+progress when its worker died runs again on resume, so handlers must be
+safe to rerun: the cohort reports handler re-renders the PDF of the
+recorded marking and repoints the recorded marks at it, which leaves the
+same state however many times it runs.
+
+Every app process runs ``JOB_WORKERS`` worker threads; a job is claimed with
+a single transaction, so each job runs on one worker at a time however
+many processes share the database.
+
+    ASSESSMENT_JOB_DB=/srv/assessment/jobs.sqlite ASSESSMENT_JOB_WORKERS=1
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from storage import DEFAULT_STORE_DIR
+
+JOB_DB_ENV_VAR = "ASSESSMENT_JOB_DB"
+DEFAULT_JOB_DB = os.path.join(DEFAULT_STORE_DIR, "jobs.sqlite")
+JOB_WORKERS = int(os.environ.get("ASSESSMENT_JOB_WORKERS", "1"))
+
+# Seconds without a heartbeat after which a running job is taken over
+STALE_AFTER = 120.0
+# Seconds between heartbeats of a running job
+HEARTBEAT_INTERVAL = 15.0
+# Seconds an idle worker waits before looking for queued jobs again
+POLL_INTERVAL = 1.0
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+def _now():
+    return datetime.now().isoformat(timespec="seconds")
+
+
+class JobQueue:
+    """SQLite-backed queue of checkpointed jobs"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        job_id TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        label TEXT NOT NULL,
+        params TEXT NOT NULL,
+        status TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        done INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0,
+        message TEXT,
+        result TEXT,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        owner TEXT,
+        heartbeat_at REAL,
+        created_at TEXT NOT NULL,
+        started_at TEXT,
+        finished_at TEXT,
+        updated_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+    CREATE TABLE IF NOT EXISTS job_items (
+        job_id TEXT NOT NULL,
+        position INTEGER NOT NULL,
+        item TEXT NOT NULL,
+        status TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        PRIMARY KEY (job_id, position)
+    );
+    """
+
+    JOB_COLUMNS = ("job_id", "kind", "label", "params", "status", "total", "done", "failed", "message", "result",
+                   "cancel_requested", "owner", "created_at", "started_at", "finished_at")
+
+    def __init__(self, path):
+        self.path = path
+        self._handlers = {}
+        self._finishers = {}
+        self._workers = []
+        self._stop = threading.Event()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            # Databases created before jobs had a result
+            if "result" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+                conn.execute("ALTER TABLE jobs ADD COLUMN result TEXT")
+
+    def __repr__(self):
+        return f"JobQueue({self.path!r})"
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation, as in SQLiteStore
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # Job kinds
+    def register(self, kind, handler, finish=None):
+        """Process the items of ``kind`` jobs with ``handler(item, params)``.
+
+        The handler returns a JSON-serialisable result for the item and
+        raises to mark the item failed; the job carries on with the next.
+        ``finish(job, items)``, if given, runs once every item has been
+        processed (not for a cancelled job), with the job and its items (see
+        ``items``); what it returns is stored as the job's ``result``. It
+        runs again if its worker dies before the job is finished.
+        """
+        self._handlers[kind] = handler
+        if finish is not None:
+            self._finishers[kind] = finish
+
+    # Submitting and controlling jobs
+    def submit(self, kind, items, params=None, label=None):
+        """Queue a job over ``items`` (JSON-serialisable) and return its ID"""
+        if kind not in self._handlers:
+            raise ValueError(f"No handler registered for job kind '{kind}'")
+        job_id = uuid.uuid4().hex
+        items = list(items)
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, kind, label, params, status, total, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, label or kind, json.dumps(params or {}), QUEUED, len(items), _now(), time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO job_items (job_id, position, item, status) VALUES (?, ?, ?, 'pending')",
+                [(job_id, position, json.dumps(item)) for position, item in enumerate(items)],
+            )
+        return job_id
+
+    def cancel(self, job_id):
+        """Cancel a job: a queued one at once, a running one after its current item"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, message = 'Cancelled before it started', finished_at = ?, updated_at = ? "
+                "WHERE job_id = ? AND status = ?",
+                (CANCELLED, _now(), time.time(), job_id, QUEUED),
+            )
+            conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE job_id = ? AND status = ?",
+                (time.time(), job_id, RUNNING),
+            )
+
+    def get(self, job_id):
+        """A job as a dict, or None"""
+        with self._connect() as conn:
+            row = conn.execute(f"SELECT {', '.join(self.JOB_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def recent(self, limit=10):
+        """The most recently created jobs, newest first"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(self.JOB_COLUMNS)} FROM jobs ORDER BY created_at DESC, rowid DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def items(self, job_id):
+        """Items of a job with their status, result and error"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT item, status, result, error FROM job_items WHERE job_id = ? ORDER BY position", (job_id,)
+            ).fetchall()
+        return [
+            {"item": json.loads(item), "status": status, "result": json.loads(result) if result else None, "error": error}
+            for item, status, result, error in rows
+        ]
+
+    def last_change(self):
+        """Changes whenever any job makes progress (cheap to poll)"""
+        with self._connect() as conn:
+            return conn.execute("SELECT MAX(updated_at), COUNT(*) FROM jobs").fetchone()
+
+    def _job(self, row):
+        job = dict(zip(self.JOB_COLUMNS, row))
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        return job
+
+    # Workers
+    def claim(self, owner):
+        """Take the oldest queued job, or a running one whose worker went quiet; returns its ID or None"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE status = ? OR (status = ? AND heartbeat_at < ?) "
+                "ORDER BY created_at, rowid LIMIT 1",
+                (QUEUED, RUNNING, now - STALE_AFTER),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, owner = ?, heartbeat_at = ?, started_at = COALESCE(started_at, ?), "
+                "updated_at = ? WHERE job_id = ?",
+                (RUNNING, owner, now, _now(), now, row[0]),
+            )
+        return row[0]
+
+    def run_job(self, job_id, owner):
+        """Process the unfinished items of a claimed job, checkpointing each one"""
+        # Heartbeats come from a timer thread, so a long item does not look like a dead worker
+        stopped = threading.Event()
+        beating = threading.Thread(target=self._beat, args=(job_id, owner, stopped),
+                                   name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        beating.start()
+        try:
+            self._run_items(job_id, owner)
+        finally:
+            stopped.set()
+            beating.join()
+
+    def _beat(self, job_id, owner, stopped):
+        while not stopped.wait(HEARTBEAT_INTERVAL):
+            try:
+                with self._connect() as conn:
+                    conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND owner = ?",
+                                 (time.time(), job_id, owner))
+            except sqlite3.Error as e:
+                print(f"Heartbeat of job {job_id} failed: {e}")
+
+    def _run_items(self, job_id, owner):
+        job = self.get(job_id)
+        handler = self._handlers.get(job["kind"])
+        if handler is None:
+            self._finish(job_id, FAILED, f"No handler registered for job kind '{job['kind']}'")
+            return
+        with self._connect() as conn:
+            pending = conn.execute(
+                "SELECT position, item FROM job_items WHERE job_id = ? AND status = 'pending' ORDER BY position",
+                (job_id,),
+            ).fetchall()
+        if job["done"] or job["failed"]:
+            print(f"Resuming job {job_id} ({job['label']}) at item {job['done'] + job['failed'] + 1} of {job['total']}")
+
+        last_error = None
+        for position, item in pending:
+            if self._stop.is_set():
+                # Hand the job back so that the next worker resumes it straight away
+                self._update(job_id, "status = ?, owner = NULL", (QUEUED,))
+                return
+            if self._cancel_requested(job_id):
+                self._finish(job_id, CANCELLED, "Cancelled")
+                return
+            try:
+                result = handler(json.loads(item), job["params"])
+                status, column, value = "done", "result", json.dumps(result)
+            except Exception as e:
+                print(f"Job {job_id} item {position} failed: {e}")
+                status, column, value = "failed", "error", str(e)
+                last_error = str(e)
+            # The item and the job's counters are committed together: the checkpoint
+            with self._connect() as conn:
+                conn.execute(
+                    f"UPDATE job_items SET status = ?, {column} = ? WHERE job_id = ? AND position = ?",
+                    (status, value, job_id, position),
+                )
+                counter = "done" if status == "done" else "failed"
+                conn.execute(
+                    f"UPDATE jobs SET {counter} = {counter} + 1, heartbeat_at = ?, updated_at = ? WHERE job_id = ?",
+                    (time.time(), time.time(), job_id),
+                )
+
+        job = self.get(job_id)
+        summary = f"{job['done']} of {job['total']} done" + (f", {job['failed']} failed" if job["failed"] else "")
+        if last_error:
+            summary += f" (last error: {last_error})"
+        finish = self._finishers.get(job["kind"])
+        if finish is not None and job["done"]:
+            try:
+                result = finish(job, self.items(job_id))
+                self._update(job_id, "result = ?", (json.dumps(result),))
+            except Exception as e:
+                print(f"Job {job_id} finishing step failed: {e}")
+                summary += f"; finishing step failed: {e}"
+        self._finish(job_id, FAILED if job["failed"] and not job["done"] else DONE, summary)
+
+    def _cancel_requested(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def _update(self, job_id, assignments, params):
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments}, updated_at = ? WHERE job_id = ?",
+                         (*params, time.time(), job_id))
+
+    def _finish(self, job_id, status, message):
+        self._update(job_id, "status = ?, message = ?, finished_at = ?, owner = NULL", (status, message, _now()))
+        print(f"Job {job_id} {status}: {message}")
+
+    def _work(self, owner):
+        while not self._stop.is_set():
+            try:
+                job_id = self.claim(owner)
+                if job_id is None:
+                    self._stop.wait(POLL_INTERVAL)
+                    continue
+                self.run_job(job_id, owner)
+            except Exception as e:
+                print(f"Job worker {owner} error: {e}")
+                self._stop.wait(POLL_INTERVAL)
+
+    def requeue_orphans(self):
+        """Queue again the running jobs whose worker process on this host has exited.
+
+        Jobs of workers on other hosts are left to the heartbeat timeout.
+        """
+        hostname = socket.gethostname()
+        with self._connect() as conn:
+            running = conn.execute("SELECT job_id, owner FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+        for job_id, owner in running:
+            host, _, rest = (owner or "").partition(":")
+            pid = rest.partition(":")[0]
+            if host != hostname or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                os.kill(int(pid), 0)
+                continue  # Still running
+            except ProcessLookupError:
+                pass
+            except OSError:
+                continue  # Exists but belongs to someone else
+            with self._connect() as conn:
+                # Only if no other worker has taken it over meanwhile
+                conn.execute("UPDATE jobs SET status = ?, owner = NULL, updated_at = ? WHERE job_id = ? AND owner = ?",
+                             (QUEUED, time.time(), job_id, owner))
+            print(f"Job {job_id} was left running by exited process {pid}, queued to resume")
+
+    def start(self, workers=JOB_WORKERS):
+        """Start this process's worker threads"""
+        if any(worker.is_alive() for worker in self._workers):
+            return
+        self.requeue_orphans()
+        self._stop.clear()
+        self._workers = []
+        for index in range(workers):
+            owner = f"{socket.gethostname()}:{os.getpid()}:{index}"
+            worker = threading.Thread(target=self._work, args=(owner,), name=f"job-worker-{index}", daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    def stop(self, timeout=10.0):
+        """Stop the workers after their current item; unfinished jobs go back to the queue"""
+        self._stop.set()
+        for worker in self._workers:
+            worker.join(timeout)
+
+
+_job_queue = None
+
+
+def get_job_queue():
+    """Process-wide job queue, opened on first use"""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = JobQueue(os.environ.get(JOB_DB_ENV_VAR) or DEFAULT_JOB_DB)
+    return _job_queue
@@ -0,0 +1,187 @@
+"""Double marking and moderation.
+
+Regulations require an independent second marking of every script graded
+in a band that needs detailed feedback (F, A and A+ by default - the
+scheme's ``comment_required_grades``) and of a sample of the others. Each
+assessor's marking of a student is kept in the store (``put_marking``);
+``moderate_module`` then compares every marking of a module at once, with
+array operations over all scripts rather than a loop per student:
+
+* the spread between markers on each criterion and on the final grade
+* whether the markers put the script in different bands
+* flags where a spread exceeds the tolerance agreed in the grading scheme
+
+``reconciliation_rows`` turns the result into the rows of the exam board's
+reconciliation view (``/moderation/<module>``).
+"""
+import hashlib
+
+import numpy as np
+
+from grading import CRITERIA, CRITERIA_DISPLAY_NAMES, get_grading_scheme
+from storage import get_store
+
+# Moderation status of a script, in the order the board works through them
+STATUS_RECONCILE = "Needs reconciliation"
+STATUS_AWAITING = "Awaiting second marking"
+STATUS_AGREED = "Agreed"
+STATUS_SINGLE = "Single marked"
+STATUS_ORDER = (STATUS_RECONCILE, STATUS_AWAITING, STATUS_AGREED, STATUS_SINGLE)
+
+
+def in_sample(student_id, rate):
+    """Whether a script falls in the second-marking sample.
+
+    Drawn from a hash of the student ID, so every worker and every restart
+    picks the same scripts.
+    """
+    digest = hashlib.sha256(str(student_id).encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") / 2**64 < rate
+
+
+def second_marking_required(student_id, final_grades, scheme):
+    """Whether a script must be second marked, given the final grades it has received so far"""
+    if any(scheme.comment_required(grade) for grade in final_grades):
+        return True
+    return in_sample(student_id, scheme.moderation["sample_rate"])
+
+
+class ModerationResult:
+    """Discrepancies between the markings of one module, one row per script.
+
+    Per-script values are numpy arrays aligned with ``student_ids``;
+    ``markings[i]`` holds the markings of script ``i``, oldest first.
+    """
+
+    def __init__(self, module, scheme, student_ids, markings, criterion_spread, final_spread,
+                 band_disagreement, criterion_flags, final_flags, required, status, agreed_mark):
+        self.module = module
+        self.scheme = scheme
+        self.student_ids = student_ids
+        self.markings = markings
+        self.criterion_spread = criterion_spread    # (scripts, criteria) max - min score
+        self.final_spread = final_spread            # max - min final grade
+        self.band_disagreement = band_disagreement  # markers gave different bands
+        self.criterion_flags = criterion_flags      # criterion spread above tolerance
+        self.final_flags = final_flags              # final-grade spread above tolerance
+        self.required = required                    # second marking required
+        self.status = status
+        self.agreed_mark = agreed_mark              # NaN until the markers agree
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def summary(self):
+        """Counts per status and the mean spreads of the double-marked scripts"""
+        double_marked = np.array([len(markings) >= 2 for markings in self.markings], dtype=bool)
+        summary = {status: int(np.count_nonzero(self.status == status)) for status in STATUS_ORDER}
+        summary["scripts"] = len(self)
+        summary["double_marked"] = int(np.count_nonzero(double_marked))
+        if summary["double_marked"]:
+            summary["mean_final_spread"] = float(self.final_spread[double_marked].mean())
+            summary["mean_criterion_spread"] = dict(zip(CRITERIA, self.criterion_spread[double_marked].mean(axis=0).tolist()))
+        else:
+            summary["mean_final_spread"] = None
+            summary["mean_criterion_spread"] = {}
+        return summary
+
+
+def _band_lookup(scheme):
+    """Arrays mapping a whole score to its band index, and a band index to whether it forces second marking"""
+    band_index = {grade: index for index, grade in enumerate(scheme.grades)}
+    by_score = np.array([band_index[scheme.band_for(score)] for score in range(101)])
+    forces_second_marking = np.array([grade in scheme.comment_required_grades for grade in scheme.grades])
+    return by_score, forces_second_marking
+
+
+def moderate_module(markings, module=None, scheme=None):
+    """Compare the markings of a module and flag the scripts the markers disagree on"""
+    scheme = scheme or get_grading_scheme(module)
+    settings = scheme.moderation
+    if not markings:
+        empty = np.zeros(0)
+        return ModerationResult(module, scheme, np.array([], dtype=str), [], np.zeros((0, len(CRITERIA))), empty,
+                                empty.astype(bool), np.zeros((0, len(CRITERIA)), dtype=bool), empty.astype(bool),
+                                empty.astype(bool), np.array([], dtype=object), empty)
+
+    # One row per marking, grouped by student (a stable sort keeps each student's markings oldest first)
+    student_ids = np.array([str(marking["student_id"]) for marking in markings])
+    order = np.argsort(student_ids, kind="stable")
+    student_ids = student_ids[order]
+    ordered = [markings[index] for index in order]
+    scores = np.array([[marking["scores"][criterion] for criterion in CRITERIA] for marking in ordered], dtype=float)
+    finals = np.array([marking["final_grade"] for marking in ordered], dtype=float)
+
+    # Bands the same way band_for reads them: the whole part of the grade, clamped to 0-100
+    band_by_score, forces_second_marking = _band_lookup(scheme)
+    bands = band_by_score[np.clip(np.trunc(finals), 0, 100).astype(int)]
+    # and, like comment_required, a grade between two whole marks counts for both
+    upper_bands = band_by_score[np.clip(np.ceil(finals), 0, 100).astype(int)]
+
+    # Segment boundaries of each student's markings
+    ids, starts, counts = np.unique(student_ids, return_index=True, return_counts=True)
+
+    # Grades carry one decimal place; rounding keeps float noise out of the spreads
+    criterion_spread = np.maximum.reduceat(scores, starts, axis=0) - np.minimum.reduceat(scores, starts, axis=0)
+    final_spread = np.round(np.maximum.reduceat(finals, starts) - np.minimum.reduceat(finals, starts), 1)
+    band_disagreement = np.maximum.reduceat(bands, starts) != np.minimum.reduceat(bands, starts)
+    criterion_flags = criterion_spread > settings["criterion_tolerance"]
+    final_flags = final_spread > settings["final_tolerance"]
+
+    sampled = np.array([in_sample(student_id, settings["sample_rate"]) for student_id in ids], dtype=bool)
+    forced = forces_second_marking[bands] | forces_second_marking[upper_bands]
+    required = np.logical_or.reduceat(forced, starts) | sampled
+
+    double_marked = counts >= 2
+    discrepant = criterion_flags.any(axis=1) | final_flags | band_disagreement
+    status = np.select(
+        [~double_marked & required, ~double_marked, discrepant],
+        [STATUS_AWAITING, STATUS_SINGLE, STATUS_RECONCILE],
+        default=STATUS_AGREED,
+    ).astype(object)
+    # Agreed scripts take the mean of their markers; a single marking stands where none is required
+    mean_final = np.add.reduceat(finals, starts) / counts
+    agreed_mark = np.where(
+        (double_marked & ~discrepant) | (~double_marked & ~required), np.round(mean_final, 1), np.nan
+    )
+
+    grouped = [ordered[start:start + count] for start, count in zip(starts, counts)]
+    return ModerationResult(module, scheme, ids, grouped, criterion_spread, final_spread, band_disagreement,
+                            criterion_flags, final_flags, required, status, agreed_mark)
+
+
+def moderate_stored_module(module, store=None):
+    """``moderate_module`` over the markings of a module in the store"""
+    store = store or get_store()
+    return moderate_module(store.list_markings(module), module=module)
+
+
+def reconciliation_rows(result):
+    """Rows of the board's reconciliation view: scripts to reconcile first, then by student ID"""
+    scheme = result.scheme
+    rank = {status: index for index, status in enumerate(STATUS_ORDER)}
+    rows = []
+    for index, student_id in enumerate(result.student_ids):
+        markings = result.markings[index]
+        flagged = [
+            f"{CRITERIA_DISPLAY_NAMES[criterion]} ({result.criterion_spread[index, column]:g})"
+            for column, criterion in enumerate(CRITERIA)
+            if result.criterion_flags[index, column]
+        ]
+        agreed = result.agreed_mark[index]
+        rows.append({
+            "student_id": str(student_id),
+            "status": result.status[index],
+            "second_marking_required": bool(result.required[index]),
+            "markers": "; ".join(
+                f"{marking['assessor']}: {marking['final_grade']:g} ({scheme.band_for(marking['final_grade'])})"
+                for marking in markings
+            ),
+            "final_spread": float(result.final_spread[index]),
+            "band_disagreement": bool(result.band_disagreement[index]),
+            "flagged_criteria": ", ".join(flagged),
+            "agreed_mark": None if np.isnan(agreed) else float(agreed),
+            "agreed_grade": None if np.isnan(agreed) else scheme.band_for(agreed),
+        })
+    rows.sort(key=lambda row: (rank[row["status"]], row["student_id"]))
+    return rows
@@ -0,0 +1,142 @@
+"""Compact record types for roster rows and assessments.
+
+Roster rows and report payloads used to be plain dicts, rebuilt and copied
+per request. ``StudentRecord`` and ``AssessmentRecord`` use ``__slots__``
+(no per-instance ``__dict__``) and typed fields, and the low-cardinality
+roster columns (course, mode, module, supervisor) are interned through a
+shared category table, so 100k students hold only a handful of distinct
+strings for them. Both classes keep the mapping-style access (``record["Name"]``,
+``record.get("Module")``, ``data["research_score"]``) the rest of the
+code base already uses.
+"""
+from grading import CRITERIA
+
+# Roster columns with few distinct values, stored once per roster
+CATEGORY_COLUMNS = ("Course", "Mode", "Module", "Supervisor")
+
+
+class StudentRecord:
+    """One roster row"""
+
+    __slots__ = ("student_id", "name", "surname", "course", "mode", "module", "title", "supervisor", "extra")
+
+    # Roster column -> attribute
+    COLUMNS = {
+        "Student_ID": "student_id",
+        "Name": "name",
+        "Surname": "surname",
+        "Course": "course",
+        "Mode": "mode",
+        "Module": "module",
+        "Title": "title",
+        "Supervisor": "supervisor",
+    }
+
+    def __init__(self, student_id, name="", surname="", course="", mode="", module="", title="",
+                 supervisor="", extra=None):
+        self.student_id = student_id
+        self.name = name
+        self.surname = surname
+        self.course = course
+        self.mode = mode
+        self.module = module
+        self.title = title
+        self.supervisor = supervisor
+        # Any other roster columns (e.g. Marks, Comments); None when there are none
+        self.extra = extra or None
+
+    @classmethod
+    def from_mapping(cls, values, categories=None):
+        """Build a record from a column -> value mapping, interning category columns"""
+        if categories is not None:
+            values = dict(values)
+            for column in CATEGORY_COLUMNS:
+                value = values.get(column)
+                if value is not None:
+                    values[column] = categories.setdefault(value, value)
+        extra = {column: value for column, value in values.items() if column not in cls.COLUMNS and value != ""}
+        return cls(**{attribute: values.get(column, "") for column, attribute in cls.COLUMNS.items()}, extra=extra)
+
+    def get(self, column, default=None):
+        attribute = self.COLUMNS.get(column)
+        if attribute is not None:
+            return getattr(self, attribute)
+        return (self.extra or {}).get(column, default)
+
+    def __getitem__(self, column):
+        attribute = self.COLUMNS.get(column)
+        if attribute is not None:
+            return getattr(self, attribute)
+        if self.extra and column in self.extra:
+            return self.extra[column]
+        raise KeyError(column)
+
+    def to_dict(self):
+        values = {column: getattr(self, attribute) for column, attribute in self.COLUMNS.items()}
+        values.update(self.extra or {})
+        return values
+
+    def __eq__(self, other):
+        if not isinstance(other, StudentRecord):
+            return NotImplemented
+        return all(getattr(self, attribute) == getattr(other, attribute) for attribute in self.__slots__)
+
+    def __repr__(self):
+        return f"StudentRecord({self.to_dict()!r})"
+
+
+class AssessmentRecord:
+    """The data of one assessment report"""
+
+    __slots__ = ("module_name", "report_title", "student_name", "assessor_name", "assessor_comments",
+                 "final_grade", "scores")
+
+    def __init__(self, module_name, report_title, student_name, assessor_name, assessor_comments,
+                 final_grade, scores):
+        self.module_name = module_name
+        self.report_title = report_title
+        self.student_name = student_name
+        self.assessor_name = assessor_name
+        self.assessor_comments = assessor_comments
+        self.final_grade = float(final_grade)
+        # Whole-number scores in CRITERIA order
+        self.scores = tuple(int(scores[criterion]) for criterion in CRITERIA)
+
+    def score(self, criterion):
+        return self.scores[CRITERIA.index(criterion)]
+
+    def __getitem__(self, key):
+        # Report-data keys, as used by the PDF renderers
+        if key == "final_grade":
+            return str(self.final_grade)
+        if key.endswith("_score"):
+            try:
+                return self.scores[CRITERIA.index(key[:-len("_score")])]
+            except ValueError:
+                raise KeyError(key) from None
+        if key in self.__slots__:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        """Report data as a plain dict (same keys and formatting as before)"""
+        data = {
+            'module_name': self.module_name,
+            'report_title': self.report_title,
+            'student_name': self.student_name,
+            'assessor_name': self.assessor_name,
+            'assessor_comments': self.assessor_comments,
+            'final_grade': str(self.final_grade),
+        }
+        for criterion, score in zip(CRITERIA, self.scores):
+            data[f"{criterion}_score"] = score
+        return data
+
+    def __repr__(self):
+        return f"AssessmentRecord({self.to_dict()!r})"
@@ -0,0 +1,638 @@
+"""PDF assessment reports.
+
+Everything that needs ReportLab lives here: the report styles, the logo,
+the platypus renderer (``create_pdf``), the cached-background renderer
+(``create_pdf_stamped``) and multi-report bundles. ``final_code`` imports
+this module on first use, so starting a worker does not pay for loading
+ReportLab until a report is rendered (the warm-up check does that in the
+background once the server is up).
+"""
+import io
+from datetime import datetime
+import os
+import tempfile
+import threading
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, PageBreak
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+
+from grading import CRITERIA, CRITERIA_DISPLAY_NAMES, get_grading_scheme
+from storage import atomic_write_bytes
+
+
+def find_logo_path():
+    """Find the logo file using relative paths or create a dummy logo if not found"""
+    # Try several common locations
+    possible_locations = [
+        "lsbu_logo.png",                         # Current directory
+        os.path.join("assets", "lsbu_logo.png"), # Assets subdirectory
+        os.path.join("..", "assets", "lsbu_logo.png"), # Parent dir assets
+        os.path.join(os.path.dirname(__file__), "lsbu_logo.png"), # Script directory
+    ]
+    
+    for location in possible_locations:
+        if os.path.exists(location):
+            return location
+    
+    # If not found, create a dummy logo file
+    try:
+        from PIL import Image, ImageDraw, ImageFont
+        
+        # Create a blank image for the logo
+        img = Image.new('RGB', (200, 100), color=(0, 51, 102))  # LSBU blue color
+        d = ImageDraw.Draw(img)
+        
+        # Add text (if font not available, it will use default)
+        try:
+            font = ImageFont.truetype("arial.ttf", 36)
+        except:
+            font = ImageFont.load_default()
+            
+        d.text((40, 30), "LSBU", fill=(255, 255, 255), font=font)
+        
+        # Save to a temporary location
+        temp_logo_path = os.path.join(tempfile.gettempdir(), "lsbu_logo_temp.png")
+        img.save(temp_logo_path)
+        print(f"Created temporary logo at: {temp_logo_path}")
+        return temp_logo_path
+    except Exception as e:
+        print(f"Error creating dummy logo: {e}")
+        # If creation fails, return None
+        return None
+
+# Report stylesheet - built once and shared by every report
+_report_styles = None
+
+def get_report_styles():
+    """Build the report paragraph styles on first use and reuse them afterwards"""
+    global _report_styles
+    if _report_styles is not None:
+        return _report_styles
+    
+    styles = getSampleStyleSheet()
+    
+    # Create custom styles with updated alignment
+    styles.add(ParagraphStyle(
+        name='ModuleName',
+        parent=styles['Normal'],
+        fontSize=12,
+        alignment=TA_RIGHT,  # Keep right alignment
+    ))
+
+    styles.add(ParagraphStyle(
+        name='DivisionText',
+        parent=styles['Normal'],
+        fontSize=12,
+        alignment=TA_RIGHT,  # Changed from CENTER to RIGHT
+    ))
+
+    styles.add(ParagraphStyle(
+        name='EngineeringText',
+        parent=styles['Normal'],
+        fontSize=14,
+        fontName='Helvetica-Bold',
+        alignment=TA_RIGHT,  # Changed from CENTER to RIGHT
+        leading=16,
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=20,
+        alignment=TA_CENTER,
+        spaceAfter=12,
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=16,
+        alignment=TA_CENTER,
+        spaceAfter=20,
+    ))
+    
+    styles.add(ParagraphStyle(
+        name='NormalLarge',
+        parent=styles['Normal'],
+        fontSize=12,  # Increased normal text size
+    ))
+    
+    _report_styles = styles
+    return styles
+
+# Resolved logo path, reused while the file still exists
+_logo_path = None
+
+def get_logo_path():
+    """Resolve the logo once instead of searching for it on every report"""
+    global _logo_path
+    if _logo_path is None or not os.path.exists(_logo_path):
+        _logo_path = find_logo_path()
+    return _logo_path
+
+# Resolution of the logo embedded in reports (it is drawn at 2.0 x 1.0 inch)
+REPORT_LOGO_DPI = 200
+
+# Optimised logo path, prepared once per process
+_report_logo_path = None
+
+def get_report_logo_path():
+    """Logo prepared for embedding: flattened on white, downsampled and JPEG encoded once.
+    
+    JPEG files are embedded as-is by ReportLab, so every report reuses the same
+    small compressed image instead of re-encoding the full-size PNG.
+    """
+    global _report_logo_path
+    if _report_logo_path is not None and os.path.exists(_report_logo_path):
+        return _report_logo_path
+    
+    logo_path = get_logo_path()
+    if not logo_path:
+        return None
+    
+    try:
+        from PIL import Image as PILImage
+        
+        logo_stat = os.stat(logo_path)
+        optimised_path = os.path.join(
+            tempfile.gettempdir(),
+            f"lsbu_logo_report_{REPORT_LOGO_DPI}dpi_{logo_stat.st_size}_{int(logo_stat.st_mtime)}.jpg"
+        )
+        if not os.path.exists(optimised_path):
+            with PILImage.open(logo_path) as source:
+                source = source.convert("RGBA")
+                flattened = PILImage.new("RGB", source.size, (255, 255, 255))
+                flattened.paste(source, mask=source.split()[3])
+            flattened.thumbnail((int(2.0 * REPORT_LOGO_DPI), int(1.0 * REPORT_LOGO_DPI)), PILImage.LANCZOS)
+            buffer = io.BytesIO()
+            flattened.save(buffer, format="JPEG", quality=85, optimize=True)
+            atomic_write_bytes(optimised_path, buffer.getvalue())
+            print(f"Optimised report logo: {os.path.getsize(logo_path)} -> {len(buffer.getvalue())} bytes")
+        _report_logo_path = optimised_path
+    except Exception as e:
+        print(f"Could not optimise logo, embedding the original: {e}")
+        _report_logo_path = logo_path
+    return _report_logo_path
+
+# PDF generation function with fixes
+def create_pdf(data, output_path):
+    # Reduced margins to use more page space; content streams compressed
+    doc = SimpleDocTemplate(output_path, pagesize=A4, 
+                          leftMargin=0.3*inch, rightMargin=0.3*inch, 
+                          topMargin=0.4*inch, bottomMargin=0.4*inch,
+                          pageCompression=1)
+    doc.build(build_report_elements(data, doc.width))
+
+def create_report_bundle(reports, output_path):
+    """Render several reports into one PDF.
+    
+    Pages share one copy of the logo image (and, in stamped mode, of the
+    background form), so the per-report size of a bundle is a fraction of
+    a standalone report.
+    """
+    if PDF_RENDER_MODE == "stamped":
+        render_stamped_reports(reports, output_path)
+        return
+    doc = SimpleDocTemplate(output_path, pagesize=A4, 
+                          leftMargin=0.3*inch, rightMargin=0.3*inch, 
+                          topMargin=0.4*inch, bottomMargin=0.4*inch,
+                          pageCompression=1)
+    elements = []
+    for index, data in enumerate(reports):
+        if index:
+            elements.append(PageBreak())
+        elements.extend(build_report_elements(data, doc.width))
+    doc.build(elements)
+
+def build_report_elements(data, available_width):
+    """Flowables of one report page"""
+    scheme = get_grading_scheme(data.get('module_name'))
+    elements = []
+    styles = get_report_styles()
+    
+    # Logo loading with more robust error handling
+    try:
+        logo_path = get_report_logo_path()
+        
+        if logo_path and os.path.exists(logo_path):
+            try:
+                # Test if the file is valid by attempting to open it
+                with open(logo_path, 'rb') as test_file:
+                    test_file.read(10)  # Read first 10 bytes to check if readable
+                
+                # If no error, proceed with image creation
+                logo_content = Image(logo_path, width=2.0*inch, height=1.0*inch)
+                print(f"Successfully loaded logo from: {logo_path}")
+            except Exception as logo_error:
+                print(f"Error opening logo file {logo_path}: {logo_error}")
+                logo_content = Paragraph("LSBU", styles['Heading2'])
+        else:
+            print("Logo path not valid, using text fallback")
+            logo_content = Paragraph("LSBU", styles['Heading2'])
+    except Exception as e:
+        print(f"Exception in logo handling: {e}")
+        logo_content = Paragraph("LSBU", styles['Heading2'])
+    
+    # Restructured header layout - adjusted cell structure
+    header_data = [
+        [
+            logo_content,
+            Paragraph("Module Name: " + data['module_name'], styles['ModuleName']),
+        ],
+        [
+            "",  # Empty cell - logo spans vertically
+            Paragraph("Division of", styles['DivisionText']),
+        ],
+        [
+            "",  # Empty cell  
+            Paragraph("Electrical and Electronic Engineering", styles['EngineeringText']),
+        ]
+    ]
+
+    # Adjusted header table with proper dimensions
+    header_table = Table(header_data, colWidths=[2.5*inch, 4.0*inch])
+    header_table.setStyle(TableStyle([
+        ('VALIGN', (0, 0), (0, 2), 'TOP'),  # Logo aligned to top
+        ('VALIGN', (1, 0), (1, 0), 'TOP'),  # Module name at top
+        ('VALIGN', (1, 1), (1, 2), 'MIDDLE'),  # Division text vertically centered
+        ('ALIGN', (0, 0), (0, 2), 'LEFT'),   # Logo left aligned
+        ('ALIGN', (1, 0), (1, 2), 'RIGHT'),  # All right column elements right-aligned
+        ('SPAN', (0, 0), (0, 2)),  # Logo spans all rows
+        ('GRID', (0, 0), (-1, -1), 0, colors.white),  # Invisible grid
+        ('RIGHTPADDING', (1, 0), (1, 2), 5),  # Reduced right padding to pull text more to edge
+        ('BOTTOMPADDING', (1, 1), (1, 1), 0),  # Remove padding between Division and Engineering
+        ('TOPPADDING', (1, 2), (1, 2), 0),     # Remove padding between Division and Engineering
+    ]))
+    elements.append(header_table)
+    elements.append(Spacer(1, 0.4*inch))
+    
+    # Title with larger text
+    elements.append(Paragraph("Assessment", styles['CustomTitle']))
+    elements.append(Paragraph(f"Assignment 2 - Report: {data['report_title']}", styles['CustomSubtitle']))
+    
+    # Create grade table with fixed column structure
+    # First row with student name (span across all columns)
+    grade_data = [
+        [Paragraph(f"Student: {data['student_name']}", styles['NormalLarge'])] + [''] * len(scheme.grades),
+    ]
+    
+    # Grade range headers - one column per band of the module's grading scheme
+    grade_data.append([''] + scheme.grades)
+    
+    # Grade ranges - with correct string format instead of subtraction
+    grade_data.append([''] + [
+        f"{scheme.grade_ranges[grade]['min']}-{scheme.grade_ranges[grade]['max']}"
+        for grade in scheme.grades
+    ])
+    
+    # Assessment criteria rows - with weights displayed
+    for criterion in CRITERIA:
+        label = f"{CRITERIA_DISPLAY_NAMES[criterion]} ({scheme.weights[criterion]}%)"
+        score = data[f'{criterion}_score']
+        row = [Paragraph(label, styles['NormalLarge'])]  # Using larger font
+        # Place the score in the column of its band (single table lookup)
+        score_band = scheme.band_for(score)
+        for grade in scheme.grades:
+            row.append(score if grade == score_band else '')
+        
+        grade_data.append(row)
+    
+    # Create and style the grade table with proportional column widths
+    # Using full available width and taller rows
+    band_width = available_width * 0.60 / len(scheme.grades)
+    col_widths = [available_width * 0.40] + [band_width] * len(scheme.grades)  # Adjusted for full width
+    grade_table = Table(grade_data, colWidths=col_widths, rowHeights=[0.5*inch] + [0.4*inch] * (len(grade_data) - 1))  # Taller rows
+    grade_table.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('SPAN', (0, 0), (-1, 0)),  # Span the student name row
+        ('ALIGN', (1, 1), (-1, -1), 'CENTER'),  # Center-align all grade columns
+        ('ALIGN', (0, 1), (0, -1), 'LEFT'),     # Left-align criteria column
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('BACKGROUND', (0, 1), (-1, 2), colors.lightgrey),  # Grey background for headers
+        ('FONTSIZE', (1, 1), (-1, 2), 12),  # Larger font for headers
+    ]))
+    elements.append(grade_table)
+    elements.append(Spacer(1, 0.3*inch))
+    
+    # Assessor's comments - larger and using more width
+    comments_data = [
+        [Paragraph("Assessor's Comments", styles['NormalLarge']), 
+         Paragraph("Comments (Written Feedback) of the overall Assignment Performance", styles['NormalLarge'])],
+        [Paragraph(data['assessor_comments'], styles['NormalLarge'])]
+    ]
+    
+    comments_table = Table(comments_data, colWidths=[available_width * 0.25, available_width * 0.75], rowHeights=[0.4*inch, 1.2*inch])  # Taller rows
+    comments_table.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('SPAN', (0, 1), (1, 1)),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),  # Grey background for header
+    ]))
+    elements.append(comments_table)
+    elements.append(Spacer(1, 0.3*inch))
+    
+    # Final assessment row - larger text and more width
+    final_row = [
+        [Paragraph(f"Assessed by: {data['assessor_name']}", styles['NormalLarge']),
+         Paragraph("*Grade (%)", styles['NormalLarge']),
+         Paragraph(data['final_grade'], styles['NormalLarge'])]
+    ]
+    
+    final_table = Table(final_row, colWidths=[available_width * 0.6, available_width * 0.2, available_width * 0.2], rowHeights=[0.45*inch])  # Taller row
+    final_table.setStyle(TableStyle([
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('ALIGN', (1, 0), (2, 0), 'CENTER'),  # Center the grade columns
+    ]))
+    elements.append(final_table)
+    
+    # Disclaimer - larger text
+    elements.append(Spacer(1, 0.25*inch))
+    elements.append(Paragraph("* This grade is provisional only and may be subject to change.", styles['NormalLarge']))
+    
+    # Current month/year - larger text
+    elements.append(Spacer(1, 0.5*inch))
+    current_date = datetime.now().strftime("%B %Y")  # FIX: Using proper date format
+    date_paragraph = Paragraph(current_date, styles['NormalLarge'])
+    date_paragraph.hAlign = 'RIGHT'
+    elements.append(date_paragraph)
+    
+    return elements
+
+# Static-background ("stamped") report rendering
+#
+# Most of a report page is identical for every student. ReportBackground lays
+# that static content out once per grading scheme, mirroring create_pdf, and
+# records where each per-student field goes. Rendering a report then draws the
+# background as a PDF form (defined once per file, reused by every page) and
+# stamps only the variable fields with plain canvas calls - no platypus layout.
+
+# Page geometry shared with create_pdf
+REPORT_MARGINS = {'left': 0.3*inch, 'right': 0.3*inch, 'top': 0.4*inch, 'bottom': 0.4*inch}
+FRAME_PADDING = 6  # Default padding of the platypus frame used by SimpleDocTemplate
+CELL_PADDING = {'left': 6, 'right': 6, 'top': 3, 'bottom': 3}  # Default table cell padding
+
+# Report rendering mode: "platypus" (create_pdf) or "stamped" (create_pdf_stamped)
+PDF_RENDER_MODE = os.environ.get("ASSESSMENT_PDF_MODE", "platypus")
+
+# Longest report title (in lines) that gets its own background; longer titles are shrunk
+MAX_STAMPED_TITLE_LINES = 3
+
+def report_frame_width():
+    """Width available to flowables on a report page"""
+    return A4[0] - REPORT_MARGINS['left'] - REPORT_MARGINS['right'] - 2 * FRAME_PADDING
+
+def report_title_lines(data):
+    """Number of lines the report title line wraps to, as create_pdf would lay it out"""
+    style = get_report_styles()['CustomSubtitle']
+    title = Paragraph(f"Assignment 2 - Report: {data['report_title']}", style)
+    _, height = title.wrap(report_frame_width(), A4[1])
+    return max(1, min(MAX_STAMPED_TITLE_LINES, int(round(height / style.leading))))
+
+class ReportBackground:
+    """Static page of a report for one grading scheme plus the slots of its variable fields"""
+    
+    def __init__(self, scheme, title_lines=1):
+        self.scheme = scheme
+        # The title is the only variable field that moves the rest of the page
+        self.title_lines = title_lines
+        self.form_name = (f"ReportBackground_{title_lines}_" +
+                          "".join(c if c.isalnum() else "_" for c in scheme.name))
+        self.styles = get_report_styles()
+        self.placements = []  # (flowable, x, y) drawn into the background form
+        self.slots = {}       # field -> (x, y, width, height)
+        # drawOn sets and then deletes flowable.canv, so the shared flowables are drawn by one thread at a time
+        self._draw_lock = threading.Lock()
+        self._layout()
+    
+    def _layout(self):
+        styles = self.styles
+        scheme = self.scheme
+        page_width, page_height = A4
+        available_width = page_width - REPORT_MARGINS['left'] - REPORT_MARGINS['right']
+        frame_x = REPORT_MARGINS['left'] + FRAME_PADDING
+        frame_width = report_frame_width()
+        frame_bottom = REPORT_MARGINS['bottom'] + FRAME_PADDING
+        cursor = {'y': page_height - REPORT_MARGINS['top'] - FRAME_PADDING, 'space_after': 0, 'at_top': True}
+        
+        # Stack flowables top-down the way a platypus frame does
+        def place(flowable, static=True):
+            if not cursor['at_top']:
+                cursor['y'] -= max(flowable.getSpaceBefore() - cursor['space_after'], 0)
+            width, height = flowable.wrap(frame_width, cursor['y'] - frame_bottom)
+            x = frame_x + (frame_width - width) / 2.0  # Tables are centred in the frame
+            cursor['y'] -= height
+            if static:
+                self.placements.append((flowable, x, cursor['y']))
+            cursor['space_after'] = flowable.getSpaceAfter()
+            cursor['y'] -= cursor['space_after']
+            cursor['at_top'] = False
+            return x, cursor['y'] + cursor['space_after'], width, height
+        
+        def cell_rect(table, origin, col, row, col_span=1):
+            x, y, _, height = origin
+            cell_x = x + sum(table._colWidths[:col])
+            cell_top = y + height - sum(table._rowHeights[:row])
+            cell_height = table._rowHeights[row]
+            return (cell_x, cell_top - cell_height, sum(table._colWidths[col:col + col_span]), cell_height)
+        
+        # Invisible paragraph so rows keep the height they have with real text
+        def placeholder(style_name, lines=1):
+            return Paragraph("<br/>".join(["&nbsp;"] * lines), styles[style_name])
+        
+        # Header: logo and division text are static, the module name is stamped
+        logo_path = get_report_logo_path()
+        logo_content = Paragraph("LSBU", styles['Heading2'])
+        if logo_path and os.path.exists(logo_path):
+            try:
+                logo_content = Image(logo_path, width=2.0*inch, height=1.0*inch)
+            except Exception as e:
+                print(f"Error opening logo file {logo_path}: {e}")
+        header_table = Table([
+            [logo_content, placeholder('ModuleName')],
+            ["", Paragraph("Division of", styles['DivisionText'])],
+            ["", Paragraph("Electrical and Electronic Engineering", styles['EngineeringText'])],
+        ], colWidths=[2.5*inch, 4.0*inch])
+        header_table.setStyle(TableStyle([
+            ('VALIGN', (0, 0), (0, 2), 'TOP'),
+            ('VALIGN', (1, 0), (1, 0), 'TOP'),
+            ('VALIGN', (1, 1), (1, 2), 'MIDDLE'),
+            ('ALIGN', (0, 0), (0, 2), 'LEFT'),
+            ('ALIGN', (1, 0), (1, 2), 'RIGHT'),
+            ('SPAN', (0, 0), (0, 2)),
+            ('GRID', (0, 0), (-1, -1), 0, colors.white),
+            ('RIGHTPADDING', (1, 0), (1, 2), 5),
+            ('BOTTOMPADDING', (1, 1), (1, 1), 0),
+            ('TOPPADDING', (1, 2), (1, 2), 0),
+        ]))
+        header = place(header_table)
+        self.slots['module_name'] = cell_rect(header_table, header, 1, 0)
+        place(Spacer(1, 0.4*inch))
+        
+        # Titles: "Assessment" is static, the report title line is stamped
+        place(Paragraph("Assessment", styles['CustomTitle']))
+        x, y, _, height = place(placeholder('CustomSubtitle', self.title_lines), static=False)
+        self.slots['report_title'] = (frame_x, y, frame_width, height)
+        
+        # Grade table: band headers, ranges, criteria labels and grid are static
+        grade_data = [[placeholder('NormalLarge')] + [''] * len(scheme.grades)]
+        grade_data.append([''] + scheme.grades)
+        grade_data.append([''] + [
+            f"{scheme.grade_ranges[grade]['min']}-{scheme.grade_ranges[grade]['max']}"
+            for grade in scheme.grades
+        ])
+        for criterion in CRITERIA:
+            label = f"{CRITERIA_DISPLAY_NAMES[criterion]} ({scheme.weights[criterion]}%)"
+            grade_data.append([Paragraph(label, styles['NormalLarge'])] + [''] * len(scheme.grades))
+        band_width = available_width * 0.60 / len(scheme.grades)
+        col_widths = [available_width * 0.40] + [band_width] * len(scheme.grades)
+        grade_table = Table(grade_data, colWidths=col_widths, rowHeights=[0.5*inch] + [0.4*inch] * (len(grade_data) - 1))
+        grade_table.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('SPAN', (0, 0), (-1, 0)),
+            ('ALIGN', (1, 1), (-1, -1), 'CENTER'),
+            ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BACKGROUND', (0, 1), (-1, 2), colors.lightgrey),
+            ('FONTSIZE', (1, 1), (-1, 2), 12),
+        ]))
+        grade = place(grade_table)
+        self.slots['student_name'] = cell_rect(grade_table, grade, 0, 0, col_span=len(col_widths))
+        for row, criterion in enumerate(CRITERIA, start=3):
+            for col, band in enumerate(scheme.grades, start=1):
+                self.slots[(criterion, band)] = cell_rect(grade_table, grade, col, row)
+        place(Spacer(1, 0.3*inch))
+        
+        # Comments: header row static, comment text stamped
+        comments_table = Table([
+            [Paragraph("Assessor's Comments", styles['NormalLarge']),
+             Paragraph("Comments (Written Feedback) of the overall Assignment Performance", styles['NormalLarge'])],
+            [placeholder('NormalLarge')]
+        ], colWidths=[available_width * 0.25, available_width * 0.75], rowHeights=[0.4*inch, 1.2*inch])
+        comments_table.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('SPAN', (0, 1), (1, 1)),
+            ('BACKGROUND', (0, 0), (-1, 0), colors.lightgrey),
+        ]))
+        comments = place(comments_table)
+        self.slots['assessor_comments'] = cell_rect(comments_table, comments, 0, 1, col_span=2)
+        place(Spacer(1, 0.3*inch))
+        
+        # Final row: "*Grade (%)" static, assessor and grade stamped
+        final_table = Table([
+            [placeholder('NormalLarge'), Paragraph("*Grade (%)", styles['NormalLarge']), placeholder('NormalLarge')]
+        ], colWidths=[available_width * 0.6, available_width * 0.2, available_width * 0.2], rowHeights=[0.45*inch])
+        final_table.setStyle(TableStyle([
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('ALIGN', (1, 0), (2, 0), 'CENTER'),
+        ]))
+        final = place(final_table)
+        self.slots['assessor_name'] = cell_rect(final_table, final, 0, 0)
+        self.slots['final_grade'] = cell_rect(final_table, final, 2, 0)
+        
+        # Disclaimer static, date stamped
+        place(Spacer(1, 0.25*inch))
+        place(Paragraph("* This grade is provisional only and may be subject to change.", styles['NormalLarge']))
+        place(Spacer(1, 0.5*inch))
+        x, y, _, height = place(placeholder('NormalLarge'), static=False)
+        self.slots['date'] = (frame_x, y, frame_width, height)
+    
+    def draw(self, canvas):
+        """Draw the static content (called once per file, inside a form)"""
+        with self._draw_lock:
+            for flowable, x, y in self.placements:
+                flowable.drawOn(canvas, x, y)
+    
+    def _stamp_paragraph(self, canvas, text, style_name, slot, valign='TOP', cell=True, right_padding=None, shrink_to_fit=False):
+        x, y, width, height = self.slots[slot]
+        left_pad = CELL_PADDING['left'] if cell else 0
+        right_pad = (CELL_PADDING['right'] if right_padding is None else right_padding) if cell else 0
+        top_pad = CELL_PADDING['top'] if cell else 0
+        bottom_pad = CELL_PADDING['bottom'] if cell else 0
+        style = self.styles[style_name]
+        paragraph = Paragraph(text, style)
+        _, paragraph_height = paragraph.wrapOn(canvas, width - left_pad - right_pad, height)
+        # The background has a fixed slot, so shrink lines that would reflow onto a second line
+        while shrink_to_fit and paragraph_height > height and style.fontSize > 8:
+            style = ParagraphStyle(name=f"{style.name}Shrunk", parent=style,
+                                   fontSize=style.fontSize - 1, leading=style.leading - 1)
+            paragraph = Paragraph(text, style)
+            _, paragraph_height = paragraph.wrapOn(canvas, width - left_pad - right_pad, height)
+        if valign == 'MIDDLE':
+            paragraph_y = y + (height + bottom_pad - top_pad - paragraph_height) / 2.0
+        else:
+            paragraph_y = y + height - top_pad - paragraph_height
+        paragraph.drawOn(canvas, x + left_pad, paragraph_y)
+    
+    def stamp(self, canvas, data):
+        """Draw the per-student fields of one report on the current page"""
+        scheme = self.scheme
+        self._stamp_paragraph(canvas, "Module Name: " + data['module_name'], 'ModuleName', 'module_name',
+                              right_padding=5, shrink_to_fit=True)
+        self._stamp_paragraph(canvas, f"Assignment 2 - Report: {data['report_title']}", 'CustomSubtitle',
+                              'report_title', cell=False, shrink_to_fit=True)
+        self._stamp_paragraph(canvas, f"Student: {data['student_name']}", 'NormalLarge', 'student_name', valign='MIDDLE')
+        
+        # Scores: default table font, centred in the cell of their band
+        canvas.setFont('Helvetica', 10)
+        for criterion in CRITERIA:
+            score = data[f'{criterion}_score']
+            x, y, width, height = self.slots[(criterion, scheme.band_for(score))]
+            baseline = y + (CELL_PADDING['bottom'] + height - CELL_PADDING['top'] + 12) / 2.0 - 10
+            canvas.drawCentredString(x + width / 2.0, baseline, str(score))
+        
+        self._stamp_paragraph(canvas, data['assessor_comments'], 'NormalLarge', 'assessor_comments')
+        self._stamp_paragraph(canvas, f"Assessed by: {data['assessor_name']}", 'NormalLarge', 'assessor_name', valign='MIDDLE')
+        self._stamp_paragraph(canvas, data['final_grade'], 'NormalLarge', 'final_grade', valign='MIDDLE')
+        self._stamp_paragraph(canvas, datetime.now().strftime("%B %Y"), 'NormalLarge', 'date', cell=False)
+
+# Laid-out backgrounds keyed by grading scheme and title line count
+_report_backgrounds = {}
+_report_backgrounds_lock = threading.Lock()
+
+def get_report_background(scheme, title_lines=1):
+    """Background for a grading scheme, laid out on first use (once, whichever thread gets there first)"""
+    key = (scheme, title_lines)
+    background = _report_backgrounds.get(key)
+    if background is None:
+        with _report_backgrounds_lock:
+            background = _report_backgrounds.get(key)
+            if background is None:
+                background = ReportBackground(scheme, title_lines)
+                _report_backgrounds[key] = background
+    return background
+
+def render_stamped_reports(reports, output_path):
+    """Render one page per report into a single PDF, sharing each background form"""
+    from reportlab.pdfgen import canvas as pdf_canvas
+    
+    pdf = pdf_canvas.Canvas(output_path, pagesize=A4, pageCompression=1)
+    defined_forms = set()
+    for data in reports:
+        background = get_report_background(get_grading_scheme(data.get('module_name')), report_title_lines(data))
+        if background.form_name not in defined_forms:
+            pdf.beginForm(background.form_name)
+            background.draw(pdf)
+            pdf.endForm()
+            defined_forms.add(background.form_name)
+        pdf.doForm(background.form_name)
+        background.stamp(pdf, data)
+        pdf.showPage()
+    pdf.save()
+
+def create_pdf_stamped(data, output_path):
+    """Same report as create_pdf, rendered by stamping fields onto the cached background"""
+    render_stamped_reports([data], output_path)
+
+def render_report(data, output_path):
+    """Render a report with the configured PDF_RENDER_MODE"""
+    if PDF_RENDER_MODE == "stamped":
+        create_pdf_stamped(data, output_path)
+    else:
+        create_pdf(data, output_path)
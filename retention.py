@@ -0,0 +1,146 @@
+"""Retention of generated reports.
+
+Every click on "Generate PDF Report" stores a new report, so over a marking
+season the report store only grows. ``ReportRetention`` keeps it within a
+quota:
+
+* reports older than ``max_age_days`` are deleted
+* while the remaining reports exceed ``max_bytes``, the least recently
+  used (created or downloaded) are evicted first
+* a student's recorded report (the one their marks point at) is never
+  evicted, whichever worker a session viewing it is on
+* reports a session of this process still offers for download (such as
+  one just superseded) are pinned and never evicted either
+* when a session ends, the reports it generated that were superseded by a
+  newer version for the same student are deleted right away
+
+Enforcement runs at most every ``interval`` seconds, in the background, and
+under a store lock so that only one worker scans the store at a time.
+
+    ASSESSMENT_REPORT_QUOTA_MB=500 ASSESSMENT_REPORT_MAX_AGE_DAYS=120
+"""
+import os
+import threading
+import time
+
+from storage import get_store
+
+REPORT_QUOTA_MB = float(os.environ.get("ASSESSMENT_REPORT_QUOTA_MB", "500"))
+REPORT_MAX_AGE_DAYS = float(os.environ.get("ASSESSMENT_REPORT_MAX_AGE_DAYS", "120"))
+# Minimum seconds between two enforcement passes of one process
+ENFORCE_INTERVAL = 60.0
+
+
+def plan_evictions(reports, max_bytes, max_age_seconds, now, pinned=()):
+    """Report keys to delete so the rest fit the quota: expired first, then least recently used"""
+    evict = []
+    kept = []
+    for report in reports:
+        if report["report_key"] in pinned:
+            kept.append(report)
+        elif max_age_seconds is not None and now - report["created_at"] > max_age_seconds:
+            evict.append(report["report_key"])
+        else:
+            kept.append(report)
+
+    total = sum(report["size"] for report in kept)
+    if max_bytes is not None and total > max_bytes:
+        candidates = sorted(
+            (report for report in kept if report["report_key"] not in pinned),
+            key=lambda report: report["accessed_at"],
+        )
+        for report in candidates:
+            if total <= max_bytes:
+                break
+            evict.append(report["report_key"])
+            total -= report["size"]
+    return evict
+
+
+class ReportRetention:
+    """Quota and LRU eviction for the reports of a store"""
+
+    def __init__(self, store=None, max_bytes=None, max_age_days=None, interval=ENFORCE_INTERVAL):
+        self._store = store
+        self.max_bytes = int(REPORT_QUOTA_MB * 2**20) if max_bytes is None else max_bytes
+        self.max_age_days = REPORT_MAX_AGE_DAYS if max_age_days is None else max_age_days
+        self.interval = interval
+        self._pins = {}  # report_key -> number of sessions showing it
+        self._lock = threading.Lock()
+        self._last_run = None
+
+    @property
+    def store(self):
+        return self._store or get_store()
+
+    # Pinned reports (offered for download by a live session in this process)
+    def pin(self, report_key):
+        with self._lock:
+            self._pins[report_key] = self._pins.get(report_key, 0) + 1
+
+    def unpin(self, report_key):
+        with self._lock:
+            count = self._pins.get(report_key, 0) - 1
+            if count > 0:
+                self._pins[report_key] = count
+            else:
+                self._pins.pop(report_key, None)
+
+    def pinned(self):
+        with self._lock:
+            return set(self._pins)
+
+    def enforce(self, now=None):
+        """Delete expired and least recently used reports; returns (reports deleted, bytes freed)"""
+        store = self.store
+        now = time.time() if now is None else now
+        max_age_seconds = self.max_age_days * 86400 if self.max_age_days else None
+        with store.lock("report-retention"):
+            reports = store.list_reports()
+            # Recorded reports are read from the store, so they are kept for the sessions of every worker
+            kept = self.pinned() | store.recorded_report_keys()
+            evict = plan_evictions(reports, self.max_bytes, max_age_seconds, now, kept)
+            sizes = {report["report_key"]: report["size"] for report in reports}
+            for report_key in evict:
+                store.delete_report(report_key)
+        freed = sum(sizes[report_key] for report_key in evict)
+        if evict:
+            print(f"Report retention: deleted {len(evict)} report(s), freed {freed / 2**20:.1f} MB "
+                  f"({len(reports) - len(evict)} kept)")
+        return len(evict), freed
+
+    def maybe_enforce(self):
+        """Run ``enforce`` unless this process ran it within the last ``interval`` seconds"""
+        with self._lock:
+            if self._last_run is not None and time.monotonic() - self._last_run < self.interval:
+                return None
+            self._last_run = time.monotonic()
+        try:
+            return self.enforce()
+        except Exception as e:
+            print(f"Report retention failed: {e}")
+            return None
+
+    def release_session(self, generated):
+        """Delete the superseded reports a finished session generated.
+
+        ``generated`` is a list of (student_id, report_key); a report is kept
+        while it is its student's recorded report.
+        """
+        store = self.store
+        pinned = self.pinned()
+        for student_id, report_key in generated:
+            recorded = store.get_marks(student_id) or {}
+            if report_key not in pinned and recorded.get("report_key") != report_key:
+                store.delete_report(report_key)
+
+
+_retention = None
+
+
+def get_report_retention():
+    """Process-wide retention manager for the shared store"""
+    global _retention
+    if _retention is None:
+        _retention = ReportRetention()
+    return _retention
@@ -0,0 +1,548 @@
+"""Roster import pipeline.
+
+Registry exports (CSV or XLSX) are streamed in chunks, every row is
+validated and normalised, duplicate students are dropped, and the result
+is an indexed ``Roster`` keyed by normalised ``Student_ID``. Lookups are a
+dict access instead of a scan over the workbook, and ``123``, ``123.0``
+and ``" 123 "`` all resolve to the same student. ``get_roster`` shares one
+memory-mapped snapshot of the imported roster between worker processes.
+
+    python roster.py registry_export.csv
+"""
+import csv
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import tempfile
+from array import array
+from collections.abc import Mapping
+
+from records import StudentRecord
+from storage import atomic_write_bytes, file_lock
+
+# Columns every roster must provide
+REQUIRED_COLUMNS = ["Student_ID", "Name", "Surname", "Course", "Mode", "Module", "Title", "Supervisor"]
+
+DEFAULT_CHUNK_SIZE = 5000
+
+_INTEGRAL_FLOAT_PATTERN = re.compile(r"^(\d+)\.0*$")
+_STUDENT_ID_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_\-/]*$")
+
+
+def normalise_student_id(value):
+    """Canonical string form of a student ID.
+
+    Excel turns numeric IDs into floats, so ``123.0`` (number or text)
+    becomes ``"123"``. Raises ``ValueError`` for empty or malformed IDs.
+    """
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        raise ValueError("Student_ID is empty")
+    if isinstance(value, bool):
+        raise ValueError(f"Student_ID {value!r} is not a valid ID")
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        if not value.is_integer():
+            raise ValueError(f"Student_ID {value!r} is not a whole number")
+        return str(int(value))
+
+    text = str(value).strip()
+    if not text:
+        raise ValueError("Student_ID is empty")
+    match = _INTEGRAL_FLOAT_PATTERN.match(text)
+    if match:
+        return match.group(1)
+    if not _STUDENT_ID_PATTERN.match(text):
+        raise ValueError(f"Student_ID {text!r} contains invalid characters")
+    return text
+
+
+def normalise_cell(value):
+    """Clean a roster cell: strip text, drop NaN, render whole floats as ints"""
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return ""
+        if value.is_integer():
+            return str(int(value))
+        return str(value)
+    return str(value).strip()
+
+
+def _iter_csv_rows(path):
+    with open(path, "r", encoding="utf-8-sig", newline="") as csv_file:
+        yield from csv.reader(csv_file)
+
+
+def _iter_xlsx_rows(path):
+    from openpyxl import load_workbook
+
+    # read_only mode streams rows from the sheet XML instead of building the whole workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def iter_roster_chunks(path, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a roster file as (header, [(row_number, values), ...]) chunks"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        rows = _iter_csv_rows(path)
+    elif extension in (".xlsx", ".xlsm"):
+        rows = _iter_xlsx_rows(path)
+    else:
+        raise ValueError(f"Unsupported roster format '{extension}' (expected .csv or .xlsx)")
+
+    header = next(rows, None)
+    if header is None:
+        return
+    header = [normalise_cell(column) for column in header]
+
+    chunk = []
+    # Row numbers are 1-based and count the header, matching what users see in Excel
+    for row_number, values in enumerate(rows, start=2):
+        chunk.append((row_number, values))
+        if len(chunk) >= chunk_size:
+            yield header, chunk
+            chunk = []
+    if chunk:
+        yield header, chunk
+
+
+class Roster:
+    """Indexed, validated roster"""
+
+    def __init__(self, source=None, columns=None):
+        self.source = source
+        self.columns = list(columns or REQUIRED_COLUMNS)
+        self.students = {}
+        self.errors = []
+        self.rows_read = 0
+        self.duplicates = 0
+        self._positions = None
+
+    def __len__(self):
+        return len(self.students)
+
+    def __contains__(self, student_id):
+        return self.get(student_id) is not None
+
+    def get(self, student_id):
+        """Record of a student (a StudentRecord, indexable by column name) or None"""
+        try:
+            return self.students.get(normalise_student_id(student_id))
+        except ValueError:
+            return None
+
+    def student_ids(self):
+        """Student IDs in roster order"""
+        return list(self.students)
+
+    def rows(self):
+        """(student ID, tuple of UTF-8 cells in ``columns`` order) for every student, in roster order"""
+        for student_id, record in self.students.items():
+            yield student_id, tuple(record.get(column, "").encode("utf-8") for column in self.columns)
+
+    def neighbour(self, student_id, offset):
+        """Student ID ``offset`` places away in roster order, or None past either end"""
+        if self._positions is None:
+            self._order = list(self.students)
+            self._positions = {sid: position for position, sid in enumerate(self._order)}
+        try:
+            position = self._positions.get(normalise_student_id(student_id))
+        except ValueError:
+            return None
+        if position is None or not 0 <= position + offset < len(self._order):
+            return None
+        return self._order[position + offset]
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def summary(self):
+        return (f"{self.rows_read} rows read, {len(self.students)} students imported, "
+                f"{self.duplicates} duplicates dropped, {len(self.errors)} row errors")
+
+
+def import_roster(path, chunk_size=DEFAULT_CHUNK_SIZE, max_errors=1000):
+    """Stream, validate, normalise and deduplicate a roster file into a Roster.
+
+    Time is linear in the number of rows and only one chunk of raw rows is
+    held in memory at a time. Row-level problems are collected in
+    ``roster.errors`` (capped at ``max_errors``) rather than aborting the import.
+    """
+    roster = Roster(source=path)
+    column_positions = None
+    # Course/Mode/Module/Supervisor repeat across thousands of rows; every
+    # record shares one string object per distinct value
+    categories = {}
+
+    for header, chunk in iter_roster_chunks(path, chunk_size):
+        if column_positions is None:
+            missing = [column for column in REQUIRED_COLUMNS if column not in header]
+            if missing:
+                raise ValueError(f"Roster '{path}' is missing required columns: {', '.join(missing)}")
+            # First occurrence wins if a column name is repeated
+            column_positions = {}
+            for position, column in enumerate(header):
+                if column and column not in column_positions:
+                    column_positions[column] = position
+            roster.columns = list(column_positions)
+
+        for row_number, values in chunk:
+            roster.rows_read += 1
+            if all(normalise_cell(value) == "" for value in values):
+                continue  # Blank spreadsheet rows are not errors
+
+            def cell(column):
+                position = column_positions[column]
+                return values[position] if position < len(values) else None
+
+            try:
+                student_id = normalise_student_id(cell("Student_ID"))
+            except ValueError as e:
+                if len(roster.errors) < max_errors:
+                    roster.add_error(row_number, str(e))
+                continue
+
+            values = {column: normalise_cell(cell(column)) for column in column_positions}
+            values["Student_ID"] = student_id
+            record = StudentRecord.from_mapping(values, categories)
+
+            existing = roster.students.get(student_id)
+            if existing is not None:
+                roster.duplicates += 1
+                if len(roster.errors) < max_errors:
+                    if existing == record:
+                        roster.add_error(row_number, f"Duplicate row for Student_ID {student_id} ignored")
+                    else:
+                        roster.add_error(row_number, f"Conflicting duplicate for Student_ID {student_id} ignored, first row kept")
+                continue
+
+            missing_fields = [column for column in ("Name", "Surname") if not record[column]]
+            if missing_fields and len(roster.errors) < max_errors:
+                roster.add_error(row_number, f"Student_ID {student_id} has no {' or '.join(missing_fields)}")
+
+            roster.students[student_id] = record
+
+    return roster
+
+
+# Shared roster snapshots
+#
+# Every worker process used to import the workbook itself and keep its own
+# copy of the roster. Instead, the first process that needs a roster for a
+# given version of the source file (identified by its mtime and size)
+# imports it once and writes a compact, read-only snapshot file; every
+# process then memory-maps that file, so the operating system keeps a single
+# copy of the pages for all workers. When the source changes, a new snapshot
+# (a new generation) is built under a lock and each process swaps its
+# reference to it atomically on its next lookup.
+#
+# Snapshot layout (native byte order, all offsets in bytes):
+#   magic | header | metadata JSON | string offsets | records | ID index | strings
+# Every cell is an index into one deduplicated string table, so repeated
+# values (course, mode, module, supervisor) are stored once.
+
+SNAPSHOT_DIR = os.environ.get(
+    "ASSESSMENT_ROSTER_CACHE", os.path.join(tempfile.gettempdir(), "assessment_roster")
+)
+
+_SNAPSHOT_MAGIC = b"ROSTER01"
+_SNAPSHOT_HEADER = struct.Struct("=8sIIII")  # magic, records, columns, strings, metadata length
+
+
+def _align(offset, size=4):
+    return (offset + size - 1) // size * size
+
+
+def write_roster_snapshot(roster, path):
+    """Serialise a Roster into a snapshot file (written atomically)"""
+    strings = {}
+
+    def intern(value):
+        index = strings.get(value)
+        if index is None:
+            index = strings[value] = len(strings)
+        return index
+
+    columns = list(roster.columns)
+    records = array("I")
+    for record in roster.students.values():
+        records.extend(intern(record.get(column, "")) for column in columns)
+
+    encoded = [value.encode("utf-8") for value in strings]
+    offsets = array("I", [0])
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+
+    id_column = columns.index("Student_ID")
+    # Sorted by UTF-8 bytes, which is also how lookups compare them
+    id_index = array("I", sorted(
+        range(len(roster.students)),
+        key=lambda position: encoded[records[position * len(columns) + id_column]],
+    ))
+
+    metadata = json.dumps({
+        "source": roster.source,
+        "columns": columns,
+        "rows_read": roster.rows_read,
+        "duplicates": roster.duplicates,
+        "errors": roster.errors,
+    }).encode("utf-8")
+
+    header = _SNAPSHOT_HEADER.pack(_SNAPSHOT_MAGIC, len(roster.students), len(columns), len(encoded), len(metadata))
+    padding = b"\0" * (_align(len(header) + len(metadata)) - len(header) - len(metadata))
+    payload = b"".join([
+        header, metadata, padding,
+        offsets.tobytes(), records.tobytes(), id_index.tobytes(), b"".join(encoded),
+    ])
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    atomic_write_bytes(path, payload)
+
+
+class _SnapshotRecords(Mapping):
+    """Read-only ``students`` mapping decoded on demand from a snapshot"""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def __getitem__(self, student_id):
+        position = self._snapshot._find(student_id)
+        if position is None:
+            raise KeyError(student_id)
+        return self._snapshot._record(position)
+
+    def __iter__(self):
+        snapshot = self._snapshot
+        return (snapshot._cell(position, snapshot._id_column) for position in range(len(snapshot)))
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def values(self):
+        snapshot = self._snapshot
+        return (snapshot._record(position) for position in range(len(snapshot)))
+
+
+class SharedRoster:
+    """A roster served from a memory-mapped snapshot, with the Roster read API"""
+
+    def __init__(self, path):
+        with open(path, "rb") as snapshot_file:
+            self._mmap = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.snapshot_path = path
+        view = memoryview(self._mmap)
+
+        magic, records, columns, strings, metadata_length = _SNAPSHOT_HEADER.unpack_from(view)
+        if magic != _SNAPSHOT_MAGIC:
+            raise ValueError(f"'{path}' is not a roster snapshot")
+        offset = _SNAPSHOT_HEADER.size
+        metadata = json.loads(bytes(view[offset:offset + metadata_length]))
+        offset = _align(offset + metadata_length)
+
+        def section(count):
+            nonlocal offset
+            start, offset = offset, offset + count * 4
+            return view[start:offset].cast("I")
+
+        # Zero-copy typed views over the mapped file
+        self._offsets = section(strings + 1)
+        self._records = section(records * columns)
+        self._id_index = section(records)
+        self._strings = view[offset:]
+
+        self._count = records
+        self._width = columns
+        self.source = metadata["source"]
+        self.columns = metadata["columns"]
+        self.rows_read = metadata["rows_read"]
+        self.duplicates = metadata["duplicates"]
+        self.errors = [tuple(error) for error in metadata["errors"]]
+        self._id_column = self.columns.index("Student_ID")
+        self.students = _SnapshotRecords(self)
+        self._categories = {}
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, student_id):
+        return self.get(student_id) is not None
+
+    def _string_bytes(self, index):
+        return self._strings[self._offsets[index]:self._offsets[index + 1]]
+
+    def _cell(self, position, column):
+        return str(self._string_bytes(self._records[position * self._width + column]), "utf-8")
+
+    def _record(self, position):
+        values = {column: self._cell(position, number) for number, column in enumerate(self.columns)}
+        return StudentRecord.from_mapping(values, self._categories)
+
+    def _find(self, student_id):
+        """Record position of a student (binary search over the ID index), or None"""
+        try:
+            key = normalise_student_id(student_id).encode("utf-8")
+        except ValueError:
+            return None
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            position = self._id_index[middle]
+            candidate = bytes(self._string_bytes(self._records[position * self._width + self._id_column]))
+            if candidate < key:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self._count:
+            position = self._id_index[low]
+            if self._string_bytes(self._records[position * self._width + self._id_column]) == key:
+                return position
+        return None
+
+    def get(self, student_id):
+        """Record of a student (a StudentRecord, indexable by column name) or None"""
+        position = self._find(student_id)
+        return None if position is None else self._record(position)
+
+    def student_ids(self):
+        """Student IDs in roster order"""
+        return list(self.students)
+
+    def rows(self):
+        """(student ID, tuple of raw UTF-8 cells in ``columns`` order) for every student.
+
+        Cheaper than decoding records, for comparing whole rosters.
+        """
+        # Every distinct string is sliced once; rows are then tuples of shared objects
+        offsets = self._offsets.tolist()
+        strings = bytes(self._strings)
+        table = [strings[start:end] for start, end in zip(offsets, offsets[1:])]
+        records, width, id_column = self._records.tolist(), self._width, self._id_column
+        for base in range(0, self._count * width, width):
+            cells = tuple(map(table.__getitem__, records[base:base + width]))
+            yield cells[id_column].decode("utf-8"), cells
+
+    def neighbour(self, student_id, offset):
+        """Student ID ``offset`` places away in roster order, or None past either end"""
+        position = self._find(student_id)
+        if position is None or not 0 <= position + offset < self._count:
+            return None
+        return self._cell(position + offset, self._id_column)
+
+    def summary(self):
+        return (f"{self.rows_read} rows read, {len(self)} students imported, "
+                f"{self.duplicates} duplicates dropped, {len(self.errors)} row errors")
+
+
+def _snapshot_path(absolute_path, signature, suffix=".roster"):
+    name = hashlib.sha256(absolute_path.encode("utf-8")).hexdigest()[:16]
+    return os.path.join(SNAPSHOT_DIR, f"{name}.{signature[0]}_{signature[1]}{suffix}")
+
+
+def _find_snapshot(absolute_path, signature):
+    """Snapshot of the file as it is at ``signature`` - its own, or the one it is an alias of - or None"""
+    snapshot_path = _snapshot_path(absolute_path, signature)
+    if os.path.exists(snapshot_path):
+        return snapshot_path
+    try:
+        with open(_snapshot_path(absolute_path, signature, ".alias"), "r", encoding="utf-8") as alias_file:
+            snapshot_path = os.path.join(SNAPSHOT_DIR, alias_file.read().strip())
+    except OSError:
+        return None
+    return snapshot_path if os.path.exists(snapshot_path) else None
+
+
+def _remove_old_generations(current_path, suffixes=(".roster", ".alias")):
+    """Delete superseded snapshots and aliases of the same source (mapped copies stay valid on POSIX)"""
+    prefix = os.path.basename(current_path).split(".", 1)[0] + "."
+    for name in os.listdir(SNAPSHOT_DIR):
+        if name.startswith(prefix) and name.endswith(suffixes) and name != os.path.basename(current_path):
+            try:
+                os.remove(os.path.join(SNAPSHOT_DIR, name))
+            except OSError:
+                pass
+
+
+def roster_signature(path):
+    """(mtime, size) of a roster file, which names its snapshot"""
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def keep_snapshot(path, previous_signature):
+    """Keep serving the imported roster after a write that changed only marks and comments.
+
+    ``update_student_record`` rewrites the workbook on every save, but only
+    its Marks and Comments columns, which readers take from the store
+    (``record_marks``) rather than the roster. Instead of a re-import, a
+    new snapshot and a diff in every worker, the file's new signature is
+    made an alias of the snapshot of ``previous_signature``. Call it with
+    the workbook's lock still held; if that snapshot no longer exists the
+    next ``get_roster`` simply imports the file.
+    """
+    absolute_path = os.path.abspath(path)
+    snapshot_path = _find_snapshot(absolute_path, previous_signature)
+    if snapshot_path is None:
+        return
+    alias_path = _snapshot_path(absolute_path, roster_signature(absolute_path), ".alias")
+    atomic_write_bytes(alias_path, os.path.basename(snapshot_path).encode("utf-8"))
+    # Only the file's current signature needs an alias
+    _remove_old_generations(alias_path, suffixes=(".alias",))
+
+
+# Attached snapshots keyed by absolute source path, swapped when the file changes
+_roster_cache = {}
+
+
+def get_roster(path="student_records.xlsx"):
+    """Shared roster for a file, rebuilt (by one process) only when its roster columns change"""
+    absolute_path = os.path.abspath(path)
+    signature = roster_signature(absolute_path)
+
+    cached = _roster_cache.get(absolute_path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    snapshot_path = _find_snapshot(absolute_path, signature)
+    if cached is not None and snapshot_path == cached[1].snapshot_path:
+        # Only marks were written (see keep_snapshot): still the same roster
+        _roster_cache[absolute_path] = (signature, cached[1])
+        return cached[1]
+    if snapshot_path is None:
+        snapshot_path = _snapshot_path(absolute_path, signature)
+        os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+        # One process imports the workbook, the others wait and attach to its snapshot
+        with file_lock(os.path.join(SNAPSHOT_DIR, os.path.basename(snapshot_path).split(".", 1)[0]), timeout=120.0):
+            if not os.path.exists(snapshot_path):
+                roster = import_roster(absolute_path)
+                print(f"Imported roster '{path}': {roster.summary()}")
+                for row_number, message in roster.errors[:20]:
+                    print(f"  Row {row_number}: {message}")
+                write_roster_snapshot(roster, snapshot_path)
+                _remove_old_generations(snapshot_path)
+
+    roster = SharedRoster(snapshot_path)
+    # Replacing the cache entry is the atomic swap; readers holding the old
+    # generation keep a valid mapping until they drop it
+    _roster_cache[absolute_path] = (signature, roster)
+    return roster
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("Usage: python roster.py <roster.csv|roster.xlsx>")
+        sys.exit(2)
+    imported = import_roster(sys.argv[1])
+    print(imported.summary())
+    for error_row, error_message in imported.errors:
+        print(f"Row {error_row}: {error_message}")
+    sys.exit(1 if imported.errors else 0)
@@ -0,0 +1,189 @@
+"""Live roster updates.
+
+``RosterWatcher`` watches the roster workbook from a background thread -
+with inotify (through ``watchfiles``) where available, by polling its
+mtime and size otherwise. When the file changes it attaches the new shared
+roster, diffs it row by row against the previous one, warms the search
+index and hands the ``RosterChanges`` to every subscriber. Each dashboard
+session subscribes and forwards only the changed entries to its browser.
+
+    ASSESSMENT_ROSTER_WATCH=auto|poll|off   (default auto)
+"""
+import os
+import threading
+import time
+
+from roster import get_roster
+from search import get_search_index
+
+WATCH_MODE = os.environ.get("ASSESSMENT_ROSTER_WATCH", "auto")
+
+# Seconds between mtime checks when polling
+POLL_INTERVAL = 2.0
+# Quiet time before a burst of file events is handled (Excel saves in several writes)
+DEBOUNCE_MS = 500
+
+
+class RosterChanges:
+    """Difference between two rosters, keyed by student ID"""
+
+    def __init__(self, added=None, changed=None, removed=None):
+        self.added = added or {}      # student_id -> new record
+        self.changed = changed or {}  # student_id -> (old record, new record)
+        self.removed = removed or []  # student IDs no longer in the roster
+
+    def __bool__(self):
+        return bool(self.added or self.changed or self.removed)
+
+    def changed_columns(self, student_id):
+        """Columns whose value differs between the old and new record of a student"""
+        old, new = self.changed[student_id]
+        old_values, new_values = old.to_dict(), new.to_dict()
+        return {column for column in old_values.keys() | new_values.keys()
+                if old_values.get(column, "") != new_values.get(column, "")}
+
+    def summary(self):
+        return f"{len(self.added)} added, {len(self.changed)} changed, {len(self.removed)} removed"
+
+
+def diff_rosters(old, new):
+    """Rows added, changed or removed between two rosters (linear in roster size).
+
+    Rows are compared as raw cells; only the rows that differ are decoded
+    into records.
+    """
+    changes = RosterChanges()
+    if old.columns != new.columns:
+        # A column was added, removed or moved: compare decoded records instead
+        old_rows = dict(zip(old.students, old.students.values()))
+        new_rows = zip(new.students, new.students.values())
+    else:
+        old_rows = dict(old.rows())
+        new_rows = new.rows()
+    for student_id, row in new_rows:
+        previous = old_rows.pop(student_id, None)
+        if previous is None:
+            changes.added[student_id] = new.get(student_id)
+        elif previous != row:
+            changes.changed[student_id] = (old.get(student_id), new.get(student_id))
+    changes.removed = list(old_rows)
+    return changes
+
+
+class RosterWatcher:
+    """Background thread that reloads the roster when its file changes"""
+
+    def __init__(self, path, mode=WATCH_MODE, poll_interval=POLL_INTERVAL):
+        self.path = os.path.abspath(path)
+        self.mode = mode
+        self.poll_interval = poll_interval
+        self.roster = None
+        self._subscribers = []
+        self._subscribers_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback):
+        """Call ``callback(changes, roster)`` from the watcher thread on every change.
+
+        Returns a function that removes the subscription.
+        """
+        with self._subscribers_lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe():
+            with self._subscribers_lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+        return unsubscribe
+
+    def start(self):
+        if self.mode == "off" or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="roster-watcher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        try:
+            self.roster = get_roster(self.path)
+        except Exception as e:
+            print(f"Roster watcher could not load '{self.path}': {e}")
+        if self.mode == "auto":
+            try:
+                import watchfiles
+            except ImportError:
+                watchfiles = None
+            if watchfiles is not None:
+                print(f"Watching roster '{self.path}' for changes (inotify)")
+                # Atomic saves replace the file, so watch its directory and filter by name
+                for _ in watchfiles.watch(
+                    os.path.dirname(self.path),
+                    watch_filter=lambda change, path: os.path.abspath(path) == self.path,
+                    debounce=DEBOUNCE_MS, recursive=False, stop_event=self._stop,
+                ):
+                    self.reload()
+                return
+        print(f"Watching roster '{self.path}' for changes (polling every {self.poll_interval:g}s)")
+        signature = self._signature()
+        while not self._stop.wait(self.poll_interval):
+            current = self._signature()
+            if current != signature:
+                signature = current
+                self.reload()
+
+    def _signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def reload(self):
+        """Attach the current roster and notify subscribers of any differences"""
+        if not os.path.exists(self.path):
+            return None  # Mid-replace; the next event brings the new file
+        started = time.perf_counter()
+        try:
+            roster = get_roster(self.path)
+        except Exception as e:
+            # A half-written file - keep serving the previous roster until the next change
+            print(f"Roster reload failed, keeping the previous roster: {e}")
+            return None
+        if roster is self.roster:
+            return None
+
+        previous, self.roster = self.roster, roster
+        changes = diff_rosters(previous, roster) if previous is not None else RosterChanges(added=dict(roster.students))
+        # Build the new search index here rather than on the next search request
+        get_search_index(roster)
+        print(f"Roster reloaded in {time.perf_counter() - started:.2f}s: {changes.summary()}")
+        if not changes:
+            return changes
+
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(changes, roster)
+            except Exception as e:
+                print(f"Error delivering roster changes: {e}")
+        return changes
+
+
+# One watcher per roster file in each process
+_watchers = {}
+_watchers_lock = threading.Lock()
+
+
+def get_roster_watcher(path="student_records.xlsx"):
+    """The process-wide watcher of a roster file (started by the app's lifespan)"""
+    absolute_path = os.path.abspath(path)
+    with _watchers_lock:
+        watcher = _watchers.get(absolute_path)
+        if watcher is None:
+            watcher = _watchers[absolute_path] = RosterWatcher(absolute_path)
+        return watcher
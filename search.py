@@ -0,0 +1,198 @@
+"""Fuzzy student search over the roster.
+
+``StudentSearchIndex`` indexes every student's ID, name, surname and
+module twice: a sorted token list for prefix matches (bisect) and a
+trigram posting list for typo-tolerant matches. A query only touches the
+postings of its own tokens and trigrams, never the whole roster, so the
+top-k results come back in milliseconds even for large cohorts.
+"""
+import bisect
+import heapq
+import re
+from collections import Counter
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# Number of rarest query trigrams used to generate fuzzy candidates
+_TRIGRAM_PROBES = 8
+# Above this many matching tokens a prefix scan walks the roster instead of merging postings
+_MAX_MERGED_POSTINGS = 256
+# Restrictions (e.g. one per assessor and allocation) cached per index
+_MAX_RESTRICTIONS = 256
+_TOKEN_SPLIT = re.compile(r"[^0-9a-z]+")
+
+
+def _normalise(text):
+    return str(text or "").strip().lower()
+
+
+def _tokens(text):
+    return [token for token in _TOKEN_SPLIT.split(_normalise(text)) if token]
+
+
+def _trigrams(text):
+    padded = f"  {_normalise(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class StudentSearchIndex:
+    """Prefix and trigram index over the searchable roster fields"""
+
+    SEARCH_FIELDS = ("Student_ID", "Name", "Surname", "Module")
+
+    def __init__(self, roster):
+        self.entries = []         # (student_id, label) in roster order
+        self._entry_tokens = []   # tokens of each entry
+        self._postings = {}       # token -> ascending entry indices
+        self._trigrams = {}       # trigram -> ascending entry indices
+        self._id_lookup = {}
+        self._restrictions = {}   # key -> frozenset of entry indices, or None
+
+        for record in roster.students.values():
+            index = len(self.entries)
+            student_id = record["Student_ID"]
+            label = f"{student_id} - {record.get('Name', '')} {record.get('Surname', '')}".strip()
+            if record.get("Module"):
+                label += f" ({record['Module']})"
+            text = " ".join(str(record.get(field, "")) for field in self.SEARCH_FIELDS)
+            tokens = tuple(dict.fromkeys(_tokens(text)))
+
+            self.entries.append((student_id, label))
+            self._entry_tokens.append(tokens)
+            self._id_lookup[_normalise(student_id)] = index
+            for token in tokens:
+                self._postings.setdefault(token, []).append(index)
+            for trigram in _trigrams(" ".join(tokens)):
+                self._trigrams.setdefault(trigram, []).append(index)
+
+        self._sorted_tokens = sorted(self._postings)
+        # Trigrams shared by a large share of the roster say little about a match
+        self._common_trigram_size = max(1, len(self.entries) // 4)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _tokens_with_prefix(self, prefix):
+        """Indexed tokens starting with ``prefix`` (bisect over the sorted tokens)"""
+        start = bisect.bisect_left(self._sorted_tokens, prefix)
+        end = bisect.bisect_left(self._sorted_tokens, prefix + "\uffff", lo=start)
+        return self._sorted_tokens[start:end]
+
+    def _prefix_matches(self, query_tokens, limit, seen, allowed=None):
+        """First ``limit`` entries (roster order) where every query token prefixes an entry token"""
+        if limit <= 0:
+            return []
+        # Drive the scan with the most selective (longest) query token
+        driver = max(query_tokens, key=len)
+        others = [token for token in query_tokens if token != driver]
+        driver_tokens = self._tokens_with_prefix(driver)
+        if allowed is not None and len(allowed) <= _MAX_MERGED_POSTINGS:
+            # A small allowed set is quicker to walk than the postings
+            candidates = sorted(allowed)
+            others = query_tokens
+        elif len(driver_tokens) > _MAX_MERGED_POSTINGS:
+            # Very short prefixes match most of the roster, so walking it in order
+            # finds the first ``limit`` matches sooner than merging the postings
+            candidates = range(len(self.entries))
+            others = query_tokens
+        else:
+            candidates = heapq.merge(*(self._postings[token] for token in driver_tokens))
+
+        matches = []
+        previous = None
+        for index in candidates:
+            if index == previous or index in seen or (allowed is not None and index not in allowed):
+                continue
+            previous = index
+            entry_tokens = self._entry_tokens[index]
+            if all(any(token.startswith(other) for token in entry_tokens) for other in others):
+                matches.append(index)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def _fuzzy_matches(self, query_tokens, limit, seen, allowed=None):
+        """Best ``limit`` entries by shared trigrams with the query"""
+        query_trigrams = _trigrams(" ".join(query_tokens))
+        known = [trigram for trigram in query_trigrams if trigram in self._trigrams]
+        selective = [trigram for trigram in known if len(self._trigrams[trigram]) <= self._common_trigram_size]
+        probes = sorted(selective or known, key=lambda trigram: len(self._trigrams[trigram]))[:_TRIGRAM_PROBES]
+        if not probes:
+            return []
+
+        hits = Counter()
+        for trigram in probes:
+            hits.update(self._trigrams[trigram])
+        threshold = max(1, len(probes) // 2)
+        candidates = ((count, -index) for index, count in hits.items()
+                      if count >= threshold and index not in seen and (allowed is None or index in allowed))
+        return [-negated for _, negated in heapq.nlargest(limit, candidates)]
+
+    def restrict(self, student_ids):
+        """Entry indices of ``student_ids``, to pass to ``search`` as ``allowed``"""
+        return frozenset(self._id_lookup[key] for key in map(_normalise, student_ids) if key in self._id_lookup)
+
+    def restriction(self, key, load_student_ids):
+        """``restrict`` of the IDs ``load_student_ids()`` returns, computed once per ``key``
+
+        ``key`` must change whenever those IDs do (e.g. include the
+        allocation version). When the loader returns None, so does this,
+        meaning no restriction.
+        """
+        if key not in self._restrictions:
+            if len(self._restrictions) >= _MAX_RESTRICTIONS:
+                self._restrictions.clear()
+            student_ids = load_student_ids()
+            self._restrictions[key] = None if student_ids is None else self.restrict(student_ids)
+        return self._restrictions[key]
+
+    def search(self, query, limit=DEFAULT_LIMIT, allowed=None):
+        """Top ``limit`` matches as [{"value": id, "label": text}, ...]
+
+        Exact ID matches come first, then prefix matches in roster order,
+        then fuzzy (trigram) matches by similarity. ``allowed`` (from
+        ``restrict`` or ``restriction``) limits the results to those
+        students, e.g. an assessor's allocation.
+        """
+        limit = max(1, min(int(limit), MAX_LIMIT))
+        query_tokens = _tokens(query)
+        if not query_tokens:
+            indices = range(len(self.entries)) if allowed is None else sorted(allowed)
+            return [self._result(index) for index in indices[:limit]]
+
+        ranked = []
+        exact = self._id_lookup.get(_normalise(query))
+        if exact is not None and (allowed is None or exact in allowed):
+            ranked.append(exact)
+
+        seen = set(ranked)
+        ranked.extend(self._prefix_matches(query_tokens, limit - len(ranked), seen, allowed))
+        if len(ranked) < limit:
+            seen.update(ranked)
+            ranked.extend(self._fuzzy_matches(query_tokens, limit - len(ranked), seen, allowed))
+
+        return [self._result(index) for index in ranked[:limit]]
+
+    def option_for(self, student_id):
+        """Selector option of one student, as returned by ``search``, or None"""
+        index = self._id_lookup.get(_normalise(student_id))
+        return None if index is None else self._result(index)
+
+    def _result(self, index):
+        student_id, label = self.entries[index]
+        return {"value": student_id, "label": label}
+
+
+# Search index of the most recently used roster
+_index_cache = {}
+
+
+def get_search_index(roster):
+    """Search index for a roster, rebuilt only when the roster object changes"""
+    cached = _index_cache.get(roster.source)
+    if cached is not None and cached[0] is roster:
+        return cached[1]
+    index = StudentSearchIndex(roster)
+    _index_cache[roster.source] = (roster, index)
+    return index
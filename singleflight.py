@@ -0,0 +1,105 @@
+"""Single-flight execution with idempotency keys.
+
+Report generation renders a PDF and rewrites the workbook, so running it
+twice for the same request (a double click, two tabs on one student, a
+retry after a timeout) wastes work and writes twice. ``SingleFlight.run``
+makes every call with the same key share one execution:
+
+* calls that overlap wait for the one in flight (per-key thread lock in
+  this process, per-key lock file across workers) and then reuse its result
+* a retry that arrives shortly after (within ``RESULT_TTL``) finds the
+  stored result and returns it directly
+
+Keys come from ``request_key`` - a hash of the request content - so a
+changed mark or comment is a new request and is processed normally. The
+same content submitted again later (marks 55, then 72, then 55 again) is
+a new submission, not a retry: stored results expire after ``RESULT_TTL``,
+and callers pass ``is_valid`` to reject a result that has since been
+superseded. Expired results are pruned from the store.
+"""
+import hashlib
+import json
+import threading
+import time
+
+# Seconds a completed result is replayed to retries of the same request
+RESULT_TTL = 600.0
+# Minimum seconds between two prunes of expired results by one process
+PRUNE_INTERVAL = 600.0
+
+
+def request_key(*parts):
+    """Stable idempotency key for the content of a request"""
+    payload = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """Coalesce identical requests onto one execution, in and across processes"""
+
+    def __init__(self, store, ttl=RESULT_TTL):
+        self.store = store
+        self.ttl = ttl
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._last_prune = 0.0
+
+    def _acquire_local(self, key):
+        with self._locks_guard:
+            entry = self._locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        entry[0].acquire()
+        return entry
+
+    def _release_local(self, key, entry):
+        entry[0].release()
+        with self._locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(key, None)
+
+    def run(self, key, func, is_valid=None):
+        """Run ``func`` once for ``key`` and return (result, reused).
+
+        ``func`` must return a dict with an ``ok`` flag; only successful
+        results are remembered (for ``ttl`` seconds), so failures can be
+        retried. ``is_valid`` can reject a remembered result (e.g. its
+        report was deleted or superseded).
+        """
+        entry = self._acquire_local(key)
+        try:
+            with self.store.lock(f"singleflight_{key}"):
+                existing = self.store.get_idempotent(key, max_age=self.ttl)
+                if existing is not None and (is_valid is None or is_valid(existing)):
+                    return existing, True
+                result = func()
+                if result.get("ok"):
+                    self.store.put_idempotent(key, result)
+        finally:
+            self._release_local(key, entry)
+        self._maybe_prune()
+        return result, False
+
+    def _maybe_prune(self):
+        """Delete expired results, at most every ``PRUNE_INTERVAL`` seconds"""
+        now = time.monotonic()
+        with self._locks_guard:
+            if now - self._last_prune < PRUNE_INTERVAL:
+                return
+            self._last_prune = now
+        try:
+            self.store.prune_idempotent(self.ttl)
+        except Exception as e:
+            print(f"Pruning idempotency records failed: {e}")
+
+
+_single_flight = None
+
+
+def get_single_flight():
+    """Process-wide single-flight guard on the shared store"""
+    global _single_flight
+    if _single_flight is None:
+        from storage import get_store
+        _single_flight = SingleFlight(get_store())
+    return _single_flight
@@ -0,0 +1,42 @@
+// Comment block: live word counter and required/optional switching, all in the browser
+(function() {
+    var state = {complete: false, required: false, min_words: $('#comment_block').data('min-words')};
+
+    function countWords(text) {
+        var trimmed = $.trim(text || '');
+        return trimmed ? trimmed.split(/\s+/).length : 0;
+    }
+
+    function updateCounter() {
+        var words = countWords($('#assessor_comments').val());
+        var $counter = $('#comment_word_counter');
+        if (state.required) {
+            $counter.text(words + ' / ' + state.min_words + ' words');
+        } else {
+            $counter.text(words + (words === 1 ? ' word' : ' words'));
+        }
+        var tooShort = state.required && words < state.min_words;
+        $counter.toggleClass('too-short', tooShort);
+        $('#comment_warning_text').text('Comments must be at least ' + state.min_words +
+            ' words (currently ' + words + ' words).');
+        $('#comment_warning').toggle(tooShort);
+    }
+
+    function refresh() {
+        $('#comment_block').toggle(state.complete);
+        $('#comment_required_notice').toggle(state.required);
+        $('#comment_min_words').text(state.min_words);
+        $('#comment_optional_toggle').toggle(!state.required);
+        $('#comment_editor').toggle(state.required || $('#show_comments').prop('checked'));
+        updateCounter();
+    }
+
+    $(document).on('input change', '#assessor_comments', updateCounter);
+    $(document).on('change', '#show_comments', refresh);
+    $(document).on('assessment:preview', function(event, preview) {
+        if (preview.complete === state.complete && preview.required === state.required &&
+                preview.min_words === state.min_words) return;
+        state = {complete: preview.complete, required: preview.required, min_words: preview.min_words};
+        refresh();
+    });
+})();
@@ -0,0 +1,115 @@
+// Comment autocomplete: suggests snippets from the feedback bank for the
+// sentence being typed, filtered by the module and the bands of the grades
+(function() {
+    var DEBOUNCE_MS = 120;
+    var grades = {band: '', criterion_bands: {}};
+    var suggestions = [];
+    var active = -1;
+    var timer = null;
+    var request = null;
+
+    function $list() {
+        return $('#feedback_suggestions');
+    }
+
+    // The unfinished sentence before the caret, and where it starts
+    function currentFragment(textarea) {
+        var before = textarea.value.slice(0, textarea.selectionStart);
+        var start = Math.max(before.lastIndexOf('.'), before.lastIndexOf('!'),
+            before.lastIndexOf('?'), before.lastIndexOf('\n')) + 1;
+        while (start < before.length && /\s/.test(before.charAt(start))) start++;
+        return {start: start, text: before.slice(start)};
+    }
+
+    function close() {
+        suggestions = [];
+        active = -1;
+        $list().hide().empty();
+    }
+
+    function highlight(index) {
+        active = index;
+        $list().children().removeClass('active').eq(index).addClass('active');
+    }
+
+    function render() {
+        var $ul = $list().empty();
+        if (!suggestions.length) {
+            $ul.hide();
+            return;
+        }
+        $.each(suggestions, function(index, suggestion) {
+            var $item = $('<li role="option">').text(suggestion.text).data('index', index);
+            var tag = [suggestion.criterion, suggestion.band].filter(Boolean).join(', ').replace(/_/g, ' ');
+            if (tag) $item.append($('<span class="suggestion-tag">').text(tag));
+            $ul.append($item);
+        });
+        $ul.show();
+        highlight(0);
+    }
+
+    function fetchSuggestions() {
+        var textarea = document.getElementById('assessor_comments');
+        var fragment = currentFragment(textarea);
+        // Wait for a couple of letters; a fresh sentence gets no popup
+        if (fragment.text.replace(/\s/g, '').length < 2) {
+            close();
+            return;
+        }
+        var params = {q: fragment.text, module: $('#module_name').val() || '', band: grades.band};
+        $.each(grades.criterion_bands, function(criterion, band) {
+            params[criterion + '_band'] = band;
+        });
+        if (request) request.abort();
+        request = $.getJSON('api/feedback/suggest', params).done(function(data) {
+            suggestions = data.suggestions;
+            render();
+        }).fail(close);
+    }
+
+    function accept(index) {
+        var textarea = document.getElementById('assessor_comments');
+        var suggestion = suggestions[index];
+        if (!suggestion) return;
+        var fragment = currentFragment(textarea);
+        var caret = textarea.selectionStart;
+        var text = suggestion.text + ' ';
+        textarea.value = textarea.value.slice(0, fragment.start) + text + textarea.value.slice(caret);
+        textarea.selectionStart = textarea.selectionEnd = fragment.start + text.length;
+        close();
+        // Keep the word counter in step with the inserted text
+        $(textarea).trigger('input');
+    }
+
+    $(document).on('input', '#assessor_comments', function(event) {
+        if (event.isTrigger) return;
+        clearTimeout(timer);
+        timer = setTimeout(fetchSuggestions, DEBOUNCE_MS);
+    });
+
+    $(document).on('keydown', '#assessor_comments', function(event) {
+        if (!suggestions.length) return;
+        if (event.key === 'ArrowDown' || event.key === 'ArrowUp') {
+            var step = event.key === 'ArrowDown' ? 1 : -1;
+            highlight((active + step + suggestions.length) % suggestions.length);
+        } else if (event.key === 'Enter' || event.key === 'Tab') {
+            accept(active);
+        } else if (event.key === 'Escape') {
+            close();
+        } else {
+            return;
+        }
+        event.preventDefault();
+    });
+
+    // mousedown rather than click, so the textarea keeps its focus (and does not send its value early)
+    $(document).on('mousedown', '#feedback_suggestions li', function(event) {
+        event.preventDefault();
+        accept($(this).data('index'));
+    });
+    $(document).on('blur', '#assessor_comments', close);
+
+    $(document).on('assessment:preview', function(event, preview) {
+        grades = {band: preview.band, criterion_bands: preview.criterion_bands};
+    });
+})();
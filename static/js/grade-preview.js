@@ -0,0 +1,82 @@
+// Live final grade preview from the slider positions (see grade_preview in final_code.py)
+(function() {
+    var scheme = $('#calculated_grade').data('scheme');
+    var complete = false;
+    var pending = false;
+
+    function criterionScore(criterion) {
+        var $slider = $('#' + criterion + '_score');
+        var slider = $slider.data('ionRangeSlider');
+        if (slider) return slider.result.from;
+        var value = parseFloat($slider.val());
+        return isNaN(value) ? 50 : value;  // Same default as the server
+    }
+
+    // Match Python's round(x, 1), which rounds exact halves to even
+    function roundGrade(weightedSum) {
+        if (Number.isInteger(weightedSum) && (weightedSum % 100 === 25 || weightedSum % 100 === 75)) {
+            var tenths = Math.floor(weightedSum / 10);
+            return (tenths % 2 ? tenths + 1 : tenths) / 10;
+        }
+        return Number((weightedSum / 100).toFixed(1));
+    }
+
+    function bandFor(grade) {
+        var index = Math.min(Math.max(Math.trunc(grade), 0), 100);
+        for (var i = 0; i < scheme.bands.length; i++) {
+            if (scheme.bands[i].min <= index && index <= scheme.bands[i].max) return scheme.bands[i];
+        }
+        return scheme.bands[scheme.bands.length - 1];
+    }
+
+    function update() {
+        pending = false;
+        var weightedSum = 0;
+        var criterionBands = {};
+        $.each(scheme.weights, function(criterion, weight) {
+            var score = criterionScore(criterion);
+            weightedSum += score * weight;
+            criterionBands[criterion] = bandFor(score).grade;
+        });
+        var grade = roundGrade(weightedSum);
+        var band = bandFor(grade);
+        // On the unrounded grade, like GradingScheme.comment_required: 69.1 needs feedback like 70
+        var required = scheme.comment_required_grades.indexOf(band.grade) >= 0 ||
+            scheme.comment_required_grades.indexOf(bandFor(Math.ceil(grade)).grade) >= 0;
+        $('#calculated_grade h3')
+            .css('color', band.color)
+            .text('Calculated Final Grade: ' + grade + '%');
+        $(document).trigger('assessment:preview', {
+            grade: grade,
+            band: band.grade,
+            criterion_bands: criterionBands,
+            complete: complete,
+            required: complete && required,
+            min_words: scheme.min_comment_words
+        });
+    }
+
+    // Coalesce bursts of slider events into one update per frame
+    function scheduleUpdate() {
+        if (pending) return;
+        pending = true;
+        window.requestAnimationFrame(update);
+    }
+
+    $(document).on('change', '.js-range-slider', scheduleUpdate);
+    $(document).on('shiny:bound shiny:unbound', '.js-range-slider', scheduleUpdate);
+    function setScheme(newScheme) {
+        scheme = newScheme;
+        scheduleUpdate();
+    }
+
+    Shiny.addCustomMessageHandler('grading_scheme', setScheme);
+    // Sent with the student's fields (see student-fields.js)
+    $(document).on('assessment:scheme', function(event, newScheme) {
+        setScheme(newScheme);
+    });
+    Shiny.addCustomMessageHandler('assessment_complete', function(message) {
+        complete = message.complete;
+        scheduleUpdate();
+    });
+})();
@@ -0,0 +1,52 @@
+// Grade selector behaviour, fully event driven: stray arrows and option
+// sizing are handled by the stylesheet, so nothing runs while the page is idle
+$(document).ready(function() {
+    function closeDropdown($container) {
+        $container.removeClass('hovering');
+        $container.find('select').attr('size', '1');
+    }
+
+    // Hover behavior with stability improvements
+    $(document).on('mouseenter', '.grade-select-container', function() {
+        var $this = $(this);
+
+        // First, close any other open dropdowns
+        closeDropdown($('.grade-select-container.hovering').not($this));
+
+        // Then open this one
+        $this.addClass('hovering');
+        $this.find('select').attr('size', '7');
+    });
+
+    // mouseleave only fires when the pointer leaves the container and the
+    // expanded select inside it, so no delayed re-check is needed
+    $(document).on('mouseleave', '.grade-select-container', function() {
+        closeDropdown($(this));
+    });
+
+    // Prevent scrolling of the page when scrolling an open dropdown
+    $(document).on('wheel', '.grade-select-container.hovering select', function(e) {
+        e.stopPropagation();
+    });
+
+    // Handle click outside to close all dropdowns
+    $(document).on('click', function(e) {
+        if (!$(e.target).closest('.grade-select-container').length) {
+            closeDropdown($('.grade-select-container.hovering'));
+        }
+    });
+
+    // Close as soon as a grade is picked to prevent shaking
+    $(document).on('change', '.grade-select-container select', function() {
+        closeDropdown($(this).closest('.grade-select-container'));
+        $(this).blur();
+    });
+
+    // Remove any stray text nodes next to the (static) grade selectors once
+    $('.grade-select-container').each(function() {
+        $(this).siblings().filter(function() {
+            return (this.nodeType === 3 && $.trim(this.nodeValue) !== '') || 
+                   (this.nodeType === 1 && !$(this).hasClass('form-control'));
+        }).remove();
+    });
+});
@@ -0,0 +1,100 @@
+// Feed the student selector from the server-side search index
+$(document).on('shiny:bound', '#student_id', function() {
+    var selectize = this.selectize;
+    if (!selectize) return;
+    selectize.settings.load = function(query, callback) {
+        var params = {q: query, limit: 20};
+        // Only the selected assessor's allocation, when they have one
+        if ($('#my_allocation').prop('checked')) params.assessor = $('#assessor_name').val();
+        $.getJSON('api/students/search', params)
+            .done(function(data) { callback(data.results); })
+            .fail(function() { callback(); });
+    };
+    // Results are already ranked by the server, keep them all
+    selectize.settings.score = function() {
+        return function() { return 1; };
+    };
+});
+
+// Student and module fields are filled from the roster, not typed in
+$(document).ready(function() {
+    // Make fields read-only after the page loads
+    $("#student_name").prop("readonly", true);
+    $("#student_surname").prop("readonly", true);
+    $("#student_course").prop("readonly", true);
+    $("#student_mode").prop("readonly", true);
+    $("#module_name").prop("readonly", true);
+    $("#report_title").prop("readonly", true);
+    $("#supervisor").prop("readonly", true);
+});
+
+// Write every value in a single pass so the browser repaints once, then let
+// the input bindings report them back in one batched update
+function fillStudentFields(values) {
+    $.each(values, function(id, value) {
+        var $input = $('#' + id);
+        if ($input.is(':checkbox')) {
+            $input.prop('checked', !!value);
+        } else {
+            $input.val(value);
+        }
+    });
+    $.each(values, function(id) {
+        $('#' + id).trigger('change');
+    });
+}
+
+function showStudentNotification(notification) {
+    Shiny.notifications.show({
+        html: $('<div>').text(notification.message).html(),
+        type: notification.type,
+        duration: notification.duration * 1000
+    });
+}
+
+// Fill the student fields (and any restored draft inputs) from one server message,
+// switching the grade preview and word counter to the student's grading scheme first
+Shiny.addCustomMessageHandler('populate_student', function(message) {
+    if (message.scheme) $(document).trigger('assessment:scheme', message.scheme);
+    fillStudentFields(message.values);
+    if (message.notification) showStudentNotification(message.notification);
+});
+
+// Live roster update: relabel changed students in the selector, drop removed
+// ones (unless selected), search again for added ones and refill the open
+// student's fields if they changed
+Shiny.addCustomMessageHandler('roster_changed', function(message) {
+    var element = document.getElementById('student_id');
+    var selectize = element && element.selectize;
+    if (selectize) {
+        // Cached search results may list old labels or removed students, or miss added ones
+        selectize.loadedSearches = {};
+        $.each(message.options, function(i, option) {
+            if (selectize.options[option.value]) selectize.updateOption(option.value, option);
+        });
+        $.each(message.removed, function(i, value) {
+            if (selectize.options[value] && selectize.getValue() !== value) selectize.removeOption(value, true);
+        });
+        selectize.refreshOptions(false);
+    }
+    if (message.scheme) $(document).trigger('assessment:scheme', message.scheme);
+    if (message.values) fillStudentFields(message.values);
+    if (message.notification) showStudentNotification(message.notification);
+});
+
+// Another assessor, the allocation switch or a new allocation changes which
+// students the selector offers: forget the loaded options (except the open student)
+function resetStudentOptions() {
+    var element = document.getElementById('student_id');
+    var selectize = element && element.selectize;
+    if (!selectize) return;
+    selectize.loadedSearches = {};
+    var selected = selectize.getValue();
+    $.each(Object.keys(selectize.options), function(i, value) {
+        if (value !== selected) selectize.removeOption(value, true);
+    });
+    selectize.refreshOptions(false);
+}
+
+$(document).on('change', '#assessor_name, #my_allocation', resetStudentOptions);
+Shiny.addCustomMessageHandler('allocation_changed', resetStudentOptions);
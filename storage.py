@@ -0,0 +1,702 @@
+"""Shared storage for generated reports, drafts, marks, markings and allocations.
+
+Every piece of state the dashboard writes goes through a store so that any
+worker process can serve any request. Two backends are provided:
+
+* ``FileSystemStore`` - a directory tree (local disk or a shared mount)
+* ``SQLiteStore`` - a single SQLite database file in WAL mode
+
+The backend is chosen with the ``ASSESSMENT_STORE`` environment variable,
+e.g. ``sqlite:////srv/assessment/store.sqlite`` or ``file:///srv/assessment``.
+Without it, a filesystem store in ``data/`` next to the app is used. It
+holds the only copy of drafts, recorded marks, markings and allocations,
+so it is kept out of the system temp directory, which is cleared on reboot.
+"""
+import json
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+STORE_ENV_VAR = "ASSESSMENT_STORE"
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+_REPORT_KEY_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+
+def _cutoff(max_age):
+    """ISO timestamp ``max_age`` seconds ago, comparable with the stored ``created_at`` values"""
+    return datetime.fromtimestamp(time.time() - max_age).isoformat(timespec="seconds")
+
+
+def new_report_key():
+    """Random, URL-safe key for a stored report"""
+    return uuid.uuid4().hex
+
+
+def is_valid_report_key(report_key):
+    """Whether a report key has the expected format (guards path building)"""
+    return bool(report_key) and bool(_REPORT_KEY_PATTERN.match(str(report_key)))
+
+
+def safe_filename(value):
+    """Make a value safe to use as a file name component"""
+    return "".join(c if c.isalnum() else "_" for c in str(value).strip())
+
+
+@contextmanager
+def file_lock(path, timeout=30.0, stale_after=120.0, poll_interval=0.05):
+    """Cross-process lock based on exclusive creation of a lock file.
+
+    Works on any platform and on shared mounts. A lock older than
+    ``stale_after`` seconds is assumed to belong to a crashed process and
+    is broken: it is renamed away (only one waiter can move a given file)
+    and removed only if it is still the stale file that was seen, so a
+    waiter never deletes a lock another waiter has just taken.
+    """
+    lock_path = f"{path}.lock"
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            os.write(fd, str(os.getpid()).encode())
+            os.close(fd)
+            break
+        except FileExistsError:
+            try:
+                stale = os.stat(lock_path)
+                if time.time() - stale.st_mtime > stale_after:
+                    _break_stale_lock(lock_path, stale)
+                    continue
+            except OSError:
+                continue
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for lock on {path}")
+            time.sleep(poll_interval)
+    try:
+        yield
+    finally:
+        try:
+            os.remove(lock_path)
+        except OSError:
+            pass
+
+
+def _break_stale_lock(lock_path, stale):
+    """Remove the lock file ``stale`` (an os.stat result) if it is still the one at ``lock_path``"""
+    moved_path = f"{lock_path}.{uuid.uuid4().hex}.stale"
+    os.rename(lock_path, moved_path)  # Raises if another waiter moved it first
+    moved = os.stat(moved_path)
+    if (moved.st_ino, moved.st_mtime_ns) == (stale.st_ino, stale.st_mtime_ns):
+        print(f"Breaking stale lock: {lock_path}")
+        os.remove(moved_path)
+        return
+    # Another waiter broke it and took the lock meanwhile: give it back
+    try:
+        os.link(moved_path, lock_path)
+    finally:
+        os.remove(moved_path)
+
+
+def atomic_write_bytes(path, data):
+    """Write a file so that readers only ever see the old or the new content"""
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.splitext(path)[1])
+    try:
+        with os.fdopen(fd, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class FileSystemStore:
+    """Store backed by a directory tree"""
+
+    def __init__(self, root=DEFAULT_STORE_DIR):
+        self.root = root
+        self.reports_dir = os.path.join(root, "reports")
+        self.drafts_dir = os.path.join(root, "drafts")
+        self.marks_dir = os.path.join(root, "marks")
+        self.markings_dir = os.path.join(root, "markings")
+        self.idempotency_dir = os.path.join(root, "idempotency")
+        self.locks_dir = os.path.join(root, "locks")
+        for directory in (self.reports_dir, self.drafts_dir, self.marks_dir, self.markings_dir, self.idempotency_dir,
+                          self.locks_dir):
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return f"FileSystemStore({self.root!r})"
+
+    # Reports
+    #
+    # reports/<key>/<filename> holds the PDF. The file's mtime is its creation
+    # time and the directory's mtime its last access (touched on every read),
+    # which is what retention needs without any extra files.
+    def put_report(self, student_id, filename, pdf_bytes):
+        """Store a generated report and return its key"""
+        report_key = new_report_key()
+        report_dir = os.path.join(self.reports_dir, report_key)
+        os.makedirs(report_dir)
+        atomic_write_bytes(os.path.join(report_dir, os.path.basename(filename)), pdf_bytes)
+        return report_key
+
+    def report_path(self, report_key):
+        """Local path of a stored report, or None if it does not exist"""
+        if not is_valid_report_key(report_key):
+            return None
+        report_dir = os.path.join(self.reports_dir, report_key)
+        try:
+            names = [name for name in os.listdir(report_dir) if not name.startswith(".tmp_")]
+        except OSError:
+            return None
+        return os.path.join(report_dir, names[0]) if names else None
+
+    def get_report(self, report_key):
+        """(filename, bytes) of a stored report, or None"""
+        path = self.report_path(report_key)
+        if path is None:
+            return None
+        with open(path, "rb") as report_file:
+            data = report_file.read()
+        try:
+            os.utime(os.path.dirname(path))  # Last access, for LRU eviction
+        except OSError:
+            pass
+        return os.path.basename(path), data
+
+    def has_report(self, report_key):
+        return self.report_path(report_key) is not None
+
+    def list_reports(self):
+        """Every stored report as dicts of report_key, student_id, size, created_at and
+        accessed_at (epoch seconds); student_id is None where the store does not keep it"""
+        reports = []
+        with os.scandir(self.reports_dir) as entries:
+            for entry in entries:
+                path = self.report_path(entry.name)
+                if path is None:
+                    continue
+                try:
+                    file_stat, dir_stat = os.stat(path), entry.stat()
+                except OSError:
+                    continue  # Deleted meanwhile
+                reports.append({
+                    "report_key": entry.name,
+                    "student_id": None,
+                    "size": file_stat.st_size,
+                    "created_at": file_stat.st_mtime,
+                    "accessed_at": max(dir_stat.st_mtime, file_stat.st_mtime),
+                })
+        return reports
+
+    def delete_report(self, report_key):
+        """Remove a stored report (index entries pointing at it are ignored from then on)"""
+        if is_valid_report_key(report_key):
+            shutil.rmtree(os.path.join(self.reports_dir, report_key), ignore_errors=True)
+
+    # Drafts
+    def _draft_path(self, student_id):
+        return os.path.join(self.drafts_dir, f"{safe_filename(student_id)}.json")
+
+    def put_draft(self, student_id, draft):
+        """Save the in-progress assessment of a student"""
+        payload = dict(draft, saved_at=datetime.now().isoformat(timespec="seconds"))
+        atomic_write_bytes(self._draft_path(student_id), json.dumps(payload).encode("utf-8"))
+
+    def get_draft(self, student_id):
+        """Saved draft of a student, or None"""
+        try:
+            with open(self._draft_path(student_id), "r", encoding="utf-8") as draft_file:
+                return json.load(draft_file)
+        except (OSError, ValueError):
+            return None
+
+    def delete_draft(self, student_id):
+        try:
+            os.remove(self._draft_path(student_id))
+        except OSError:
+            pass
+
+    # Marks
+    def _marks_path(self, student_id):
+        return os.path.join(self.marks_dir, f"{safe_filename(student_id)}.json")
+
+    def record_marks(self, student_id, marks, comment, report_key=None):
+        """Record the latest saved marks of a student"""
+        payload = {
+            "student_id": str(student_id),
+            "marks": marks,
+            "comment": comment,
+            "report_key": report_key,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        atomic_write_bytes(self._marks_path(student_id), json.dumps(payload).encode("utf-8"))
+
+    def get_marks(self, student_id):
+        """Latest saved marks of a student, or None"""
+        try:
+            with open(self._marks_path(student_id), "r", encoding="utf-8") as marks_file:
+                return json.load(marks_file)
+        except (OSError, ValueError):
+            return None
+
+    def get_marks_many(self, student_ids):
+        """Latest saved marks of several students {student_id: marks}; students without any are left out"""
+        marks = {}
+        for student_id in student_ids:
+            found = self.get_marks(student_id)
+            if found:
+                marks[str(student_id)] = found
+        return marks
+
+    def recorded_report_keys(self):
+        """Keys of the reports that are some student's recorded report"""
+        report_keys = set()
+        with os.scandir(self.marks_dir) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".json") or entry.name.startswith(".tmp_"):
+                    continue
+                try:
+                    with open(entry.path, "r", encoding="utf-8") as marks_file:
+                        report_key = json.load(marks_file).get("report_key")
+                except (OSError, ValueError):
+                    continue
+                if report_key:
+                    report_keys.add(report_key)
+        return report_keys
+
+    # Markings - the independent per-criterion marks of each assessor of a
+    # student (first and second marking), kept in markings/<student>/<assessor>.json
+    def put_marking(self, student_id, assessor, module, scores, final_grade, comment=""):
+        """Record an assessor's marking of a student, replacing their previous one"""
+        student_dir = os.path.join(self.markings_dir, safe_filename(student_id))
+        os.makedirs(student_dir, exist_ok=True)
+        payload = {
+            "student_id": str(student_id),
+            "assessor": assessor,
+            "module": module,
+            "scores": dict(scores),
+            "final_grade": float(final_grade),
+            "comment": comment,
+            "saved_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        atomic_write_bytes(os.path.join(student_dir, f"{safe_filename(assessor)}.json"),
+                           json.dumps(payload).encode("utf-8"))
+
+    def _read_markings(self, student_dir):
+        markings = []
+        try:
+            names = sorted(os.listdir(student_dir))
+        except OSError:
+            return markings
+        for name in names:
+            if not name.endswith(".json") or name.startswith(".tmp_"):
+                continue
+            try:
+                with open(os.path.join(student_dir, name), "r", encoding="utf-8") as marking_file:
+                    markings.append(json.load(marking_file))
+            except (OSError, ValueError):
+                continue
+        return markings
+
+    def get_markings(self, student_id):
+        """Markings of a student, oldest first"""
+        markings = self._read_markings(os.path.join(self.markings_dir, safe_filename(student_id)))
+        return sorted(markings, key=lambda marking: marking["saved_at"])
+
+    def get_markings_many(self, student_ids):
+        """Markings of several students {student_id: [marking, ...]}, oldest first; unmarked students are left out"""
+        markings = {}
+        for student_id in student_ids:
+            found = self.get_markings(student_id)
+            if found:
+                markings[str(student_id)] = found
+        return markings
+
+    def list_markings(self, module=None):
+        """Markings of every student (of one module), oldest first"""
+        markings = []
+        with os.scandir(self.markings_dir) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    markings.extend(self._read_markings(entry.path))
+        if module is not None:
+            markings = [marking for marking in markings if marking["module"] == module]
+        return sorted(markings, key=lambda marking: marking["saved_at"])
+
+    # Allocation of students to assessors
+    def put_allocation(self, assignments):
+        """Replace the allocation ({student_id: assessor})"""
+        payload = {
+            "assignments": {str(student_id): assessor for student_id, assessor in assignments.items()},
+            "allocated_at": datetime.now().isoformat(timespec="seconds"),
+        }
+        atomic_write_bytes(os.path.join(self.root, "allocation.json"), json.dumps(payload).encode("utf-8"))
+
+    def get_allocation(self):
+        """Current allocation {student_id: assessor} (empty before the first run)"""
+        try:
+            with open(os.path.join(self.root, "allocation.json"), "r", encoding="utf-8") as allocation_file:
+                return json.load(allocation_file)["assignments"]
+        except (OSError, ValueError, KeyError):
+            return {}
+
+    def allocation_version(self):
+        """Opaque token that changes with every allocation (None before the first run), without reading it"""
+        try:
+            # Each allocation is written to a new file (atomic_write_bytes), so the inode changes too
+            stat = os.stat(os.path.join(self.root, "allocation.json"))
+        except OSError:
+            return None
+        return f"{stat.st_ino}:{stat.st_mtime_ns}:{stat.st_size}"
+
+    # Idempotency records and named locks
+    def get_idempotent(self, key, max_age=None):
+        """Stored result of a completed request, or None (also when older than ``max_age`` seconds)"""
+        path = os.path.join(self.idempotency_dir, f"{safe_filename(key)}.json")
+        try:
+            if max_age is not None and time.time() - os.path.getmtime(path) > max_age:
+                return None
+            with open(path, "r", encoding="utf-8") as result_file:
+                return json.load(result_file)
+        except (OSError, ValueError):
+            return None
+
+    def put_idempotent(self, key, result):
+        """Remember the result of a completed request"""
+        path = os.path.join(self.idempotency_dir, f"{safe_filename(key)}.json")
+        atomic_write_bytes(path, json.dumps(result).encode("utf-8"))
+
+    def prune_idempotent(self, max_age):
+        """Delete results older than ``max_age`` seconds; returns how many were deleted"""
+        cutoff = time.time() - max_age
+        deleted = 0
+        with os.scandir(self.idempotency_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                        deleted += 1
+                except OSError:
+                    continue
+        return deleted
+
+    def lock(self, name, timeout=60.0):
+        """Cross-process lock shared by every worker using this store"""
+        return file_lock(os.path.join(self.locks_dir, safe_filename(name)), timeout=timeout)
+
+
+class SQLiteStore:
+    """Store backed by a single SQLite database (safe for several processes)"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS reports (
+        report_key TEXT PRIMARY KEY,
+        student_id TEXT NOT NULL,
+        filename TEXT NOT NULL,
+        pdf BLOB NOT NULL,
+        created_at TEXT NOT NULL,
+        accessed_at TEXT
+    );
+    CREATE INDEX IF NOT EXISTS reports_student ON reports (student_id);
+    CREATE TABLE IF NOT EXISTS drafts (
+        student_id TEXT PRIMARY KEY,
+        draft TEXT NOT NULL,
+        saved_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS idempotency (
+        key TEXT PRIMARY KEY,
+        result TEXT NOT NULL,
+        created_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS marks (
+        student_id TEXT PRIMARY KEY,
+        marks TEXT,
+        comment TEXT,
+        report_key TEXT,
+        saved_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS markings (
+        student_id TEXT NOT NULL,
+        assessor TEXT NOT NULL,
+        module TEXT,
+        scores TEXT NOT NULL,
+        final_grade REAL NOT NULL,
+        comment TEXT,
+        saved_at TEXT NOT NULL,
+        PRIMARY KEY (student_id, assessor)
+    );
+    CREATE INDEX IF NOT EXISTS markings_module ON markings (module);
+    CREATE TABLE IF NOT EXISTS allocations (
+        student_id TEXT PRIMARY KEY,
+        assessor TEXT NOT NULL,
+        allocated_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS allocation_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(self.SCHEMA)
+            # Databases created before report access times were tracked
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(reports)")}
+            if "accessed_at" not in columns:
+                conn.execute("ALTER TABLE reports ADD COLUMN accessed_at TEXT")
+            # Left by the report version index, which nothing read
+            conn.execute("DROP INDEX IF EXISTS reports_student_version")
+
+    def __repr__(self):
+        return f"SQLiteStore({self.path!r})"
+
+    @contextmanager
+    def _connect(self):
+        # A short-lived connection per operation keeps the store fork/thread safe
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # Reports
+    def put_report(self, student_id, filename, pdf_bytes):
+        report_key = new_report_key()
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO reports (report_key, student_id, filename, pdf, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (report_key, str(student_id), os.path.basename(filename), sqlite3.Binary(pdf_bytes), now, now),
+            )
+        return report_key
+
+    def report_path(self, report_key):
+        # Reports live inside the database, there is no local file to point at
+        return None
+
+    def get_report(self, report_key):
+        if not is_valid_report_key(report_key):
+            return None
+        with self._connect() as conn:
+            row = conn.execute("SELECT filename, pdf FROM reports WHERE report_key = ?", (report_key,)).fetchone()
+            if row:
+                conn.execute("UPDATE reports SET accessed_at = ? WHERE report_key = ?",
+                             (datetime.now().isoformat(timespec="seconds"), report_key))
+        return (row[0], bytes(row[1])) if row else None
+
+    def has_report(self, report_key):
+        if not is_valid_report_key(report_key):
+            return False
+        with self._connect() as conn:
+            row = conn.execute("SELECT 1 FROM reports WHERE report_key = ?", (report_key,)).fetchone()
+        return row is not None
+
+    def list_reports(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT report_key, student_id, length(pdf), created_at, COALESCE(accessed_at, created_at) FROM reports"
+            ).fetchall()
+        return [
+            {
+                "report_key": report_key,
+                "student_id": student_id,
+                "size": size,
+                "created_at": datetime.fromisoformat(created_at).timestamp(),
+                "accessed_at": datetime.fromisoformat(accessed_at).timestamp(),
+            }
+            for report_key, student_id, size, created_at, accessed_at in rows
+        ]
+
+    def delete_report(self, report_key):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM reports WHERE report_key = ?", (report_key,))
+
+    # Drafts
+    def put_draft(self, student_id, draft):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO drafts (student_id, draft, saved_at) VALUES (?, ?, ?)",
+                (str(student_id), json.dumps(draft), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def get_draft(self, student_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT draft, saved_at FROM drafts WHERE student_id = ?", (str(student_id),)).fetchone()
+        if not row:
+            return None
+        return dict(json.loads(row[0]), saved_at=row[1])
+
+    def delete_draft(self, student_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM drafts WHERE student_id = ?", (str(student_id),))
+
+    # Marks
+    def record_marks(self, student_id, marks, comment, report_key=None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO marks (student_id, marks, comment, report_key, saved_at) VALUES (?, ?, ?, ?, ?)",
+                (str(student_id), marks, comment, report_key, datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def get_marks(self, student_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT student_id, marks, comment, report_key, saved_at FROM marks WHERE student_id = ?",
+                (str(student_id),),
+            ).fetchone()
+        if not row:
+            return None
+        return dict(zip(("student_id", "marks", "comment", "report_key", "saved_at"), row))
+
+    def get_marks_many(self, student_ids):
+        student_ids = [str(student_id) for student_id in student_ids]
+        marks = {}
+        with self._connect() as conn:
+            # Batches stay under SQLite's limit on query parameters
+            for start in range(0, len(student_ids), 500):
+                batch = student_ids[start:start + 500]
+                for row in conn.execute(
+                    "SELECT student_id, marks, comment, report_key, saved_at FROM marks "
+                    f"WHERE student_id IN ({', '.join('?' * len(batch))})",
+                    batch,
+                ):
+                    marks[row[0]] = dict(zip(("student_id", "marks", "comment", "report_key", "saved_at"), row))
+        return marks
+
+    def recorded_report_keys(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT report_key FROM marks WHERE report_key IS NOT NULL").fetchall()
+        return {row[0] for row in rows}
+
+    # Markings
+    _MARKING_COLUMNS = ("student_id", "assessor", "module", "scores", "final_grade", "comment", "saved_at")
+
+    def put_marking(self, student_id, assessor, module, scores, final_grade, comment=""):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO markings (student_id, assessor, module, scores, final_grade, comment, saved_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (str(student_id), assessor, module, json.dumps(dict(scores)), float(final_grade), comment,
+                 datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def _select_markings(self, where, params):
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT {', '.join(self._MARKING_COLUMNS)} FROM markings {where} ORDER BY saved_at, rowid",
+                params,
+            ).fetchall()
+        markings = []
+        for row in rows:
+            marking = dict(zip(self._MARKING_COLUMNS, row))
+            marking["scores"] = json.loads(marking["scores"])
+            markings.append(marking)
+        return markings
+
+    def get_markings(self, student_id):
+        return self._select_markings("WHERE student_id = ?", (str(student_id),))
+
+    def get_markings_many(self, student_ids):
+        student_ids = [str(student_id) for student_id in student_ids]
+        markings = {}
+        # Batches stay under SQLite's limit on query parameters
+        for start in range(0, len(student_ids), 500):
+            batch = student_ids[start:start + 500]
+            where = f"WHERE student_id IN ({', '.join('?' * len(batch))})"
+            for marking in self._select_markings(where, batch):
+                markings.setdefault(marking["student_id"], []).append(marking)
+        return markings
+
+    def list_markings(self, module=None):
+        if module is None:
+            return self._select_markings("", ())
+        return self._select_markings("WHERE module = ?", (module,))
+
+    # Allocation of students to assessors
+    def put_allocation(self, assignments):
+        now = datetime.now().isoformat(timespec="seconds")
+        with self._connect() as conn:
+            conn.execute("DELETE FROM allocations")
+            conn.executemany(
+                "INSERT INTO allocations (student_id, assessor, allocated_at) VALUES (?, ?, ?)",
+                [(str(student_id), assessor, now) for student_id, assessor in assignments.items()],
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO allocation_version (id, version) VALUES (1, ?)", (uuid.uuid4().hex,)
+            )
+
+    def get_allocation(self):
+        with self._connect() as conn:
+            return dict(conn.execute("SELECT student_id, assessor FROM allocations").fetchall())
+
+    def allocation_version(self):
+        with self._connect() as conn:
+            row = conn.execute("SELECT version FROM allocation_version WHERE id = 1").fetchone()
+            if row is not None:
+                return row[0]
+            # Allocated before versions were recorded
+            row = conn.execute("SELECT allocated_at FROM allocations LIMIT 1").fetchone()
+        return None if row is None else row[0]
+
+    # Idempotency records and named locks
+    def get_idempotent(self, key, max_age=None):
+        with self._connect() as conn:
+            row = conn.execute("SELECT result, created_at FROM idempotency WHERE key = ?", (key,)).fetchone()
+        if row is None or (max_age is not None and row[1] < _cutoff(max_age)):
+            return None
+        return json.loads(row[0])
+
+    def put_idempotent(self, key, result):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency (key, result, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(result), datetime.now().isoformat(timespec="seconds")),
+            )
+
+    def prune_idempotent(self, max_age):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM idempotency WHERE created_at < ?", (_cutoff(max_age),)).rowcount
+
+    def lock(self, name, timeout=60.0):
+        locks_dir = f"{os.path.abspath(self.path)}.locks"
+        os.makedirs(locks_dir, exist_ok=True)
+        return file_lock(os.path.join(locks_dir, safe_filename(name)), timeout=timeout)
+
+
+def open_store(location=None):
+    """Open the store described by a location string (see module docstring)"""
+    location = location or os.environ.get(STORE_ENV_VAR, "")
+    if location.startswith("sqlite:///"):
+        return SQLiteStore(location[len("sqlite:///"):])
+    if location.startswith("file://"):
+        return FileSystemStore(location[len("file://"):])
+    if location.endswith((".sqlite", ".sqlite3", ".db")):
+        return SQLiteStore(location)
+    return FileSystemStore(location or DEFAULT_STORE_DIR)
+
+
+_store = None
+
+
+def get_store():
+    """Process-wide store, opened on first use"""
+    global _store
+    if _store is None:
+        _store = open_store()
+        print(f"Using assessment store: {_store!r}")
+    return _store